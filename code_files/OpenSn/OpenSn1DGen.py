@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Auto-generate 1D spherical OpenSn triage scripts for ICSBEP spherical benchmark cases.
+
+Every case in spherical_cases is one-dimensional in reality, so before paying
+for the 3D tet mesh and GLCProductQuadrature3DXYZ solve, this script builds a
+radial mesh straight from radii.txt and writes a 1D spherical OpenSn input
+that loads the same per-material MGXS files as the 3D script.
+
+The number of cells in each shell is chosen from its optical thickness,
+max_g(Sigma_t,g) * (r_out - r_in), so that no cell is thicker than
+TRIAGE_TAU_PER_CELL mean free paths (clamped to [TRIAGE_MIN_CELLS, TRIAGE_MAX_CELLS]).
+
+Outputs per case folder:
+    mesh/radial_mesh_1d.txt   one radius per line (cell edges, r = 0 first)
+    {BENCHMARK}_{case}_1D.py  ready-to-run OpenSn script
+
+Usage:
+    python OpenSn1DGen.py
+Then screen the whole catalog with screen_1d.py.
+"""
+
+import math
+import os
+import sys
+
+import h5py
+import numpy as np
+
+from OpenSnGen import SCATTERING_ORDER, parse_radii, parse_geometry_xml, discover_materials
+
+TAU_PER_CELL = float(os.getenv("TRIAGE_TAU_PER_CELL", "0.5"))  # mean free paths per cell
+MIN_CELLS = int(os.getenv("TRIAGE_MIN_CELLS", "4"))             # per shell
+MAX_CELLS = int(os.getenv("TRIAGE_MAX_CELLS", "400"))           # per shell
+N_POLAR_1D = int(os.getenv("TRIAGE_N_POLAR", "16"))             # polar directions of the 1D quadrature
+
+RADIAL_MESH_NAME = "radial_mesh_1d.txt"
+
+
+def max_total_xs(h5_path: str, mat_name: str) -> float:
+    """Largest group total macroscopic cross section [1/cm] in an OpenMC MGXS library file."""
+    with h5py.File(h5_path, "r") as f:
+        temp_key = list(f[mat_name].keys())[0]
+        return float(np.max(f[f"{mat_name}/{temp_key}/total"][:]))
+
+
+def cells_per_shell(r_in: float, r_out: float, sigma_t: float) -> int:
+    tau = sigma_t * (r_out - r_in)
+    return int(min(MAX_CELLS, max(MIN_CELLS, math.ceil(tau / TAU_PER_CELL))))
+
+
+def build_radial_mesh(radii: list[float], sigma_t: list[float]) -> tuple[np.ndarray, list[int]]:
+    """
+    Return (edges, n_cells) where edges are the cell boundaries from r = 0 to
+    the outer radius and n_cells[k] is the number of cells in shell k.
+    Cells are uniform in r within each shell and shell interfaces are exact.
+    """
+    edges = [0.0]
+    n_cells = []
+    r_in = 0.0
+    for r_out, sig in zip(radii, sigma_t):
+        n = cells_per_shell(r_in, r_out, sig)
+        edges.extend(np.linspace(r_in, r_out, n + 1)[1:].tolist())
+        edges[-1] = r_out  # keep the interface exactly at the benchmark radius
+        n_cells.append(n)
+        r_in = r_out
+    return np.asarray(edges), n_cells
+
+
+def generate_script_1d(
+    benchmark_name: str,
+    case_name: str,
+    radii: list[str],
+    cell_material_ids: list[int],
+    mat_map: dict[int, str],
+) -> str:
+    """
+    Build the 1D spherical OpenSn Python script as a string.
+
+    The radial mesh is read from mesh/radial_mesh_1d.txt; block IDs follow the
+    3D convention (block k+1 is shell k counted from the center). Interfaces
+    are exact, so no volume-correction scaling is applied.
+    """
+
+    lines = []
+
+    # ---- header --------------------------------------------------------
+    lines.append('#!/usr/bin/env python3')
+    lines.append('# -*- coding: utf-8 -*-')
+    lines.append('"""')
+    lines.append(f'{benchmark_name} {case_name} benchmark (1D spherical triage)')
+    lines.append('"""')
+    lines.append('')
+
+    # ---- imports -------------------------------------------------------
+    lines.append('import sys')
+    lines.append('import os')
+    lines.append('import numpy as np')
+    lines.append('')
+    lines.append('if "opensn_console" not in globals():')
+    lines.append('    from mpi4py import MPI')
+    lines.append('    size = MPI.COMM_WORLD.size')
+    lines.append('    rank = MPI.COMM_WORLD.rank')
+    lines.append('    # Append parent directory to locate the pyopensn modules')
+    lines.append('    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../../")))')
+    lines.append('    from pyopensn.mesh import OrthogonalMeshGenerator')
+    lines.append('    from pyopensn.logvol import RPPLogicalVolume')
+    lines.append('    from pyopensn.xs import MultiGroupXS')
+    lines.append('    from pyopensn.aquad import GLProductQuadrature1DSpherical')
+    lines.append('    from pyopensn.solver import DiscreteOrdinatesCurvilinearProblem, NonLinearKEigenSolver')
+    lines.append('')
+
+    # ---- main block ----------------------------------------------------
+    lines.append('if __name__ == "__main__":')
+    lines.append('')
+    lines.append('    # radial cell edges from r = 0 to the outer radius (1D meshes lie along z)')
+    lines.append(f'    edges = np.loadtxt("./mesh/{RADIAL_MESH_NAME}")')
+    lines.append('    meshgen = OrthogonalMeshGenerator(node_sets=[edges.tolist()])')
+    lines.append('    grid = meshgen.Execute()')
+    lines.append('')
+
+    # ---- block IDs -----------------------------------------------------
+    radii_entries = ", ".join(f"{i+1}: {r}" for i, r in enumerate(radii))
+    lines.append('    # define radii per block-ID')
+    lines.append(f'    radii = {{{radii_entries}}}')
+    lines.append('    prev_R = 0.0')
+    lines.append('    for blk in sorted(radii):')
+    lines.append('        R = radii[blk]')
+    lines.append('        lv = RPPLogicalVolume(infx=True, infy=True, zmin=prev_R, zmax=R)')
+    lines.append('        grid.SetBlockIDFromLogicalVolume(lv, blk, True)')
+    lines.append('        prev_R = R')
+    lines.append('')
+
+    # ---- cross-section loading -----------------------------------------
+    lines.append('    # load XS  one object per material (exact interfaces, no scaling)')
+    xs_var = {}
+    for mat_id in sorted(set(cell_material_ids)):
+        mat_name = mat_map[mat_id]
+        var = f"xs_mat{mat_id}"
+        xs_var[mat_id] = var
+        lines.append(f'    {var} = MultiGroupXS()')
+        lines.append(f'    {var}.LoadFromOpenMC("./materials/material_{mat_id}_{mat_name}/{mat_name}_LANL70g.h5", "{mat_name}", 294.0)')
+    lines.append('')
+    lines.append(f'    num_groups = {xs_var[cell_material_ids[0]]}.num_groups')
+    lines.append('')
+
+    # ---- solver setup --------------------------------------------------
+    lines.append('    # Solver')
+    lines.append('    phys = DiscreteOrdinatesCurvilinearProblem(')
+    lines.append('        mesh=grid,')
+    lines.append('        coord_system=3,  # spherical')
+    lines.append('        num_groups=num_groups,')
+    lines.append('        groupsets=[')
+    lines.append('            {')
+    lines.append('                "groups_from_to": (0, num_groups - 1),')
+    lines.append('                "angular_quadrature": GLProductQuadrature1DSpherical(')
+    lines.append(f'                    n_polar={N_POLAR_1D},')
+    lines.append(f'                    scattering_order={SCATTERING_ORDER}')
+    lines.append('                ),')
+    lines.append('                "inner_linear_method": "petsc_gmres",')
+    lines.append('                "l_max_its": 500,')
+    lines.append('                "l_abs_tol": 1.0e-6,')
+    lines.append('            },')
+    lines.append('        ],')
+    lines.append('        xs_map=[')
+    for shell_idx, mat_id in enumerate(cell_material_ids):
+        lines.append(f'            {{"block_ids": [{shell_idx + 1}], "xs": {xs_var[mat_id]}}},')
+    lines.append('        ],')
+    lines.append('        boundary_conditions=[{"name": "zmin", "type": "reflecting"}],')
+    lines.append('        options={')
+    lines.append('            "use_precursors": False,')
+    lines.append('            "verbose_inner_iterations": False,')
+    lines.append('            "verbose_outer_iterations": True,')
+    lines.append('        },')
+    lines.append('    )')
+    lines.append('')
+
+    # ---- k-eigenvalue solver -------------------------------------------
+    lines.append('    k_solver = NonLinearKEigenSolver(')
+    lines.append('        problem=phys,')
+    lines.append('        nl_max_its=500,')
+    lines.append('        nl_abs_tol=1.0e-10,')
+    lines.append('    )')
+    lines.append('    k_solver.Initialize()')
+    lines.append('    k_solver.Execute()')
+    lines.append('    k = k_solver.GetEigenvalue()')
+    lines.append('    # only rank 0 prints')
+    lines.append('    if rank == 0:')
+    lines.append('        print(f"Computed k-eigenvalue: {k}")')
+    lines.append('')
+
+    return "\n".join(lines)
+
+
+def process_case(benchmark_dir: str, case_dir: str) -> bool:
+    """
+    Write mesh/radial_mesh_1d.txt and the 1D OpenSn script for one case.
+    Returns True when the script was written.
+    """
+    benchmark_name = os.path.basename(benchmark_dir).upper().replace("-", "_")
+    case_name = os.path.basename(case_dir)
+
+    mesh_dir = os.path.join(case_dir, "mesh")
+    materials_dir = os.path.join(case_dir, "materials")
+    radii_path = os.path.join(mesh_dir, "radii.txt")
+    geometry_path = os.path.join(mesh_dir, "geometry.xml")
+
+    for p, desc in [
+        (materials_dir, "materials directory"),
+        (radii_path, "radii.txt"),
+        (geometry_path, "geometry.xml"),
+    ]:
+        if not os.path.exists(p):
+            print(f"  WARNING: {desc} not found at {p}, skipping {case_dir}")
+            return False
+
+    radii = parse_radii(radii_path)
+    cell_material_ids = parse_geometry_xml(geometry_path)
+    mat_map = discover_materials(materials_dir)
+
+    missing_mats = set(cell_material_ids) - set(mat_map.keys())
+    if missing_mats:
+        print(f"  WARNING: Materials {missing_mats} referenced in geometry.xml "
+              f"but no matching folder found in {materials_dir}. Skipping.")
+        return False
+    if len(cell_material_ids) != len(radii):
+        print(f"  WARNING: {len(cell_material_ids)} cells in geometry.xml but "
+              f"{len(radii)} radii in radii.txt for {case_dir}. Skipping.")
+        return False
+
+    # Optical thickness per shell from the same MGXS files the solver loads
+    sigma_t = []
+    for mat_id in cell_material_ids:
+        mat_name = mat_map[mat_id]
+        h5_path = os.path.join(materials_dir, f"material_{mat_id}_{mat_name}", f"{mat_name}_LANL70g.h5")
+        if not os.path.isfile(h5_path):
+            print(f"  WARNING: MGXS file not found at {h5_path}, skipping {case_dir}")
+            return False
+        sigma_t.append(max_total_xs(h5_path, mat_name))
+
+    edges, n_cells = build_radial_mesh([float(r) for r in radii], sigma_t)
+    np.savetxt(os.path.join(mesh_dir, RADIAL_MESH_NAME), edges, fmt="%.17g")
+
+    script_content = generate_script_1d(
+        benchmark_name=benchmark_name,
+        case_name=case_name,
+        radii=radii,
+        cell_material_ids=cell_material_ids,
+        mat_map=mat_map,
+    )
+    script_path = os.path.join(case_dir, f"{benchmark_name}_{case_name}_1D.py")
+    with open(script_path, "w") as f:
+        f.write(script_content)
+    os.chmod(script_path, 0o755)
+    print(f"  Written: {script_path} ({len(edges) - 1} cells, per shell {n_cells})")
+    return True
+
+
+def main():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    spherical_cases_dir = os.path.normpath(os.path.join(script_dir, "../../spherical_cases"))
+
+    if not os.path.isdir(spherical_cases_dir):
+        print(f"ERROR: spherical_cases directory not found at {spherical_cases_dir}")
+        print("  Expected this script to be in code_files/OpenSn/")
+        sys.exit(1)
+
+    print(f"Scanning: {spherical_cases_dir}")
+
+    total_generated = 0
+    for bench in sorted(os.listdir(spherical_cases_dir)):
+        bench_dir = os.path.join(spherical_cases_dir, bench)
+        if not os.path.isdir(bench_dir):
+            continue
+        case_dirs = sorted(
+            os.path.join(bench_dir, d)
+            for d in os.listdir(bench_dir)
+            if os.path.isdir(os.path.join(bench_dir, d)) and d.startswith("case")
+        )
+        if not case_dirs:
+            continue
+        print(f"\nBenchmark: {bench}")
+        for case_dir in case_dirs:
+            print(f"  Processing: {os.path.basename(case_dir)}")
+            if process_case(bench_dir, case_dir):
+                total_generated += 1
+
+    print(f"\nDone. Wrote {total_generated} 1D script(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,13 @@ import re
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
+# Legendre scattering order of the generated scripts. OpenSn1DGen.py, openmc_mgxs.py (MGXS
+# tally order) and solve_cost.py import it from here, so all stages change together.
+SCATTERING_ORDER = int(os.getenv("OPENSN_SCATTERING_ORDER", "3"))
+# Product quadrature of the generated scripts (imported by solve_cost.py)
+N_POLAR = 8
+N_AZIMUTHAL = 16
+
 
 def parse_radii(radii_path: str) -> list[str]:
     """Read radii.txt and return a list of radii strings (one per line), preserving exact precision."""
@@ -94,6 +101,7 @@ def generate_script(
     # ---- imports -------------------------------------------------------
     lines.append('import sys')
     lines.append('import os')
+    lines.append('import time')
     lines.append('import numpy as np')
     lines.append('')
     lines.append('if "opensn_console" not in globals():')
@@ -102,7 +110,7 @@ def generate_script(
     lines.append('    rank = MPI.COMM_WORLD.rank')
     lines.append('    # Append parent directory to locate the pyopensn modules')
     lines.append('    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../../")))')
-    lines.append('    from pyopensn.mesh import FromFileMeshGenerator, PETScGraphPartitioner')
+    lines.append('    from pyopensn.mesh import FromFileMeshGenerator, PETScGraphPartitioner, KBAGraphPartitioner')
     lines.append('    from pyopensn.xs import MultiGroupXS')
     lines.append('    from pyopensn.aquad import GLCProductQuadrature3DXYZ')
     lines.append('    from pyopensn.solver import DiscreteOrdinatesProblem, NonLinearKEigenSolver')
@@ -112,11 +120,39 @@ def generate_script(
     # ---- main block ----------------------------------------------------
     lines.append('if __name__ == "__main__":')
     lines.append('')
+    lines.append('    # OPENSN_MESH_FILE points the script at another mesh of this case (e.g. a renumbered copy)')
+    lines.append(f'    mesh_file = os.getenv("OPENSN_MESH_FILE", "./mesh/n_shells_sphere_{n_shells}_shells.msh")')
+    lines.append('    unpacked_mesh = None')
+    lines.append('    if not os.path.isfile(mesh_file) and os.path.isfile(mesh_file + ".zst"):')
+    lines.append('        # mesh archived as .msh.zst: every rank unpacks its own copy to tmpfs')
+    lines.append('        import tempfile')
+    lines.append('        import zstandard')
+    lines.append('        shm = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None')
+    lines.append('        fd, unpacked_mesh = tempfile.mkstemp(suffix=".msh", prefix=f"rank{rank}_", dir=shm)')
+    lines.append('        with open(mesh_file + ".zst", "rb") as fin, os.fdopen(fd, "wb") as fout:')
+    lines.append('            zstandard.ZstdDecompressor().copy_stream(fin, fout)')
+    lines.append('        mesh_file = unpacked_mesh')
+    lines.append('')
+    lines.append('    # ParMETIS by default; OPENSN_PARTITIONER=kba uses the octant-aligned KBA cuts of')
+    lines.append('    # sphere_partition.py when mesh/partition.json has this rank count (see bench_partition.py)')
+    lines.append("    partitioner = PETScGraphPartitioner(type='parmetis')")
+    lines.append('    partition_file = "./mesh/partition.json"')
+    lines.append('    if os.getenv("OPENSN_PARTITIONER", "parmetis") == "kba" and os.path.isfile(partition_file):')
+    lines.append('        import json')
+    lines.append('        with open(partition_file) as f:')
+    lines.append('            kba = json.load(f)["ranks"].get(str(size), {}).get("kba")')
+    lines.append('        if kba:')
+    lines.append('            partitioner = KBAGraphPartitioner(**kba)')
+    lines.append('            if rank == 0:')
+    lines.append('                print(f"KBA partition {kba[\'nx\']}x{kba[\'ny\']}x{kba[\'nz\']} from {partition_file}")')
+    lines.append('')
     lines.append('    meshgen = FromFileMeshGenerator(')
-    lines.append(f'        filename="./mesh/n_shells_sphere_{n_shells}_shells.msh",')
-    lines.append("        partitioner=PETScGraphPartitioner(type='parmetis'),")
+    lines.append('        filename=mesh_file,')
+    lines.append('        partitioner=partitioner,')
     lines.append('    )')
     lines.append('    grid = meshgen.Execute()')
+    lines.append('    if unpacked_mesh:')
+    lines.append('        os.remove(unpacked_mesh)')
     lines.append('')
 
     # ---- volumes -------------------------------------------------------
@@ -187,9 +223,9 @@ def generate_script(
     lines.append('            {')
     lines.append('                "groups_from_to": (0, num_groups - 1),')
     lines.append('                "angular_quadrature": GLCProductQuadrature3DXYZ(')
-    lines.append('                    n_polar=8,')
-    lines.append('                    n_azimuthal=16,')
-    lines.append('                    scattering_order=3')
+    lines.append(f'                    n_polar={N_POLAR},')
+    lines.append(f'                    n_azimuthal={N_AZIMUTHAL},')
+    lines.append(f'                    scattering_order={SCATTERING_ORDER}')
     lines.append('                ),')
     lines.append('                "inner_linear_method": "petsc_gmres",')
     lines.append('                "angle_aggregation_type": "single",')
@@ -219,11 +255,21 @@ def generate_script(
     lines.append('        nl_abs_tol=1.0e-10,')
     lines.append('    )')
     lines.append('    k_solver.Initialize()')
+    lines.append('    solve_t0 = time.perf_counter()')
     lines.append('    k_solver.Execute()')
+    lines.append('    solve_wall = time.perf_counter() - solve_t0')
     lines.append('    k = k_solver.GetEigenvalue()')
     lines.append('    # only rank 0 prints')
     lines.append('    if rank == 0:')
     lines.append('        print(f"Computed k-eigenvalue: {k}")')
+    lines.append('        print(f"Solve wall time: {solve_wall:.3f} s")')
+    lines.append('    # run record for gmsh_code/solve_cost.py record: peak RSS summed over the ranks')
+    lines.append('    import resource')
+    lines.append('    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux')
+    lines.append('    peak_kb = MPI.COMM_WORLD.allreduce(peak_kb) if "MPI" in globals() else peak_kb * size')
+    lines.append('    if rank == 0:')
+    lines.append('        print(f"OPENSN_RUN: ranks={size} wall_s={solve_wall:.3f} mem_gb={peak_kb / 1024**2:.3f} "')
+    lines.append(f'              f"n_polar={N_POLAR} n_azimuthal={N_AZIMUTHAL} scattering_order={SCATTERING_ORDER}")')
     lines.append('')
 
     # ---- export --------------------------------------------------------
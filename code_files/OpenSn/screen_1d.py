@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fast k-eigenvalue screening of the whole catalog with the 1D spherical scripts.
+
+Runs every {BENCHMARK}_{case}_1D.py written by OpenSn1DGen.py (several at a
+time on one node), parses "Computed k-eigenvalue:" from each, and writes
+k_screening_1d.csv sorted by |C/E - 1|. Cases outside SCREEN_TOL are flagged
+as suspicious; only those need the expensive 3D runs.
+
+Expected values are read from benchmark_keff.csv (columns: case,keff) in this
+folder when present, where case is e.g. "heu-met-fast-001/case-1";
+otherwise E = 1.0 (critical benchmark) is assumed.
+
+Environment:
+    MAX_WORKERS      concurrent OpenSn processes (default: CPU count)
+    OPENSN_PYTHON    interpreter used to run the scripts (default: this one)
+    SCREEN_TOL       |C/E - 1| above which a case is flagged (default: 0.01)
+    SCREEN_TIMEOUT   per-case timeout in seconds (default: 1800)
+"""
+
+import csv
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+K_PATTERN = re.compile(r"Computed k-eigenvalue:\s*([0-9.eE+-]+)")
+RESULTS_NAME = "k_screening_1d.csv"
+EXPECTED_NAME = "benchmark_keff.csv"
+
+SCREEN_TOL = float(os.getenv("SCREEN_TOL", "0.01"))
+SCREEN_TIMEOUT = float(os.getenv("SCREEN_TIMEOUT", "1800"))
+
+
+def discover_scripts(spherical_cases_dir: Path) -> list[Path]:
+    return sorted(spherical_cases_dir.glob("*/case-*/*_1D.py"))
+
+
+def load_expected(path: Path) -> dict[str, float]:
+    if not path.is_file():
+        return {}
+    with open(path, "r", newline="") as f:
+        return {row["case"].strip(): float(row["keff"]) for row in csv.DictReader(f)}
+
+
+def run_case(script: Path, python: str) -> tuple[float | None, float, str]:
+    """Run one 1D script in its case folder. Returns (k or None, seconds, failure reason)."""
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.run(
+            [python, script.name],
+            cwd=str(script.parent),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            timeout=SCREEN_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        return None, time.perf_counter() - t0, f"TIMEOUT after {SCREEN_TIMEOUT:.0f}s"
+    dt = time.perf_counter() - t0
+    matches = K_PATTERN.findall(proc.stdout)
+    if proc.returncode != 0:
+        return None, dt, f"EXIT {proc.returncode}"
+    if not matches:
+        return None, dt, "no k-eigenvalue in output"
+    return float(matches[-1]), dt, ""
+
+
+def main():
+    script_dir = Path(__file__).resolve().parent
+    spherical_cases_dir = (script_dir / ".." / ".." / "spherical_cases").resolve()
+    if not spherical_cases_dir.is_dir():
+        print(f"ERROR: spherical_cases directory not found at {spherical_cases_dir}")
+        sys.exit(1)
+
+    scripts = discover_scripts(spherical_cases_dir)
+    expected = load_expected(script_dir / EXPECTED_NAME)
+    python = os.getenv("OPENSN_PYTHON", sys.executable)
+    max_workers_env = os.getenv("MAX_WORKERS")
+    max_workers = int(max_workers_env) if max_workers_env else (os.cpu_count() or 1)
+    print(f"Discovered {len(scripts)} 1D scripts; running with {max_workers} workers")
+
+    rows = []
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_case, s, python): s for s in scripts}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            script = futures[fut]
+            case = f"{script.parent.parent.name}/{script.parent.name}"
+            k, dt, reason = fut.result()
+            e = expected.get(case, 1.0)
+            c_over_e = (k / e) if k is not None else None
+            suspicious = c_over_e is None or abs(c_over_e - 1.0) > SCREEN_TOL
+            rows.append({
+                "case": case,
+                "k": "" if k is None else f"{k:.6f}",
+                "expected": f"{e:.5f}",
+                "c_over_e": "" if c_over_e is None else f"{c_over_e:.5f}",
+                "suspicious": int(suspicious),
+                "seconds": f"{dt:.1f}",
+                "reason": reason,
+            })
+            status = reason if reason else f"k={k:.6f} C/E={c_over_e:.5f}"
+            print(f"-----------{done}/{len(scripts)}----------- {case}: {status}")
+
+    # Failed runs first, then the largest deviations
+    rows.sort(key=lambda r: (1, 0.0) if not r["c_over_e"] else (0, abs(float(r["c_over_e"]) - 1.0)), reverse=True)
+    out_path = script_dir / RESULTS_NAME
+    with open(out_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["case"])
+        w.writeheader()
+        w.writerows(rows)
+
+    n_susp = sum(r["suspicious"] for r in rows)
+    print(f"\nScreened {len(rows)} case(s) in {time.perf_counter() - t0:.1f}s; "
+          f"{n_susp} flagged for 3D runs (|C/E - 1| > {SCREEN_TOL}).")
+    print(f"Results written to: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,167 @@
 import os
 import sys
 import time
+import signal
+import asyncio
 import subprocess
 from pathlib import Path
-from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import mesh_timing
+import solve_cost
+import msh_storage
+import tune_threads
+import mesh_tiers
 
 FAIL_LOG_NAME = "failed_cases.txt"
+TIMING_DIR_NAME = "timing_events"                  # per-case JSON-lines files of the current run
+TIMING_TABLE_NAME = "mesh_timing.csv"              # one row per (case, stage)
+TIMING_SUMMARY_NAME = "mesh_timing_summary.csv"    # per-stage percentiles across the catalog
+TIMING_BASELINE_NAME = "mesh_timing_baseline.csv"  # optional copy of a previous summary to compare against
 DEFAULT_CASE_TIMEOUT_SEC = int(os.getenv("CASE_TIMEOUT_SEC", 3*3600))  # 1 hr
+KILL_GRACE_SEC = float(os.getenv("KILL_GRACE_SEC", "10"))  # SIGTERM -> SIGKILL delay for timed-out meshers
+PROJECT_SPHERES = bool(int(os.getenv("GMESH_PROJECT_SPHERES", "0")))  # exact shell volumes, see project_spheres.py
+RENUMBER_METHOD = os.getenv("GMESH_RENUMBER", "").strip().lower()  # hilbert / morton / rcm, see renumber_mesh.py
+COMPRESS_MESHES = bool(int(os.getenv("GMESH_COMPRESS", "0")))  # store as .msh.zst, see msh_storage.py
+TIERED = bool(int(os.getenv("GMESH_TIERED", "0")))  # hxt -> delaunay -> relaxed -> coarse -> frontal, see mesh_tiers.py
+PARALLEL_SHELLS = bool(int(os.getenv("GMESH_PARALLEL_SHELLS", "0")))  # one process per shell, see parallel_shells.py
+PARALLEL_MIN_SHELLS = int(os.getenv("GMESH_PARALLEL_MIN_SHELLS", "4"))
+
+def _signal_group(proc, sig):
+    try:
+        os.killpg(proc.pid, sig)
+    except ProcessLookupError:
+        pass
+
+async def terminate_group(proc):
+    """
+    SIGTERM the child's whole process group (gmsh threads, parallel_shells.py
+    workers), SIGKILL whatever is left after KILL_GRACE_SEC.
+    """
+    _signal_group(proc, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), KILL_GRACE_SEC)
+    except asyncio.TimeoutError:
+        pass
+    # Grandchildren may outlive the group leader
+    _signal_group(proc, signal.SIGKILL)
+    await proc.wait()
+
+async def _stream_output(stream, prefix: str):
+    async for line in stream:
+        sys.stdout.write(prefix + line.decode(errors="replace"))
+        sys.stdout.flush()
+
+async def run_child(cmd, timeout_sec, cwd: Path, env, prefix: str):
+    """
+    Run cmd in its own process group with its output streamed line by line
+    under `prefix`. Raises subprocess.TimeoutExpired after timeout_sec (the group
+    is terminated first) and subprocess.CalledProcessError on a non-zero exit;
+    cancellation terminates the group as well.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, cwd=str(cwd), env=env, start_new_session=True,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=1 << 20,
+    )
+    pump = asyncio.create_task(_stream_output(proc.stdout, prefix))
+    try:
+        await asyncio.wait_for(proc.wait(), timeout_sec)
+    except asyncio.TimeoutError:
+        await terminate_group(proc)
+        raise subprocess.TimeoutExpired(cmd=Path(cmd[1]).name, timeout=timeout_sec)
+    except asyncio.CancelledError:
+        await terminate_group(proc)
+        raise
+    finally:
+        # A surviving grandchild could hold the pipe open; do not wait for it forever
+        try:
+            await asyncio.wait_for(pump, KILL_GRACE_SEC)
+        except asyncio.TimeoutError:
+            pass
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, Path(cmd[1]).name)
+
+def postprocess_mesh(radii_list, radii_file_path):
+    """Projection, renumbering and compression of a freshly written mesh."""
+    if PROJECT_SPHERES:
+        # Imported lazily so the default path keeps working without NumPy in the driver
+        from project_spheres import project_case
+        project_case(radii_file_path)
+
+    if RENUMBER_METHOD not in ("", "none", "0"):
+        from renumber_mesh import renumber_case
+        renumber_case(radii_file_path, RENUMBER_METHOD)
 
-def run_worker(radii_list, radii_file_path, timeout_sec, gmsh_code_dir: Path) -> str:
+    msh_path = Path(radii_file_path).parent / f"n_shells_sphere_{len(radii_list)}_shells.msh"
+    stale = msh_storage.compressed_path(msh_path)
+    if COMPRESS_MESHES:
+        msh_storage.compress_mesh(msh_path)
+    elif stale.is_file():
+        stale.unlink()  # the fresh plain mesh replaces an older archive
+
+async def run_case(radii_list, radii_file_path, timeout_sec, gmsh_code_dir: Path, events_path=None, threads=None,
+                   known_tiers=None, shell_workers=None) -> tuple:
     """
     radii_list: list[str] parsed from radii.txt
     radii_file_path: full path to the radii.txt used for logging
+    timeout_sec: wall-clock budget of all mesher runs of this case, counted from its start
     gmsh_code_dir: folder containing nShell.py
+    events_path: JSON-lines file nShell.py appends its stage timing events to
+    threads: gmsh threads for this case (None keeps the GMESH_THREADS* environment)
+    known_tiers: mesh_tiers.json contents; a remembered tier is tried first
+    shell_workers: concurrent shell processes of parallel_shells.py (None keeps GMESH_SHELL_WORKERS)
+    Returns (radii_file_path, geometry fingerprint, tier that succeeded); the
+    last two are None without tiers.
     """
-    start = time.monotonic()
-
-    # Run nShell.py from gmsh_code so relative imports/paths work
-    remaining = timeout_sec - (time.monotonic() - start)
-    if remaining <= 0:
-        raise subprocess.TimeoutExpired(cmd="nShell.py", timeout=timeout_sec)
+    deadline = time.monotonic() + timeout_sec
+    case = "/".join(Path(radii_file_path).parts[-4:-2])
+    prefix = f"[{case}] "
 
     nshell = gmsh_code_dir / "nShell.py"
-    # Ensure we execute from gmsh_code to match script expectations
-    subprocess.run(
-        [sys.executable, str(nshell), ",".join(radii_list), str(radii_file_path)],
-        check=True,
-        timeout=remaining,
-        cwd=str(gmsh_code_dir),
-    )
+    if PARALLEL_SHELLS and len(radii_list) >= PARALLEL_MIN_SHELLS:
+        nshell = gmsh_code_dir / "parallel_shells.py"  # same command line and output
+    env = os.environ.copy()
+    env["PYTHONUNBUFFERED"] = "1"  # stream progress lines as they are printed
+    if events_path is not None:
+        env[mesh_timing.EVENTS_ENV] = str(events_path)
+    if threads is not None:
+        for key in ("GMESH_THREADS", "GMESH_MAX_THREADS_2D", "GMESH_MAX_THREADS_3D"):
+            env[key] = str(threads)
+    if shell_workers is not None:
+        env["GMESH_SHELL_WORKERS"] = str(shell_workers)
+    # Finest mesh whose predicted OpenSn solve fits OPENSN_BUDGET_SEC / OPENSN_BUDGET_MEM_GB
+    max_cells = solve_cost.max_cells_from_env(case=case)
+    if max_cells is not None:
+        env["GMESH_MAX_CELLS"] = str(max(max_cells, 1))
+    # Run from gmsh_code so relative imports/paths work
+    cmd = [sys.executable, str(nshell), ",".join(radii_list), str(radii_file_path)]
+    geom_key, tier_used = None, None
+    if not TIERED:
+        await run_child(cmd, timeout_sec, gmsh_code_dir, env, prefix)
+    else:
+        # Each tier gets its slice of what is left of the case budget
+        geom_key = mesh_tiers.fingerprint(radii_list, env)
+        tiers = mesh_tiers.tiers_from((known_tiers or {}).get(geom_key, {}).get("tier"))
+        failures = []
+        while tiers and tier_used is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            slice_sec = mesh_tiers.time_slice(tiers, remaining)
+            env["GMESH_TIER"] = tiers[0]
+            try:
+                await run_child(cmd, slice_sec, gmsh_code_dir, env, f"[{case} {tiers[0]}] ")
+                tier_used = tiers[0]
+            except subprocess.TimeoutExpired:
+                failures.append(f"{tiers[0]}=TIMEOUT {slice_sec:.0f}s")
+            except subprocess.CalledProcessError as e:
+                failures.append(f"{tiers[0]}=EXIT {e.returncode}")
+            tiers = tiers[1:]
+        if tier_used is None:
+            raise RuntimeError(f"all tiers failed ({', '.join(failures) or 'no time left'})")
 
-    return str(radii_file_path)
+    # NumPy post-processing in a thread keeps the event loop responsive
+    await asyncio.to_thread(postprocess_mesh, radii_list, radii_file_path)
+    return str(radii_file_path), geom_key, tier_used
 
 def discover_cases(spherical_cases_dir: Path):
     """
@@ -49,7 +180,25 @@ def discover_cases(spherical_cases_dir: Path):
                 all_radii.append(radii)
     return filepaths, all_radii
 
-def main():
+def write_timing_report(gmsh_code_dir: Path, timing_dir: Path):
+    """
+    Collect every case's events into the per-run table and print the per-stage
+    percentiles, compared against mesh_timing_baseline.csv when it exists.
+    """
+    events = mesh_timing.load_events(sorted(timing_dir.glob("*.jsonl")))
+    if not events:
+        print("No timing events recorded.")
+        return
+    mesh_timing.write_timing_table(events, gmsh_code_dir / TIMING_TABLE_NAME)
+    summary = mesh_timing.stage_summary(events)
+    mesh_timing.write_stage_summary(summary, gmsh_code_dir / TIMING_SUMMARY_NAME)
+
+    baseline_path = gmsh_code_dir / TIMING_BASELINE_NAME
+    baseline = mesh_timing.read_stage_summary(baseline_path) if baseline_path.is_file() else None
+    print(mesh_timing.format_summary(summary, baseline))
+    print(f"Timing table written to: {gmsh_code_dir / TIMING_TABLE_NAME}")
+
+async def supervise():
     # repo_root/
     repo_root = Path(__file__).resolve().parents[2]
     # code_files/gmsh_code/
@@ -64,64 +213,123 @@ def main():
     with open(fail_log_path, "w") as f:
         f.write("")
 
+    # Fresh per-case timing event files for this run
+    timing_dir = gmsh_code_dir / TIMING_DIR_NAME
+    timing_dir.mkdir(exist_ok=True)
+    for old in timing_dir.glob("*.jsonl"):
+        old.unlink()
+
     # Find all radii.txt under spherical_cases/**/mesh/
     filepaths, all_radii = discover_cases(spherical_cases_dir)
 
+    # Tier that worked for each geometry in earlier runs
+    known_tiers = mesh_tiers.load_tiers() if TIERED else {}
+
     # Optional: narrow to a specific case (keep or remove as desired)
     #filepaths = filepaths[2:3]
     #all_radii = all_radii[2:3]
 
-    # Concurrency
+    # Concurrency: MAX_WORKERS / GMESH_THREADS by hand, else the calibrated
+    # threads-vs-workers split of this host (tune_threads.py calibrate)
     max_workers_env = os.getenv("MAX_WORKERS")
     max_workers = int(max_workers_env) if max_workers_env else (os.cpu_count() or 1)
-    print(f"Discovered {len(filepaths)} cases; running with {max_workers} workers")
+    case_threads = None
+    profile = tune_threads.load_profile()
+    if profile is not None and not max_workers_env and "GMESH_THREADS" not in os.environ:
+        case_threads, max_workers = tune_threads.plan(profile, len(filepaths))
+    threads_note = f", {case_threads} gmsh threads each (calibrated)" if case_threads else ""
+    print(f"Discovered {len(filepaths)} cases; running with {max_workers} workers{threads_note}")
+    # Parallel-shell cases share their slot's cores: cores per case // threads per shell process
+    shell_workers = None
+    if PARALLEL_SHELLS and "GMESH_SHELL_WORKERS" not in os.environ:
+        shell_threads = case_threads or int(os.getenv("GMESH_THREADS", "1"))
+        shell_workers = max(1, (os.cpu_count() or 1) // max_workers // max(1, shell_threads))
 
-    futures = {}
     completed = 0
     total = len(filepaths)
+    n_cancelled = 0
 
     def log_failure(line: str):
         with open(fail_log_path, "a") as f:
             f.write(line + "\n")
 
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        for idx, (fp, radii_list) in enumerate(zip(filepaths, all_radii), start=1):
-            fut = executor.submit(
-                run_worker, radii_list, str(fp), DEFAULT_CASE_TIMEOUT_SEC, gmsh_code_dir
-            )
-            futures[fut] = (idx, fp, radii_list)
+    # At most max_workers meshers run at once; each case's budget starts when it gets a slot
+    slots = asyncio.Semaphore(max_workers)
 
-        for fut in as_completed(futures):
-            idx, fp, radii_list = futures[fut]
-            try:
-                radii_str = ",".join(radii_list)
-            except TypeError:
-                radii_str = ",".join(str(x) for x in radii_list)
+    async def run_slot(idx, fp, radii_list):
+        try:
+            async with slots:
+                result = await run_case(radii_list, str(fp), DEFAULT_CASE_TIMEOUT_SEC, gmsh_code_dir,
+                                        timing_dir / f"task_{idx:04d}.jsonl", case_threads, known_tiers,
+                                        shell_workers)
+            return idx, fp, radii_list, result, None
+        except asyncio.CancelledError as e:
+            return idx, fp, radii_list, None, e  # running children are already terminated
+        except Exception as e:
+            return idx, fp, radii_list, None, e
 
-            try:
-                data_path = fut.result()
-                completed += 1
-                print(f"-----------{completed}/{total}----------- OK: {data_path}")
-            except subprocess.TimeoutExpired as e:
-                completed += 1
-                case_dir = Path(fp).parent
-                reason = f"TIMEOUT after {DEFAULT_CASE_TIMEOUT_SEC}s in {e.cmd}"
-                print(f"-----------{completed}/{total}----------- FAIL: {fp} ({reason})")
-                log_failure(f"Task {idx}/{total} | FAIL | {case_dir} | radii=[{radii_str}] | {reason}")
-            except subprocess.CalledProcessError as e:
-                completed += 1
-                case_dir = Path(fp).parent
-                reason = f"EXIT {e.returncode}"
-                print(f"-----------{completed}/{total}----------- FAIL: {fp} ({reason})")
-                log_failure(f"Task {idx}/{total} | FAIL | {case_dir} | radii=[{radii_str}] | {reason}")
-            except Exception as e:
-                completed += 1
-                case_dir = Path(fp).parent
-                reason = f"{type(e).__name__}: {e}"
-                print(f"-----------{completed}/{total}----------- ERROR: {fp} ({reason})")
-                log_failure(f"Task {idx}/{total} | ERROR | {case_dir} | radii=[{radii_str}] | {reason}")
+    tasks = [asyncio.create_task(run_slot(idx, fp, radii_list))
+             for idx, (fp, radii_list) in enumerate(zip(filepaths, all_radii), start=1)]
+
+    # Ctrl-C / SIGTERM: cancel every case, which terminates the running meshers' process groups
+    def cancel_run():
+        print("Cancelling: terminating running meshers ...", flush=True)
+        for task in tasks:
+            task.cancel()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, cancel_run)
 
+    for next_done in asyncio.as_completed(tasks):
+        try:
+            idx, fp, radii_list, result, exc = await next_done
+        except asyncio.CancelledError:
+            n_cancelled += 1  # cancelled before it started
+            continue
+        try:
+            radii_str = ",".join(radii_list)
+        except TypeError:
+            radii_str = ",".join(str(x) for x in radii_list)
+        case_dir = Path(fp).parent
+
+        if exc is None:
+            data_path, geom_key, tier = result
+            completed += 1
+            tier_note = f" (tier {tier})" if tier else ""
+            print(f"-----------{completed}/{total}----------- OK: {data_path}{tier_note}")
+            if geom_key and known_tiers.get(geom_key, {}).get("tier") != tier:
+                known_tiers[geom_key] = {"tier": tier, "case": "/".join(Path(data_path).parts[-4:-2])}
+                mesh_tiers.save_tiers(known_tiers)
+        elif isinstance(exc, asyncio.CancelledError):
+            n_cancelled += 1
+            log_failure(f"Task {idx}/{total} | CANCELLED | {case_dir} | radii=[{radii_str}]")
+        elif isinstance(exc, subprocess.TimeoutExpired):
+            completed += 1
+            reason = f"TIMEOUT after {DEFAULT_CASE_TIMEOUT_SEC}s in {exc.cmd}"
+            print(f"-----------{completed}/{total}----------- FAIL: {fp} ({reason})")
+            log_failure(f"Task {idx}/{total} | FAIL | {case_dir} | radii=[{radii_str}] | {reason}")
+        elif isinstance(exc, subprocess.CalledProcessError):
+            completed += 1
+            reason = f"EXIT {exc.returncode}"
+            print(f"-----------{completed}/{total}----------- FAIL: {fp} ({reason})")
+            log_failure(f"Task {idx}/{total} | FAIL | {case_dir} | radii=[{radii_str}] | {reason}")
+        else:
+            completed += 1
+            reason = f"{type(exc).__name__}: {exc}"
+            print(f"-----------{completed}/{total}----------- ERROR: {fp} ({reason})")
+            log_failure(f"Task {idx}/{total} | ERROR | {case_dir} | radii=[{radii_str}] | {reason}")
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.remove_signal_handler(sig)
+    if n_cancelled:
+        print(f"Run cancelled: {n_cancelled} case(s) not finished.")
     print(f"Failure log written to: {fail_log_path}")
+    write_timing_report(gmsh_code_dir, timing_dir)
+    return 130 if n_cancelled else 0
+
+def main() -> int:
+    return asyncio.run(supervise())
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Benchmark the two OCC shell-construction paths of nShell.py.
+
+Each case is built with GMESH_OCC_BOOLEAN=fragment and =cut (geometry only,
+GMESH_GEOMETRY_ONLY=1, no meshing) BENCH_REPEATS times in fresh processes; the
+"occ_build" wall time is read from the nShell.py timing events. By default
+all cases with at least BENCH_MIN_SHELLS shells are used (heu-met-fast-001,
+-027, -029, pu-met-fast-036, ...).
+
+Results go to occ_boolean_benchmark.csv in this folder: per case the median
+occ_build time of both modes and the cut/fragment speedup.
+
+Usage:
+    python bench_occ_boolean.py                  # cases with >= BENCH_MIN_SHELLS shells
+    python bench_occ_boolean.py path/to/radii.txt ...
+"""
+
+import csv
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import mesh_timing
+
+BENCH_NAME = "occ_boolean_benchmark.csv"
+MODES = ("fragment", "cut")
+MIN_SHELLS = int(os.getenv("BENCH_MIN_SHELLS", "10"))
+REPEATS = int(os.getenv("BENCH_REPEATS", "5"))
+
+
+def read_radii(radii_path: Path) -> list[str]:
+    with open(radii_path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def time_build(radii: list[str], radii_path: Path, mode: str, gmsh_code_dir: Path) -> tuple[float, str]:
+    """occ_build wall seconds of one geometry-only nShell.py run, and the boolean actually used."""
+    with tempfile.TemporaryDirectory() as tmp:
+        events_path = Path(tmp) / "events.jsonl"
+        env = os.environ.copy()
+        env.update({
+            mesh_timing.EVENTS_ENV: str(events_path),
+            "GMESH_OCC_BOOLEAN": mode,
+            "GMESH_GEOMETRY_ONLY": "1",
+        })
+        subprocess.run(
+            [sys.executable, str(gmsh_code_dir / "nShell.py"), ",".join(radii), str(radii_path)],
+            check=True, cwd=str(gmsh_code_dir), env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        for ev in mesh_timing.load_events([events_path]):
+            if ev["stage"] == "occ_build" and ev["status"] == "ok":
+                return ev["wall_s"], ev.get("extra", {}).get("boolean", mode)
+    raise RuntimeError(f"No occ_build event for {radii_path} ({mode})")
+
+
+def main() -> int:
+    repo_root = Path(__file__).resolve().parents[2]
+    gmsh_code_dir = Path(__file__).resolve().parent
+    if len(sys.argv) > 1:
+        radii_paths = [Path(p).resolve() for p in sys.argv[1:]]
+    else:
+        radii_paths = [p for p in sorted((repo_root / "spherical_cases").glob("**/mesh/radii.txt"))
+                       if len(read_radii(p)) >= MIN_SHELLS]
+    print(f"Benchmarking {len(radii_paths)} cases, {REPEATS} repeats per mode")
+
+    rows = []
+    for rp in radii_paths:
+        radii = read_radii(rp)
+        row = {"case": "/".join(rp.parts[-4:-2]), "shells": len(radii)}
+        for mode in MODES:
+            times, used = [], mode
+            for _ in range(REPEATS):
+                wall, used = time_build(radii, rp, mode, gmsh_code_dir)
+                times.append(wall)
+            row[f"{mode}_s"] = f"{statistics.median(times):.4f}"
+            row[f"{mode}_used"] = used  # "cut" here for fragment means it fell back
+        row["speedup"] = f"{float(row['cut_s']) / max(float(row['fragment_s']), 1e-9):.2f}"
+        rows.append(row)
+        print(f"{row['case']} ({row['shells']} shells): fragment {row['fragment_s']} s, "
+              f"cut {row['cut_s']} s, speedup x{row['speedup']}")
+
+    out_path = gmsh_code_dir / BENCH_NAME
+    with open(out_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["case", "shells", "fragment_s", "fragment_used", "cut_s", "cut_used", "speedup"])
+        w.writeheader()
+        w.writerows(rows)
+    print(f"Benchmark written to: {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
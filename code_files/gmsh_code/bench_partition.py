@@ -0,0 +1,138 @@
+"""
+Benchmark sweep parallel efficiency of the sphere partitions against ParMETIS.
+
+For each case, sphere_partition.py writes mesh/partition.json (sector and KBA
+layouts with their sweep-model ratings). Then the case's generated 3D OpenSn
+script is run at every rank count in BENCH_RANKS twice, with
+OPENSN_PARTITIONER=parmetis and OPENSN_PARTITIONER=kba, and "Solve wall time"
+is parsed from its output. The parallel efficiency of a partitioner is
+relative to its own run at the smallest rank count:
+
+    efficiency(P) = T(P0) * P0 / (T(P) * P)
+
+Environment:
+    OPENSN_PYTHON    interpreter used to run the OpenSn scripts (default: this one)
+    OPENSN_LAUNCH    launcher template with {ranks}, e.g. "mpiexec -n {ranks}" (default: that)
+    BENCH_RANKS      comma-separated rank counts (default: 8,16,32,64,128)
+    BENCH_N_CASES    number of largest catalog meshes (default: 3)
+    BENCH_SKIP_SOLVE 1 = sweep-model ratings only
+    BENCH_TIMEOUT    per-run timeout in seconds (default: 7200)
+
+Results go to partition_benchmark.csv in this folder.
+
+Usage:
+    python bench_partition.py                       # the BENCH_N_CASES largest catalog meshes
+    python bench_partition.py path/to/radii.txt ...
+"""
+
+import csv
+import os
+import shlex
+import subprocess
+import sys
+from pathlib import Path
+
+import msh_storage
+import sphere_partition
+from bench_renumber import K_PATTERN, SOLVE_PATTERN, mesh_path_for
+
+BENCH_NAME = "partition_benchmark.csv"
+RANKS = [int(p) for p in os.getenv("BENCH_RANKS", "8,16,32,64,128").split(",") if p.strip()]
+N_CASES = int(os.getenv("BENCH_N_CASES", "3"))
+SKIP_SOLVE = bool(int(os.getenv("BENCH_SKIP_SOLVE", "0")))
+TIMEOUT = float(os.getenv("BENCH_TIMEOUT", "7200"))
+
+
+def run_solve(case_dir: Path, n_ranks: int, partitioner: str) -> tuple:
+    """(solve seconds, k) of the case's 3D OpenSn script on n_ranks ranks, or (None, None)."""
+    scripts = [p for p in case_dir.glob("*.py") if not p.name.endswith("_1D.py")]
+    if not scripts:
+        return None, None
+    launch = os.getenv("OPENSN_LAUNCH", "mpiexec -n {ranks}").format(ranks=n_ranks)
+    cmd = shlex.split(launch) + [os.getenv("OPENSN_PYTHON", sys.executable), scripts[0].name]
+    env = os.environ.copy()
+    env["OPENSN_PARTITIONER"] = partitioner
+    try:
+        proc = subprocess.run(cmd, cwd=str(case_dir), env=env, text=True, timeout=TIMEOUT,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except subprocess.TimeoutExpired:
+        return None, None
+    solve, k = SOLVE_PATTERN.findall(proc.stdout), K_PATTERN.findall(proc.stdout)
+    return (float(solve[-1]) if solve else None), (float(k[-1]) if k else None)
+
+
+def bench_case(radii_path: Path) -> list[dict]:
+    case_dir = radii_path.parent.parent
+    case = "/".join(radii_path.parts[-4:-2])
+    layouts = sphere_partition.partition_case(radii_path, RANKS)
+    rows = []
+    for partitioner in ("sectors", "kba", "parmetis"):
+        base = None
+        for n_ranks in RANKS:
+            entry = layouts["ranks"][str(n_ranks)]
+            model = entry["model"].get(partitioner, {})
+            solve_s, k = None, None
+            if partitioner != "sectors" and not SKIP_SOLVE:
+                # OpenSn can only build the KBA layout itself; sectors are rated by the model only
+                solve_s, k = run_solve(case_dir, n_ranks, partitioner)
+            if solve_s is not None and base is None:
+                base = (n_ranks, solve_s)
+            layout = entry.get(partitioner, {})
+            rows.append({
+                "case": case,
+                "cells": layouts["cells"],
+                "partitioner": partitioner,
+                "ranks": n_ranks,
+                "layout": "x".join(str(layout[key]) for key in ("nx", "ny", "nz")) if partitioner == "kba" else
+                          "x".join(str(layout[key]) for key in ("n_pol", "n_az", "n_rad")) if layout else "",
+                "imbalance": model.get("imbalance", ""),
+                "mean_stages": model.get("mean_stages", ""),
+                "lagged_fraction": model.get("lagged_fraction", ""),
+                "model_efficiency": model.get("efficiency", ""),
+                "solve_s": "" if solve_s is None else f"{solve_s:.3f}",
+                "keff": "" if k is None else f"{k:.6f}",
+                "efficiency": "" if solve_s is None or base is None else
+                              f"{base[1] * base[0] / (solve_s * n_ranks):.3f}",
+            })
+    # Speedup of the KBA layout over ParMETIS at equal rank counts
+    parmetis = {r["ranks"]: r["solve_s"] for r in rows if r["partitioner"] == "parmetis"}
+    for r in rows:
+        p = parmetis.get(r["ranks"])
+        r["speedup_vs_parmetis"] = f"{float(p) / float(r['solve_s']):.3f}" if p and r["solve_s"] else ""
+    return rows
+
+
+def main() -> int:
+    repo_root = Path(__file__).resolve().parents[2]
+    gmsh_code_dir = Path(__file__).resolve().parent
+    if len(sys.argv) > 1:
+        radii_paths = [Path(p).resolve() for p in sys.argv[1:]]
+    else:
+        # Large meshes are where rank counts up to 128 make sense
+        candidates = [p for p in (repo_root / "spherical_cases").glob("**/mesh/radii.txt")
+                      if msh_storage.resolve_mesh(mesh_path_for(p)) is not None]
+        candidates.sort(key=lambda p: msh_storage.resolve_mesh(mesh_path_for(p)).stat().st_size, reverse=True)
+        radii_paths = candidates[:N_CASES]
+
+    rows = []
+    for rp in radii_paths:
+        case_rows = bench_case(rp)
+        rows.extend(case_rows)
+        for r in case_rows:
+            print(f"{r['case']} {r['partitioner']:>8} {r['ranks']:>4} ranks {r['layout'] or '-':>7}: "
+                  f"model {r['model_efficiency'] or '-':>6}, solve {r['solve_s'] or '-':>9} s, "
+                  f"efficiency {r['efficiency'] or '-':>6}, vs parmetis {r['speedup_vs_parmetis'] or '-'}")
+
+    out_path = gmsh_code_dir / BENCH_NAME
+    with open(out_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["case", "cells", "partitioner", "ranks", "layout", "imbalance",
+                                          "mean_stages", "lagged_fraction", "model_efficiency", "solve_s",
+                                          "keff", "efficiency", "speedup_vs_parmetis"])
+        w.writeheader()
+        w.writerows(rows)
+    print(f"Benchmark written to: {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Benchmark OpenSn solve time on renumbered versus original meshes.
+
+For each case the mesh is copied to a scratch folder once per variant
+(original, and one per renumbering method) and renumbered there; the case's
+generated 3D OpenSn script is then run against each copy through
+OPENSN_MESH_FILE, and "Solve wall time" / "Computed k-eigenvalue" are parsed
+from its output. The locality measures of renumber_mesh.py are recorded for
+every variant as well, so the table is useful even without OpenSn.
+
+Environment:
+    OPENSN_PYTHON    interpreter used to run the OpenSn scripts (default: this one)
+    OPENSN_LAUNCH    launcher prefix, e.g. "mpiexec -n 8" (default: none)
+    BENCH_METHODS    comma-separated methods (default: hilbert,morton,rcm)
+    BENCH_SKIP_SOLVE 1 = locality measures only
+    BENCH_TIMEOUT    per-run timeout in seconds (default: 7200)
+
+Results go to renumber_benchmark.csv in this folder.
+
+Usage:
+    python bench_renumber.py                       # the BENCH_N_CASES largest catalog meshes
+    python bench_renumber.py path/to/radii.txt ...
+"""
+
+import csv
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import msh41
+import msh_storage
+import renumber_mesh
+
+BENCH_NAME = "renumber_benchmark.csv"
+SOLVE_PATTERN = re.compile(r"Solve wall time:\s*([0-9.eE+-]+)")
+K_PATTERN = re.compile(r"Computed k-eigenvalue:\s*([0-9.eE+-]+)")
+
+METHODS = [m.strip() for m in os.getenv("BENCH_METHODS", ",".join(renumber_mesh.METHODS)).split(",") if m.strip()]
+N_CASES = int(os.getenv("BENCH_N_CASES", "3"))
+SKIP_SOLVE = bool(int(os.getenv("BENCH_SKIP_SOLVE", "0")))
+TIMEOUT = float(os.getenv("BENCH_TIMEOUT", "7200"))
+
+
+def mesh_path_for(radii_path: Path) -> Path:
+    with open(radii_path, "r") as f:
+        n_shells = sum(1 for line in f if line.strip())
+    return radii_path.parent / f"n_shells_sphere_{n_shells}_shells.msh"
+
+
+def run_solve(case_dir: Path, mesh_file: Path) -> tuple:
+    """(solve seconds, k) of the case's 3D OpenSn script on mesh_file, or (None, None)."""
+    scripts = [p for p in case_dir.glob("*.py") if not p.name.endswith("_1D.py")]
+    if not scripts:
+        return None, None
+    cmd = shlex.split(os.getenv("OPENSN_LAUNCH", "")) + [os.getenv("OPENSN_PYTHON", sys.executable), scripts[0].name]
+    env = os.environ.copy()
+    env["OPENSN_MESH_FILE"] = str(mesh_file)
+    try:
+        proc = subprocess.run(cmd, cwd=str(case_dir), env=env, text=True, timeout=TIMEOUT,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    except subprocess.TimeoutExpired:
+        return None, None
+    solve, k = SOLVE_PATTERN.findall(proc.stdout), K_PATTERN.findall(proc.stdout)
+    return (float(solve[-1]) if solve else None), (float(k[-1]) if k else None)
+
+
+def bench_case(radii_path: Path) -> list[dict]:
+    case_dir = radii_path.parent.parent
+    case = "/".join(radii_path.parts[-4:-2])
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        with msh_storage.materialized(mesh_path_for(radii_path)) as original:
+            for variant in ["original"] + METHODS:
+                mesh_file = Path(tmp) / f"{variant}.msh"
+                shutil.copy(original, mesh_file)
+                if variant != "original":
+                    renumber_mesh.renumber_mesh(mesh_file, variant)
+                stats = renumber_mesh.locality_stats(msh41.read_msh41(mesh_file))
+                solve_s, k = (None, None) if SKIP_SOLVE else run_solve(case_dir, mesh_file)
+                rows.append({
+                    "case": case,
+                    "variant": variant,
+                    "cells": stats["cells"],
+                    "dual_gap_mean": f"{stats['dual_gap_mean']:.1f}",
+                    "node_span_mean": f"{stats['node_span_mean']:.1f}",
+                    "solve_s": "" if solve_s is None else f"{solve_s:.3f}",
+                    "keff": "" if k is None else f"{k:.6f}",
+                })
+    base = rows[0]["solve_s"]
+    for r in rows:
+        r["speedup"] = f"{float(base) / float(r['solve_s']):.3f}" if base and r["solve_s"] else ""
+    return rows
+
+
+def main() -> int:
+    repo_root = Path(__file__).resolve().parents[2]
+    gmsh_code_dir = Path(__file__).resolve().parent
+    if len(sys.argv) > 1:
+        radii_paths = [Path(p).resolve() for p in sys.argv[1:]]
+    else:
+        # The largest meshes benefit most and make timings least noisy
+        candidates = [p for p in (repo_root / "spherical_cases").glob("**/mesh/radii.txt")
+                      if msh_storage.resolve_mesh(mesh_path_for(p)) is not None]
+        candidates.sort(key=lambda p: msh_storage.resolve_mesh(mesh_path_for(p)).stat().st_size, reverse=True)
+        radii_paths = candidates[:N_CASES]
+
+    rows = []
+    for rp in radii_paths:
+        case_rows = bench_case(rp)
+        rows.extend(case_rows)
+        for r in case_rows:
+            print(f"{r['case']} {r['variant']:>8}: gap {r['dual_gap_mean']:>9}, span {r['node_span_mean']:>9}, "
+                  f"solve {r['solve_s'] or '-':>9} s, k {r['keff'] or '-'}, speedup {r['speedup'] or '-'}")
+
+    out_path = gmsh_code_dir / BENCH_NAME
+    with open(out_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["case", "variant", "cells", "dual_gap_mean", "node_span_mean",
+                                          "solve_s", "keff", "speedup"])
+        w.writeheader()
+        w.writerows(rows)
+    print(f"Benchmark written to: {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
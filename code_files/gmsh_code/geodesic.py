@@ -0,0 +1,78 @@
+"""
+Geodesic (subdivided icosahedron) sphere triangulations for nShell.py.
+
+Level L splits every icosahedron triangle into 4^L triangles and projects
+the new vertices onto the sphere, giving
+
+    nodes = 10 * 4^L + 2,   triangles = 20 * 4^L,
+    edge length ~ 1.1071 * R / 2^L   (1.1071 rad = icosahedron edge angle)
+
+with near-equilateral triangles at every level, so the surface node count of
+a mesh is known before any meshing is done.
+"""
+
+import math
+from functools import lru_cache
+
+import numpy as np
+
+ICO_EDGE_ANGLE = 2.0 * math.asin(1.0 / math.sqrt(1.0 + ((1.0 + math.sqrt(5.0)) / 2.0) ** 2))  # 1.1071 rad
+
+
+def n_nodes(level: int) -> int:
+    return 10 * 4**level + 2
+
+
+def n_triangles(level: int) -> int:
+    return 20 * 4**level
+
+
+def level_for_edge(radius: float, h: float, max_level: int) -> int:
+    """Smallest level whose edge length is at most h (clamped to [0, max_level])."""
+    if h <= 0.0:
+        return max_level
+    level = math.ceil(math.log2(max(ICO_EDGE_ANGLE * radius / h, 1.0)))
+    return min(max(level, 0), max_level)
+
+
+def _icosahedron():
+    t = (1.0 + math.sqrt(5.0)) / 2.0
+    verts = np.array([
+        (-1, t, 0), (1, t, 0), (-1, -t, 0), (1, -t, 0),
+        (0, -1, t), (0, 1, t), (0, -1, -t), (0, 1, -t),
+        (t, 0, -1), (t, 0, 1), (-t, 0, -1), (-t, 0, 1),
+    ], dtype=float)
+    faces = np.array([
+        (0, 11, 5), (0, 5, 1), (0, 1, 7), (0, 7, 10), (0, 10, 11),
+        (1, 5, 9), (5, 11, 4), (11, 10, 2), (10, 7, 6), (7, 1, 8),
+        (3, 9, 4), (3, 4, 2), (3, 2, 6), (3, 6, 8), (3, 8, 9),
+        (4, 9, 5), (2, 4, 11), (6, 2, 10), (8, 6, 7), (9, 8, 1),
+    ], dtype=np.int64)
+    return verts / np.linalg.norm(verts, axis=1)[:, None], faces
+
+
+@lru_cache(maxsize=None)
+def unit_icosphere(level: int):
+    """(vertices (n, 3) on the unit sphere, triangles (m, 3) outward-oriented)."""
+    verts, faces = _icosahedron()
+    for _ in range(level):
+        # One midpoint per unique edge
+        edges = np.sort(np.concatenate((faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]])), axis=1)
+        uniq, inverse = np.unique(edges, axis=0, return_inverse=True)
+        mids = verts[uniq[:, 0]] + verts[uniq[:, 1]]
+        mids /= np.linalg.norm(mids, axis=1)[:, None]
+        m = len(verts) + inverse.ravel().reshape(3, -1)  # midpoint index of edges 01, 12, 20 per face
+        a, b, c = faces[:, 0], faces[:, 1], faces[:, 2]
+        faces = np.concatenate((
+            np.column_stack((a, m[0], m[2])),
+            np.column_stack((b, m[1], m[0])),
+            np.column_stack((c, m[2], m[1])),
+            np.column_stack((m[0], m[1], m[2])),
+        ))
+        verts = np.concatenate((verts, mids))
+    return verts, faces
+
+
+def icosphere(radius: float, level: int):
+    verts, faces = unit_icosphere(level)
+    return radius * verts, faces
@@ -0,0 +1,97 @@
+"""
+Tiered meshing strategy and per-geometry memory of the tier that worked.
+
+With GMESH_TIERED=1, Create_ICSBEP_Meshes.py runs nShell.py once per tier
+(GMESH_TIER=<name>), from the most accurate to the most robust configuration,
+each with its own slice of CASE_TIMEOUT_SEC, until one succeeds:
+
+    hxt       HXT parallel Delaunay (Mesh.Algorithm3D=10), default fields
+    delaunay  classic Delaunay (Algorithm3D=1)
+    relaxed   Delaunay with the relaxed size fields (fewer cells across thin shells)
+    coarse    relaxed fields and a COARSE_FACTOR larger size factor
+    frontal   Frontal 3D (Algorithm3D=4) on the coarse settings, last resort
+
+A structured or extruded sphere mesh would be the natural final tier, but
+nShell.py only builds unstructured tet meshes; the Frontal mesher is the most
+robust alternative available.
+
+The first tier that succeeds is stored in mesh_tiers.json under a fingerprint
+of the radii and the mesh-relevant GMESH_* settings, and later runs of the
+same geometry start at that tier directly.
+
+Tiering is off by default: the hxt slice (3/10 of the budget) is shorter than
+some cases that mesh within the single run today, and GMESH_TIER disables
+nShell.py's own HXT -> Delaunay fallback.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+TIERS_NAME = "mesh_tiers.json"
+COARSE_FACTOR = float(os.getenv("GMESH_TIER_COARSE_FACTOR", "2.0"))
+
+# name: (Mesh.Algorithm3D, relaxed fields, size-factor multiplier)
+TIERS = {
+    "hxt": (10, False, 1.0),
+    "delaunay": (1, False, 1.0),
+    "relaxed": (1, True, 1.0),
+    "coarse": (1, True, COARSE_FACTOR),
+    "frontal": (4, True, COARSE_FACTOR),
+}
+TIER_ORDER = list(TIERS)
+
+# Relative time slice of each tier; a tier that fails early leaves its unused
+# time to the remaining ones
+TIER_WEIGHTS = dict(zip(TIER_ORDER, (float(w) for w in os.getenv("GMESH_TIER_WEIGHTS", "3,2,2,2,1").split(","))))
+
+# Settings that do not change the mesh and therefore not the fingerprint
+_NOT_GEOMETRY = {
+    "GMESH_THREADS", "GMESH_MAX_THREADS_2D", "GMESH_MAX_THREADS_3D", "GMESH_EVENTS_FILE",
+    "GMESH_TIER", "GMESH_TIERED", "GMESH_TIER_WEIGHTS", "GMESH_COMPRESS", "GMESH_ZSTD_LEVEL",
+    "GMESH_ZSTD_THREADS", "GMESH_TMPFS_DIR", "GMESH_PROJECT_SPHERES", "GMESH_PROJECT_TOL",
+    "GMESH_RENUMBER", "GMESH_RENUMBER_METHOD", "GMESH_GEOMETRY_ONLY", "GMESH_SURFACE_FILE",
+    "GMESH_SHELL_WORKERS",
+}
+
+
+def tiers_path() -> Path:
+    return Path(__file__).resolve().parent / TIERS_NAME
+
+
+def fingerprint(radii, env=None) -> str:
+    """sha256 of the radii strings and the mesh-relevant settings."""
+    env = os.environ if env is None else env
+    settings = sorted(
+        (k, v) for k, v in env.items()
+        if (k.startswith("GMESH_") or k == "GEOMETRY_TOL") and k not in _NOT_GEOMETRY
+    )
+    payload = json.dumps({"radii": [str(r).strip() for r in radii], "settings": settings})
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def load_tiers() -> dict:
+    """{fingerprint: {"tier", "case"}} of earlier runs."""
+    path = tiers_path()
+    return json.loads(path.read_text()) if path.is_file() else {}
+
+
+def save_tiers(known: dict):
+    path = tiers_path()
+    tmp = path.with_name(path.name + ".part")
+    tmp.write_text(json.dumps(known, indent=2, sort_keys=True) + "\n")
+    os.replace(tmp, path)
+
+
+def tiers_from(start=None) -> list[str]:
+    """Tiers to try, beginning at `start` (a remembered tier) or at the first one."""
+    if start not in TIERS:
+        return list(TIER_ORDER)
+    return TIER_ORDER[TIER_ORDER.index(start):]
+
+
+def time_slice(tiers: list[str], remaining_sec: float) -> float:
+    """Seconds for tiers[0] out of the remaining case budget."""
+    total = sum(TIER_WEIGHTS.get(t, 1.0) for t in tiers)
+    return remaining_sec * TIER_WEIGHTS.get(tiers[0], 1.0) / max(total, 1e-12)
@@ -0,0 +1,215 @@
+"""
+Per-stage timing events for the meshing stage.
+
+nShell.py records one JSON object per stage (OCC booleans, fields, preflight,
+1D/2D/3D generation, write) with wall time, CPU time, peak RSS and the current
+node/element counts. Events are appended as JSON lines to the file named by
+GMESH_EVENTS_FILE, or printed with a "TIMING:" prefix when it is unset.
+
+With parallel_shells.py, the surface-only nShell.py run of a case reports its
+write and whole-run events as surface_write and surface_total, so that the
+stage summary keeps one write and one total per case.
+
+Create_ICSBEP_Meshes.py gives every case its own events file, then collects
+them into a per-run table and a per-stage percentile summary that serves as
+the baseline when gmsh options change.
+"""
+
+import csv
+import json
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+EVENTS_ENV = "GMESH_EVENTS_FILE"
+EVENT_PREFIX = "TIMING:"
+
+TABLE_COLUMNS = [
+    "case", "stage", "status", "wall_s", "cpu_s", "peak_rss_mb",
+    "nodes", "triangles", "tets", "extra",
+]
+PERCENTILES = (50, 90, 99)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (ru_maxrss is KB on Linux, bytes on macOS)."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return rss / (1024.0 * 1024.0)
+    return rss / 1024.0
+
+
+class StageTimer:
+    """
+    Emit one event per `stage(...)` block.
+
+    counts: optional callable returning {"nodes": int, "triangles": int, "tets": int}
+            evaluated at the end of each stage.
+    """
+
+    def __init__(self, case: str, counts=None, events_path=None):
+        self.case = case
+        self.counts = counts
+        self.events_path = events_path if events_path is not None else os.getenv(EVENTS_ENV)
+        self.t0_wall = time.perf_counter()
+        self.t0_cpu = time.process_time()
+
+    def emit(self, event: dict):
+        line = json.dumps(event, sort_keys=True)
+        if self.events_path:
+            with open(self.events_path, "a") as f:
+                f.write(line + "\n")
+        else:
+            print(f"{EVENT_PREFIX} {line}", flush=True)
+
+    def _event(self, stage, status, wall, cpu, extra):
+        event = {
+            "case": self.case,
+            "stage": stage,
+            "status": status,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_rss_mb": round(peak_rss_mb(), 3),
+        }
+        if self.counts is not None:
+            try:
+                event.update(self.counts())
+            except Exception:
+                pass
+        if extra:
+            event["extra"] = extra
+        return event
+
+    @contextmanager
+    def stage(self, name: str, **extra):
+        """Time the enclosed block; the yielded dict can be filled with extra fields."""
+        w0, c0 = time.perf_counter(), time.process_time()
+        status = "ok"
+        try:
+            yield extra
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.emit(self._event(name, status, time.perf_counter() - w0, time.process_time() - c0, extra))
+
+    def total(self, status="ok", name="total", **extra):
+        """Emit the whole-run event (wall and CPU since the timer was created)."""
+        self.emit(self._event(
+            name, status,
+            time.perf_counter() - self.t0_wall, time.process_time() - self.t0_cpu, extra,
+        ))
+
+
+# -------------------- Aggregation (driver side) --------------------
+def parse_event_line(line: str):
+    """Return the event dict for a JSON line (with or without the TIMING: prefix), else None."""
+    s = line.strip()
+    if s.startswith(EVENT_PREFIX):
+        s = s[len(EVENT_PREFIX):].strip()
+    if not s.startswith("{"):
+        return None
+    try:
+        return json.loads(s)
+    except json.JSONDecodeError:
+        return None
+
+
+def load_events(paths) -> list:
+    events = []
+    for p in paths:
+        with open(p, "r") as f:
+            for line in f:
+                ev = parse_event_line(line)
+                if ev is not None:
+                    events.append(ev)
+    return events
+
+
+def percentile(values, q: float) -> float:
+    """Linear-interpolation percentile (q in [0, 100]) of a non-empty sequence."""
+    xs = sorted(values)
+    if len(xs) == 1:
+        return float(xs[0])
+    pos = (len(xs) - 1) * (q / 100.0)
+    lo = int(pos)
+    hi = min(lo + 1, len(xs) - 1)
+    return float(xs[lo] + (xs[hi] - xs[lo]) * (pos - lo))
+
+
+def write_timing_table(events, csv_path: Path):
+    """One row per (case, stage) event."""
+    with open(csv_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=TABLE_COLUMNS)
+        w.writeheader()
+        for ev in events:
+            row = {k: ev.get(k, "") for k in TABLE_COLUMNS}
+            row["extra"] = json.dumps(ev["extra"], sort_keys=True) if ev.get("extra") else ""
+            w.writerow(row)
+
+
+def stage_summary(events) -> dict:
+    """
+    Per-stage statistics over all successful events of the run:
+    {stage: {"n", "wall_p50", "wall_p90", "wall_p99", "wall_max", "cpu_p50", "rss_max"}}
+    """
+    by_stage = {}
+    for ev in events:
+        if ev.get("status") != "ok":
+            continue
+        by_stage.setdefault(ev["stage"], []).append(ev)
+
+    summary = {}
+    for stage, evs in by_stage.items():
+        wall = [float(e["wall_s"]) for e in evs]
+        cpu = [float(e["cpu_s"]) for e in evs]
+        row = {"n": len(evs)}
+        for q in PERCENTILES:
+            row[f"wall_p{q}"] = percentile(wall, q)
+        row["wall_max"] = max(wall)
+        row["cpu_p50"] = percentile(cpu, 50)
+        row["rss_max"] = max(float(e.get("peak_rss_mb", 0.0)) for e in evs)
+        summary[stage] = row
+    return summary
+
+
+def write_stage_summary(summary: dict, csv_path: Path):
+    cols = ["stage", "n"] + [f"wall_p{q}" for q in PERCENTILES] + ["wall_max", "cpu_p50", "rss_max"]
+    with open(csv_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=cols)
+        w.writeheader()
+        for stage in sorted(summary):
+            w.writerow({"stage": stage, **summary[stage]})
+
+
+def read_stage_summary(csv_path: Path) -> dict:
+    out = {}
+    with open(csv_path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            stage = row.pop("stage")
+            out[stage] = {k: float(v) for k, v in row.items()}
+    return out
+
+
+def format_summary(summary: dict, baseline=None) -> str:
+    """Text table of per-stage percentiles; with a baseline, adds the p50/p90 ratios against it."""
+    header = f"{'stage':<14}{'n':>6}{'p50 [s]':>12}{'p90 [s]':>12}{'p99 [s]':>12}{'max [s]':>12}{'rss [MB]':>11}"
+    if baseline:
+        header += f"{'p50/base':>10}{'p90/base':>10}"
+    lines = [header, "-" * len(header)]
+    for stage in sorted(summary):
+        s = summary[stage]
+        line = (f"{stage:<14}{int(s['n']):>6d}{s['wall_p50']:>12.3f}{s['wall_p90']:>12.3f}"
+                f"{s['wall_p99']:>12.3f}{s['wall_max']:>12.3f}{s['rss_max']:>11.1f}")
+        if baseline:
+            b = baseline.get(stage)
+            for key in ("wall_p50", "wall_p90"):
+                if b and b.get(key, 0.0) > 0.0:
+                    line += f"{s[key] / b[key]:>10.2f}"
+                else:
+                    line += f"{'-':>10}"
+        lines.append(line)
+    return "\n".join(lines)
@@ -0,0 +1,327 @@
+"""
+Pure NumPy reader (and tet-mesh writer) for the binary MSH 4.1 files written
+by nShell.py (Mesh.Binary=1).
+
+The file is memory-mapped once; node tags, node coordinates and element
+connectivity are exposed as zero-copy views into that map, so only the arrays
+a check actually touches are paged in. No gmsh model is ever created.
+
+Layout of the binary sections (little-endian, size_t = 8 bytes, int = 4 bytes):
+
+    $Entities   numPoints numCurves numSurfaces numVolumes        (size_t)
+                point:  tag(int) x y z(double) numPhys(size_t) phys(int)...
+                other:  tag(int) bbox(6 double) numPhys(size_t) phys(int)...
+                        numBounding(size_t) bounding(int)...
+    $Nodes      numBlocks numNodes minTag maxTag                  (size_t)
+                block:  dim tag parametric(int) n(size_t) tags(n size_t) xyz(n x (3+dim*parametric) double)
+    $Elements   numBlocks numElements minTag maxTag               (size_t)
+                block:  dim tag type(int) n(size_t) data(n x (1+nodes) size_t)
+"""
+
+import struct
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+# Nodes per element for the gmsh element types we may meet
+NODES_PER_TYPE = {1: 2, 2: 3, 3: 4, 4: 4, 5: 8, 6: 6, 7: 5, 8: 3, 9: 6, 11: 10, 15: 1}
+TET_TYPE = 4
+
+SIZE_T = np.dtype("<u8")
+FLOAT = np.dtype("<f8")
+
+
+@dataclass
+class NodeBlock:
+    dim: int
+    tag: int
+    parametric: int
+    tags: np.ndarray     # (n,) uint64 view
+    coords: np.ndarray   # (n, 3) float64 view
+    offset: int          # byte offset of the tags array in the file
+
+
+@dataclass
+class ElementBlock:
+    dim: int
+    tag: int
+    elem_type: int
+    data: np.ndarray     # (n, 1 + nodes) uint64 view: element tag, then node tags
+    offset: int          # byte offset of data in the file
+
+    @property
+    def tags(self) -> np.ndarray:
+        return self.data[:, 0]
+
+    @property
+    def nodes(self) -> np.ndarray:
+        return self.data[:, 1:]
+
+
+@dataclass
+class MshFile:
+    path: Path
+    mm: np.memmap
+    physical_names: dict = field(default_factory=dict)    # {(dim, phys_tag): name}
+    entity_physicals: dict = field(default_factory=dict)  # {(dim, entity_tag): [phys_tag, ...]}
+    entity_bbox: dict = field(default_factory=dict)       # {(dim, entity_tag): (xmin, ymin, zmin, xmax, ymax, zmax)}
+    node_blocks: list = field(default_factory=list)
+    element_blocks: list = field(default_factory=list)
+    num_nodes: int = 0
+    max_node_tag: int = 0
+    num_elements: int = 0
+
+    def tet_blocks(self):
+        return [b for b in self.element_blocks if b.elem_type == TET_TYPE]
+
+    def physical_of(self, dim: int, entity_tag: int):
+        """Physical tags of an entity (empty list when it belongs to none)."""
+        return self.entity_physicals.get((dim, entity_tag), [])
+
+    def coords_by_tag(self) -> np.ndarray:
+        """Dense (max_tag + 1, 3) array so that xyz = arr[node_tag] (unused rows are NaN)."""
+        out = np.full((self.max_node_tag + 1, 3), np.nan)
+        for b in self.node_blocks:
+            out[b.tags] = b.coords
+        return out
+
+    def flush(self):
+        """Write back in-place edits (only meaningful for mode="r+")."""
+        self.mm.flush()
+
+
+class _Cursor:
+    """Sequential reader over the memory map."""
+
+    def __init__(self, mm: np.memmap, pos: int = 0):
+        self.mm = mm
+        self.pos = pos
+
+    def unpack(self, fmt: str):
+        size = struct.calcsize(fmt)
+        vals = struct.unpack_from(fmt, self.mm, self.pos)
+        self.pos += size
+        return vals
+
+    def size_t(self, n: int = 1):
+        return self.unpack(f"<{n}Q")
+
+    def array(self, dtype: np.dtype, count: int) -> np.ndarray:
+        arr = np.frombuffer(self.mm, dtype=dtype, count=count, offset=self.pos)
+        self.pos += count * dtype.itemsize
+        return arr
+
+    def line(self) -> bytes:
+        end = _find(self.mm, b"\n", self.pos)
+        out = bytes(self.mm[self.pos:end])
+        self.pos = end + 1
+        return out.rstrip(b"\r")
+
+
+def _find(mm: np.memmap, token: bytes, start: int) -> int:
+    """Byte offset of the next `token` at or after `start` (chunked, never copies the whole file)."""
+    chunk = 1 << 20
+    pos = start
+    while pos < len(mm):
+        idx = bytes(mm[pos:pos + chunk + len(token)]).find(token)
+        if idx >= 0:
+            return pos + idx
+        pos += chunk
+    raise ValueError(f"Token {token!r} not found after byte {start}")
+
+
+def _read_entities(cur: _Cursor, msh: MshFile):
+    counts = cur.size_t(4)
+    for dim, n in enumerate(counts):
+        for _ in range(n):
+            (tag,) = cur.unpack("<i")
+            if dim == 0:
+                x, y, z = cur.unpack("<3d")
+                bbox = (x, y, z, x, y, z)
+            else:
+                bbox = cur.unpack("<6d")
+            (n_phys,) = cur.size_t()
+            phys = list(cur.unpack(f"<{n_phys}i")) if n_phys else []
+            if dim > 0:
+                (n_bnd,) = cur.size_t()
+                cur.pos += 4 * n_bnd
+            msh.entity_physicals[(dim, tag)] = phys
+            msh.entity_bbox[(dim, tag)] = bbox
+
+
+def _read_nodes(cur: _Cursor, msh: MshFile):
+    n_blocks, n_nodes, _min_tag, max_tag = cur.size_t(4)
+    msh.num_nodes, msh.max_node_tag = n_nodes, max_tag
+    for _ in range(n_blocks):
+        dim, tag, parametric = cur.unpack("<3i")
+        (n,) = cur.size_t()
+        offset = cur.pos
+        tags = cur.array(SIZE_T, n)
+        ncomp = 3 + (dim if parametric else 0)
+        xyz = cur.array(FLOAT, n * ncomp).reshape(n, ncomp)[:, :3]
+        msh.node_blocks.append(NodeBlock(dim, tag, parametric, tags, xyz, offset))
+
+
+def _read_elements(cur: _Cursor, msh: MshFile):
+    n_blocks, n_elems, _min_tag, _max_tag = cur.size_t(4)
+    msh.num_elements = n_elems
+    for _ in range(n_blocks):
+        dim, tag, etype = cur.unpack("<3i")
+        (n,) = cur.size_t()
+        if etype not in NODES_PER_TYPE:
+            raise ValueError(f"Unsupported element type {etype} in {msh.path}")
+        width = 1 + NODES_PER_TYPE[etype]
+        offset = cur.pos
+        data = cur.array(SIZE_T, n * width).reshape(n, width)
+        msh.element_blocks.append(ElementBlock(dim, tag, etype, data, offset))
+
+
+def read_msh41(path, mode: str = "r") -> MshFile:
+    """
+    Memory-map a binary MSH 4.1 file. mode="r+" gives writable views for
+    in-place post-processing (the file size never changes).
+    """
+    path = Path(path)
+    mm = np.memmap(path, dtype=np.uint8, mode=mode)
+    msh = MshFile(path=path, mm=mm)
+    cur = _Cursor(mm)
+
+    while cur.pos < len(mm):
+        header = cur.line().strip()
+        if not header:
+            continue
+        if not header.startswith(b"$"):
+            raise ValueError(f"Unexpected content at byte {cur.pos} in {path}: {header[:40]!r}")
+        name = header[1:].decode()
+
+        if name == "MeshFormat":
+            version, file_type, data_size = cur.line().split()
+            if version != b"4.1" or file_type != b"1" or data_size != b"8":
+                raise ValueError(f"{path} is not a binary MSH 4.1 file (header {version} {file_type} {data_size})")
+            (one,) = cur.unpack("<i")
+            if one != 1:
+                raise ValueError(f"{path} has non-native endianness")
+        elif name == "PhysicalNames":
+            for _ in range(int(cur.line())):
+                dim, tag, pname = cur.line().decode().split(maxsplit=2)
+                msh.physical_names[(int(dim), int(tag))] = pname.strip('"')
+        elif name == "Entities":
+            _read_entities(cur, msh)
+        elif name == "Nodes":
+            _read_nodes(cur, msh)
+        elif name == "Elements":
+            _read_elements(cur, msh)
+        # Skip to the end marker (also for sections we do not interpret)
+        cur.pos = _find(mm, f"$End{name}".encode(), cur.pos)
+        cur.line()
+    return msh
+
+
+# -------------------- Writer --------------------
+def write_msh41(path, coords: np.ndarray, node_entity: np.ndarray, volumes: list, physical_names: dict):
+    """
+    Write a binary MSH 4.1 tet mesh with one volume entity per block.
+
+    coords: (M, 3) node coordinates, node tag = row index + 1
+    node_entity: (M,) volume entity tag each node is classified on
+    volumes: [(entity_tag, physical_tag, conn)] with conn (n, 4) node tags
+    physical_names: {physical_tag: name}
+    Only volume entities are written (no surface or curve entities, like a
+    gmsh file whose physical groups are all volumes and no point carries a group).
+    """
+    path = Path(path)
+    coords = np.ascontiguousarray(coords, dtype=FLOAT)
+    node_entity = np.asarray(node_entity)
+    n_nodes = len(coords)
+    n_elems = sum(len(conn) for _, _, conn in volumes)
+
+    with open(path, "wb") as f:
+        f.write(b"$MeshFormat\n4.1 1 8\n")
+        f.write(struct.pack("<i", 1))
+        f.write(b"\n$EndMeshFormat\n")
+
+        f.write(b"$PhysicalNames\n")
+        f.write(f"{len(physical_names)}\n".encode())
+        for tag, name in sorted(physical_names.items()):
+            f.write(f'3 {tag} "{name}"\n'.encode())
+        f.write(b"$EndPhysicalNames\n")
+
+        f.write(b"$Entities\n")
+        f.write(struct.pack("<4Q", 0, 0, 0, len(volumes)))
+        for ent, phys, conn in volumes:
+            pts = coords[np.unique(conn.ravel()).astype(np.int64) - 1] if len(conn) else np.zeros((1, 3))
+            f.write(struct.pack("<i", ent))
+            f.write(struct.pack("<6d", *pts.min(axis=0), *pts.max(axis=0)))
+            f.write(struct.pack("<Q", 1) + struct.pack("<i", phys))
+            f.write(struct.pack("<Q", 0))  # no bounding surfaces
+        f.write(b"\n$EndEntities\n")
+
+        f.write(b"$Nodes\n")
+        f.write(struct.pack("<4Q", len(volumes), n_nodes, 1 if n_nodes else 0, n_nodes))
+        all_tags = np.arange(1, n_nodes + 1, dtype=SIZE_T)
+        for ent, _, _ in volumes:
+            sel = np.flatnonzero(node_entity == ent)
+            f.write(struct.pack("<3i", 3, ent, 0) + struct.pack("<Q", len(sel)))
+            f.write(all_tags[sel].tobytes())
+            f.write(coords[sel].tobytes())
+        f.write(b"\n$EndNodes\n")
+
+        f.write(b"$Elements\n")
+        f.write(struct.pack("<4Q", len(volumes), n_elems, 1 if n_elems else 0, n_elems))
+        next_tag = 1
+        for ent, _, conn in volumes:
+            data = np.empty((len(conn), 5), dtype=SIZE_T)
+            data[:, 0] = np.arange(next_tag, next_tag + len(conn))
+            data[:, 1:] = conn
+            next_tag += len(conn)
+            f.write(struct.pack("<3i", 3, ent, TET_TYPE) + struct.pack("<Q", len(conn)))
+            f.write(data.tobytes())
+        f.write(b"\n$EndElements\n")
+
+
+# -------------------- Geometry helpers --------------------
+def tet_signed_volumes(coords: np.ndarray, conn: np.ndarray) -> np.ndarray:
+    """Signed volumes of tets; coords indexed by node tag, conn (n, 4) node tags."""
+    p0 = coords[conn[:, 0]]
+    a = coords[conn[:, 1]] - p0
+    b = coords[conn[:, 2]] - p0
+    c = coords[conn[:, 3]] - p0
+    return np.einsum("ij,ij->i", a, np.cross(b, c)) / 6.0
+
+
+def tet_max_edge(coords: np.ndarray, conn: np.ndarray) -> np.ndarray:
+    """Longest edge of each tet."""
+    pts = coords[conn]  # (n, 4, 3)
+    longest = np.zeros(len(conn))
+    for i, j in ((0, 1), (0, 2), (0, 3), (1, 2), (1, 3), (2, 3)):
+        longest = np.maximum(longest, np.linalg.norm(pts[:, i] - pts[:, j], axis=1))
+    return longest
+
+
+TET_FACES = ((0, 1, 2), (0, 1, 3), (0, 2, 3), (1, 2, 3))
+
+
+def interior_faces(conn: np.ndarray):
+    """
+    Faces shared by two tets; conn (n, 4) node tags.
+    Returns (pairs (m, 2) tet indices, faces (m, 3) sorted node tags).
+    """
+    faces = np.sort(np.concatenate([conn[:, f] for f in TET_FACES]), axis=1)
+    owner = np.tile(np.arange(len(conn)), len(TET_FACES))
+    order = np.lexsort((faces[:, 2], faces[:, 1], faces[:, 0]))
+    faces, owner = faces[order], owner[order]
+    same = np.all(faces[1:] == faces[:-1], axis=1)
+    return np.column_stack((owner[:-1][same], owner[1:][same])), faces[:-1][same]
+
+
+def volumes_per_physical(msh: MshFile, coords=None) -> dict:
+    """{physical_tag: total tet volume} using the absolute tet volumes."""
+    if coords is None:
+        coords = msh.coords_by_tag()
+    out = {}
+    for b in msh.tet_blocks():
+        vol = float(np.abs(tet_signed_volumes(coords, b.nodes)).sum())
+        for phys in msh.physical_of(3, b.tag):
+            out[phys] = out.get(phys, 0.0) + vol
+    return out
@@ -0,0 +1,169 @@
+"""
+Transparent zstd-compressed storage for .msh files.
+
+Meshes are stored either plain (hot meshes that are being worked on) or as
+zstd frames next to where the plain file would be (name.msh.zst). Binary
+MSH 4.1 compresses well, and archived meshes are rarely read, so compressed
+storage is the default for `archive`. Readers never care which form is on disk:
+
+    with materialized(path) as msh_path:   # plain path, decompressed to tmpfs if needed
+        msh = msh41.read_msh41(msh_path)
+
+    with open_stream(path) as f:           # streaming decompression, no temporary file
+        header = f.read(64)
+
+Requires the `zstandard` package only when compressed files are involved.
+
+Usage:
+    python msh_storage.py archive [dir ...]   # compress every .msh (default: spherical_cases)
+    python msh_storage.py restore [dir ...]   # back to plain .msh
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+ZSTD_SUFFIX = ".zst"
+ZSTD_LEVEL = int(os.getenv("GMESH_ZSTD_LEVEL", "10"))
+ZSTD_THREADS = int(os.getenv("GMESH_ZSTD_THREADS", "0"))  # 0 = single-threaded compressor, -1 = all cores
+TMPFS_DIR = os.getenv("GMESH_TMPFS_DIR", "/dev/shm")
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("Compressed meshes need the 'zstandard' package (pip install zstandard)") from e
+    return zstandard
+
+
+def compressed_path(path) -> Path:
+    path = Path(path)
+    return path if path.name.endswith(ZSTD_SUFFIX) else path.with_name(path.name + ZSTD_SUFFIX)
+
+
+def plain_path(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name[:-len(ZSTD_SUFFIX)]) if path.name.endswith(ZSTD_SUFFIX) else path
+
+
+def resolve_mesh(path):
+    """Existing file for a mesh path (plain preferred, then .zst), or None."""
+    plain, packed = plain_path(path), compressed_path(path)
+    if plain.is_file():
+        return plain
+    if packed.is_file():
+        return packed
+    return None
+
+
+def compress_mesh(path, level: int = ZSTD_LEVEL, remove: bool = True) -> Path:
+    """Write name.msh.zst next to name.msh (removing the plain file unless remove=False)."""
+    zstd = _zstd()
+    src, dst = plain_path(path), compressed_path(path)
+    tmp = dst.with_name(dst.name + ".part")
+    cctx = zstd.ZstdCompressor(level=level, threads=ZSTD_THREADS, write_content_size=True)
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        cctx.copy_stream(fin, fout, size=src.stat().st_size)
+    os.replace(tmp, dst)
+    if remove:
+        src.unlink()
+    return dst
+
+
+def decompress_mesh(path, dest=None, remove: bool = True) -> Path:
+    """Write the plain mesh (to dest, default next to the .zst), removing the .zst unless remove=False."""
+    zstd = _zstd()
+    src = compressed_path(path)
+    dst = Path(dest) if dest is not None else plain_path(path)
+    tmp = dst.with_name(dst.name + ".part")
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        zstd.ZstdDecompressor().copy_stream(fin, fout)
+    os.replace(tmp, dst)
+    if remove and dest is None:
+        src.unlink()
+    return dst
+
+
+@contextmanager
+def open_stream(path):
+    """Binary file object over the mesh, decompressing on the fly when it is stored as .zst."""
+    found = resolve_mesh(path)
+    if found is None:
+        raise FileNotFoundError(f"No mesh at {plain_path(path)} or {compressed_path(path)}")
+    if not found.name.endswith(ZSTD_SUFFIX):
+        with open(found, "rb") as f:
+            yield f
+        return
+    with open(found, "rb") as raw, _zstd().ZstdDecompressor().stream_reader(raw) as f:
+        yield f
+
+
+@contextmanager
+def materialized(path):
+    """
+    Plain path to the mesh for code that needs a real file (memory maps, gmsh,
+    OpenSn). Compressed meshes are decompressed into tmpfs and removed on exit.
+    """
+    found = resolve_mesh(path)
+    if found is None:
+        raise FileNotFoundError(f"No mesh at {plain_path(path)} or {compressed_path(path)}")
+    if not found.name.endswith(ZSTD_SUFFIX):
+        yield found
+        return
+    tmp_root = TMPFS_DIR if os.path.isdir(TMPFS_DIR) and os.access(TMPFS_DIR, os.W_OK) else None
+    tmp_dir = Path(tempfile.mkdtemp(prefix="msh_", dir=tmp_root))
+    try:
+        yield decompress_mesh(found, dest=tmp_dir / plain_path(found).name, remove=False)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+@contextmanager
+def editable(path):
+    """
+    Plain path for in-place edits. A compressed mesh is decompressed to tmpfs,
+    edited there and recompressed over the original on a clean exit.
+    """
+    found = resolve_mesh(path)
+    if found is None:
+        raise FileNotFoundError(f"No mesh at {plain_path(path)} or {compressed_path(path)}")
+    if not found.name.endswith(ZSTD_SUFFIX):
+        yield found
+        return
+    with materialized(found) as tmp_plain:
+        yield tmp_plain
+        packed = compress_mesh(tmp_plain, remove=False)
+        shutil.move(str(packed), str(found))
+
+
+def _mesh_files(dirs, suffix: str):
+    for d in dirs:
+        yield from sorted(Path(d).glob(f"**/*{suffix}"))
+
+
+def main() -> int:
+    if len(sys.argv) < 2 or sys.argv[1] not in ("archive", "restore"):
+        print(__doc__)
+        return 1
+    repo_root = Path(__file__).resolve().parents[2]
+    dirs = sys.argv[2:] or [repo_root / "spherical_cases"]
+
+    before = after = 0
+    if sys.argv[1] == "archive":
+        for p in _mesh_files(dirs, ".msh"):
+            before += p.stat().st_size
+            after += compress_mesh(p).stat().st_size
+    else:
+        for p in _mesh_files(dirs, ".msh" + ZSTD_SUFFIX):
+            before += p.stat().st_size
+            after += decompress_mesh(p).stat().st_size
+    print(f"{sys.argv[1]}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
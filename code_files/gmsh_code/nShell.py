@@ -1,6 +1,10 @@
 # Import necessary modules
 from ast import literal_eval       # Safely converts string representations of lists to actual Python lists
-import gmsh, sys, os, math, time   # Gmsh for mesh operations, and standard libraries for system and math utilities
+import gmsh, sys, os, math, time, shutil, tempfile, json   # Gmsh for mesh operations, and standard libraries for system and math utilities
+from pathlib import Path
+from mesh_timing import StageTimer  # JSON-lines per-stage timing events (see mesh_timing.py)
+from mesh_tiers import TIERS        # tiered retry configurations (see mesh_tiers.py)
+import size_fields                  # background mesh-size field (see size_fields.py)
 
 # --------------------- Parse Command-Line Arguments ---------------------
 radlist = sys.argv[1]   # First command-line argument: list of radii (string or comma-separated)
@@ -38,6 +42,18 @@ min_tk = min((radii[i] - radii[i-1]) for i in range(1, len(radii))) if len(radii
 gmsh.initialize()
 gmsh.model.add(model_name)
 
+# ---------------- Stage timing events ----------------
+# Node/element counts come from gmsh's statistics options, which are cheap to query
+def mesh_counts():
+    return {
+        "nodes": int(gmsh.option.getNumber("Mesh.NbNodes")),
+        "triangles": int(gmsh.option.getNumber("Mesh.NbTriangles")),
+        "tets": int(gmsh.option.getNumber("Mesh.NbTetrahedra")),
+    }
+
+case_label = "/".join(Path(data_path).parts[-4:-2])  # e.g. heu-met-fast-001/case-1
+timer = StageTimer(case_label, counts=mesh_counts)
+
 # ---------------- Threads and Terminal Options ----------------
 num_threads = int(os.getenv("GMESH_THREADS", "1"))  # Number of parallel threads
 gmsh.option.setNumber("General.NumThreads", max(1, num_threads))              # Global threading
@@ -59,41 +75,143 @@ gmsh.option.setNumber("Mesh.MinimumCirclePoints", int(os.getenv("GMESH_MIN_CIRCL
 gmsh.option.setNumber("Mesh.RandomFactor", float(os.getenv("GMESH_RANDOM_FACTOR", "5e-5")))
 
 # ------------------- Create Concentric Spheres -------------------
-# Add multiple concentric spheres with specified radii
-sphere_tags = [gmsh.model.occ.addSphere(0.0, 0.0, 0.0, r) for r in radii]
-gmsh.model.occ.synchronize()  # Apply geometric changes to the Gmsh model
-
-# ------------------- Boolean Cuts to Form Shells -----------------
-# Create distinct shell volumes by subtracting inner spheres from the outer ones
-shell_tags = [None] * (N + 1)
-for k in range(N, 0, -1):  
-    out_dimtags, _ = gmsh.model.occ.cut([(3, sphere_tags[k])], [(3, sphere_tags[k - 1])], removeTool=False)
+# Shell volumes are built with one of two OCC boolean strategies (GMESH_OCC_BOOLEAN):
+#   fragment: a single occ.fragment of all spheres and one synchronize; the
+#             resulting volumes are matched to shells by their bounding radius
+#   cut:      N sequential cuts of sphere k by sphere k-1, each followed by a synchronize
+# fragment falls back to cut if the volumes cannot be matched one-to-one. cut stays the
+# default until bench_occ_boolean.py timings and a validate_meshes.py pass on fragment
+# meshes exist.
+OCC_BOOLEAN = os.getenv("GMESH_OCC_BOOLEAN", "cut").strip().lower()
+GEOMETRY_ONLY = bool(int(os.getenv("GMESH_GEOMETRY_ONLY", "0")))  # stop after the geometry (benchmarks)
+
+def build_shells_cut():
+    """shell_vols[k] = volume tag between r[k-1] and r[k] (shell_vols[0] is the inner ball)."""
+    sphere_tags = [gmsh.model.occ.addSphere(0.0, 0.0, 0.0, r) for r in radii]
+    gmsh.model.occ.synchronize()  # Apply geometric changes to the Gmsh model
+
+    # Create distinct shell volumes by subtracting inner spheres from the outer ones
+    shell_vols = [sphere_tags[0]] + [None] * N
+    for k in range(N, 0, -1):
+        out_dimtags, _ = gmsh.model.occ.cut([(3, sphere_tags[k])], [(3, sphere_tags[k - 1])], removeTool=False)
+        gmsh.model.occ.synchronize()
+        new_vols = [(d, t) for (d, t) in out_dimtags if d == 3]  # Extract 3D volume entities
+        if not new_vols:
+            raise RuntimeError(f"Cut failed for k={k} (r[{k-1}] -> r[{k}]).")
+        shell_vols[k] = new_vols[0][1]
+
+    # Remove duplicate entities left over from boolean operations
+    try:
+        gmsh.model.occ.removeAllDuplicates()
+    except Exception:
+        pass
+    gmsh.model.occ.synchronize()
+    return shell_vols
+
+def build_shells_fragment():
+    """Same result as build_shells_cut() from one fragment call (shared interfaces are conformal)."""
+    sphere_tags = [gmsh.model.occ.addSphere(0.0, 0.0, 0.0, r) for r in radii]
+    if N == 0:
+        gmsh.model.occ.synchronize()
+        return sphere_tags
+    out_dimtags, _ = gmsh.model.occ.fragment([(3, sphere_tags[-1])], [(3, t) for t in sphere_tags[:-1]])
+    vols = [t for (d, t) in out_dimtags if d == 3]
+    if len(vols) != N + 1:
+        raise RuntimeError(f"Fragment returned {len(vols)} volumes for {N + 1} shells.")
+
+    # A shell's bounding box half-width is its outer radius; accept a match within
+    # a quarter of the smallest radius gap (OCC boxes carry a small tolerance)
+    gap_tol = 0.25 * min_tk if math.isfinite(min_tk) else 0.25 * r_max
+    shell_vols = [None] * (N + 1)
+    for tag in vols:
+        xmin, ymin, zmin, xmax, ymax, zmax = gmsh.model.occ.getBoundingBox(3, tag)
+        r_box = (xmax - xmin + ymax - ymin + zmax - zmin) / 6.0
+        k = min(range(N + 1), key=lambda i: abs(radii[i] - r_box))
+        if abs(radii[k] - r_box) > gap_tol or shell_vols[k] is not None:
+            raise RuntimeError(f"Fragment volume {tag} (bounding radius {r_box:.6g}) matches no unique shell.")
+        shell_vols[k] = tag
     gmsh.model.occ.synchronize()
-    new_vols = [(d, t) for (d, t) in out_dimtags if d == 3]  # Extract 3D volume entities
-    if not new_vols:
+    return shell_vols
+
+# ------------------- Geodesic discrete spheres -------------------
+# GMESH_GEODESIC_LEVEL=<L> or "auto" replaces the OCC spheres by subdivided
+# icosahedra built with NumPy (geodesic.py), injected as discrete surfaces:
+# no CAD surface meshing, no preflight, and exactly 10*4^L + 2 nodes per
+# interface. "auto" picks each interface's level from the near-interface
+# target size (GMESH_N_THICK / GMESH_N_CIRC_NEAR), up to GMESH_GEODESIC_MAX_LEVEL.
+GEODESIC = os.getenv("GMESH_GEODESIC_LEVEL", "").strip().lower()
+GEODESIC_MAX_LEVEL = int(os.getenv("GMESH_GEODESIC_MAX_LEVEL", "6"))
+
+def geodesic_levels():
+    from geodesic import level_for_edge
+    if GEODESIC != "auto":
+        return [min(int(GEODESIC), GEODESIC_MAX_LEVEL)] * len(radii)
+    n_thick = max(int(os.getenv("GMESH_N_THICK", "3")), 1)
+    n_circ = max(int(os.getenv("GMESH_N_CIRC_NEAR", "12")), 6)
+    tk_min = min_tk if math.isfinite(min_tk) else uniform_size
+    h_floor = max(0.6 * uniform_size, min(0.20 * tk_min, 0.01 * r_max), 5e-4)  # as in build_fields
+    scale = float(os.getenv("GMESH_SCALE_INIT", "1.0"))
+    levels = []
+    for k, R in enumerate(radii):
+        # thinnest of the (up to two) shells touching interface k
+        t_adj = min([R - (radii[k - 1] if k else 0.0)] + ([radii[k + 1] - R] if k < N else []))
+        h = max(h_floor, min(t_adj / n_thick, 2.0 * math.pi * R / n_circ)) * scale
+        levels.append(level_for_edge(R, h, GEODESIC_MAX_LEVEL))
+    return levels
+
+def build_shells_geodesic(levels):
+    from geodesic import icosphere
+    node_offset, elem_offset = 0, 0
+    for k, (R, level) in enumerate(zip(radii, levels)):
+        verts, tris = icosphere(R, level)
+        surf = gmsh.model.addDiscreteEntity(2, k + 1)
+        gmsh.model.mesh.addNodes(2, surf, list(range(node_offset + 1, node_offset + len(verts) + 1)),
+                                 verts.ravel().tolist())
+        gmsh.model.mesh.addElementsByType(surf, 2, list(range(elem_offset + 1, elem_offset + len(tris) + 1)),
+                                          (tris + node_offset + 1).ravel().tolist())
+        node_offset += len(verts)
+        elem_offset += len(tris)
+    # Shell k is bounded by interfaces k and k-1
+    return [gmsh.model.addDiscreteEntity(3, k + 1, [k + 1] + ([k] if k else [])) for k in range(N + 1)]
+
+with timer.stage("occ_build", n_spheres=len(radii)) as info:
+    info["boolean"] = "geodesic" if GEODESIC else OCC_BOOLEAN
+    try:
+        if GEODESIC:
+            geo_levels = geodesic_levels()
+            info["levels"] = geo_levels
+            shell_vols = build_shells_geodesic(geo_levels)
+        elif OCC_BOOLEAN == "fragment":
+            try:
+                shell_vols = build_shells_fragment()
+            except Exception as e:
+                print(f"WARN: fragment failed ({e}); falling back to sequential cuts")
+                gmsh.model.remove()
+                gmsh.model.add(model_name)
+                info["boolean"] = "cut"
+                shell_vols = build_shells_cut()
+        elif OCC_BOOLEAN == "cut":
+            shell_vols = build_shells_cut()
+        else:
+            raise ValueError(f"GMESH_OCC_BOOLEAN must be 'fragment' or 'cut', got {OCC_BOOLEAN!r}")
+    except Exception:
+        timer.total(status="error")
         gmsh.finalize()
-        raise RuntimeError(f"Cut failed for k={k} (r[{k-1}] -> r[{k}]).")
-    shell_tags[k] = new_vols[0][1]
-
-# Remove duplicate entities left over from boolean operations
-try:
-    gmsh.model.occ.removeAllDuplicates()
-except Exception:
-    pass
-gmsh.model.occ.synchronize()
+        raise
 
 # ----------------------- Physical Groups -------------------------
 # Define physical volume groups for each shell for post-processing and boundary conditions
-if N == 0:
-    gmsh.model.addPhysicalGroup(3, [sphere_tags[0]], tag=1)
-    gmsh.model.setPhysicalName(3, 1, "Inner")
-else:
-    gmsh.model.addPhysicalGroup(3, [sphere_tags[0]], tag=1)
-    gmsh.model.setPhysicalName(3, 1, "Inner")
-    for k in range(1, N + 1):
-        phys_tag = k + 1
-        gmsh.model.addPhysicalGroup(3, [shell_tags[k]], tag=phys_tag)
-        gmsh.model.setPhysicalName(3, phys_tag, f"Shell{k}")
+gmsh.model.addPhysicalGroup(3, [shell_vols[0]], tag=1)
+gmsh.model.setPhysicalName(3, 1, "Inner")
+for k in range(1, N + 1):
+    phys_tag = k + 1
+    gmsh.model.addPhysicalGroup(3, [shell_vols[k]], tag=phys_tag)
+    gmsh.model.setPhysicalName(3, phys_tag, f"Shell{k}")
+
+if GEOMETRY_ONLY:
+    timer.total(boolean=info["boolean"])
+    gmsh.finalize()
+    sys.exit(0)
 
 # ---------------- Mesh Algorithm and Global Options ----------------
 # Specify mesh generation algorithms and global smoothing/optimization settings
@@ -104,6 +222,14 @@ gmsh.option.setNumber("Mesh.Smoothing", 0)        # Disable post-smoothing to re
 gmsh.option.setNumber("Mesh.Optimize", 0)
 gmsh.option.setNumber("Mesh.OptimizeNetgen", 0)
 
+# GMESH_TIER runs exactly one configuration of the driver's tiered retry
+# strategy (mesh_tiers.py) and disables the internal HXT -> Delaunay fallback
+TIER = os.getenv("GMESH_TIER", "").strip().lower()
+if TIER and TIER not in TIERS:
+    raise ValueError(f"Unknown GMESH_TIER {TIER!r} (expected one of {list(TIERS)})")
+tier_algo3d, tier_relaxed, tier_coarsen = TIERS[TIER] if TIER else (10, False, 1.0)
+gmsh.option.setNumber("Mesh.Algorithm3D", tier_algo3d)
+
 # Disable curvature, point, and boundary-based local mesh refinements to rely solely on background field
 gmsh.option.setNumber("Mesh.MeshSizeFromPoints", 0)
 gmsh.option.setNumber("Mesh.MeshSizeFromCurvature", 0)
@@ -114,154 +240,29 @@ gmsh.option.setNumber("Mesh.Binary", 1)
 gmsh.option.setNumber("Mesh.MshFileVersion", 4.1)
 
 # --------------------- Field builder ------------------
-# This function defines mesh size fields for adaptive refinement around sphere interfaces.
+# Mesh size fields for adaptive refinement around sphere interfaces (size_fields.py).
 # These fields control the target element size at each point in space.
 # Smaller elements are placed near thin shells or sharp gradients, improving accuracy.
 
 last_field_ids = []  # Keeps track of existing fields to clear them when rebuilding
+field_params = {}    # Keyword arguments of the current fields (written with the surface file)
 
-def build_fields(n_thick_loc, n_circ_near_loc, n_circ_far_loc, band_coeff, band_extra_mult):
-    global last_field_ids
-    fld = gmsh.model.mesh.field  # Shortcut for the field API
-    
-    # Remove old mesh fields before creating new ones
-    for fid in last_field_ids:
-        try:
-            fld.remove(fid)
-        except Exception:
-            pass
-    last_field_ids = []
-
-    r_expr = "sqrt(x*x + y*y + z*z)"  # Expression for current radius in spherical coordinates
-
-    # Compute absolute mesh size limits based on shell thickness
-    tk_min = min_tk if math.isfinite(min_tk) else uniform_size
-    h_min_abs = max(uniform_size, min(0.35 * tk_min, 0.03 * r_max))  # Fine size near thin shells
-    h_max_abs = (2.0 * math.pi * r_max) / max(n_circ_far_loc, 6)     # Coarser size far away
-
-    # Smoothly increase element size radially (quadratic scaling)
-    alpha = 2.0
-    slope = 0.0 if (r_max - r_min) < eps else (h_max_abs - h_min_abs) / ((r_max - r_min) ** alpha)
-
-    # Field for gradual radial growth
-    g_field = fld.add("MathEval"); last_field_ids.append(g_field)
-    fld.setString(g_field, "F", f"{h_min_abs} + {slope}*(({r_expr} - {r_min})*({r_expr} - {r_min}))")
-
-    # Define limits on minimum and maximum element sizes
-    cmin_field = fld.add("MathEval"); last_field_ids.append(cmin_field)
-    fld.setString(cmin_field, "F", f"{h_min_abs}")
-    cmax_field = fld.add("MathEval"); last_field_ids.append(cmax_field)
-    fld.setString(cmax_field, "F", f"{h_max_abs}")
-    g_clamped_max = fld.add("Max"); last_field_ids.append(g_clamped_max)
-    fld.setNumbers(g_clamped_max, "FieldsList", [g_field, cmin_field])
-    g_final = fld.add("Min"); last_field_ids.append(g_final)
-    fld.setNumbers(g_final, "FieldsList", [g_clamped_max, cmax_field])
-    to_min = [g_final]  # Store all refinement fields for later combination
-
-    # Helper function: returns target mesh size around a given radius rr
-    def h_circ_near_fun(rr, ncirc=None):
-        nn = n_circ_near_loc if ncirc is None else ncirc
-        return (2.0 * math.pi * max(rr, eps)) / max(nn, 6)
-
-    # Minimum allowable element size to avoid degenerate elements
-    h_floor_small = max(0.6 * uniform_size, min(0.20 * tk_min, 0.01 * r_max), 5e-4)
-
-    # ---------------- Core band refinement ----------------
-    # Finer mesh near the innermost sphere
-    r0 = r_min
-    h_core_target = min(max(tk_min, r0) / max(n_thick_loc, 1), h_circ_near_fun(max(r0, tk_min)))
-    h_core = max(h_floor_small, min(h_core_target, h_max_abs))
-
-    d_core = fld.add("MathEval"); last_field_ids.append(d_core)
-    fld.setString(d_core, "F", f"abs({r_expr} - {r0})")
-
-    # Threshold field constrains mesh size transition outward from the core
-    t_core = fld.add("Threshold"); last_field_ids.append(t_core)
-    try:
-        fld.setNumber(t_core, "IField", d_core)
-    except Exception:
-        fld.setNumber(t_core, "InField", d_core)
-    fld.setNumber(t_core, "LcMin", h_core)
-    fld.setNumber(t_core, "LcMax", h_max_abs)
-    fld.setNumber(t_core, "DistMin", 0.0)
-    fld.setNumber(t_core, "DistMax", r0 + eps)
-    fld.setNumber(t_core, "StopAtDistMax", 1)
-    to_min.append(t_core)
-
-    # ---------------- Interface band refinement ----------------
-    # For every pair of spheres, generate mesh refinement near their boundaries
-    ULTRA_THIN_RATIO = float(os.getenv("GMESH_ULTRA_THIN_RATIO", "0.01"))
-    ABS_THIN = float(os.getenv("GMESH_ABS_THIN", "0.6"))
-
-    for k in range(1, len(radii)):
-        rin, rout = radii[k - 1], radii[k]
-        tk = max(rout - rin, eps)
-        rmid = 0.5 * (rin + rout)
-        is_ultra_thin = (tk < ABS_THIN) or (tk / max(rout, eps) < ULTRA_THIN_RATIO)
-
-        if is_ultra_thin:
-            # Use finer mesh for ultra-thin shells
-            hk_target = min(tk, h_circ_near_fun(rmid, ncirc=8))
-            hk = max(h_floor_small, min(hk_target, h_max_abs))
-            band = max(0.50 * tk, 1.50 * hk)
-        else:
-            # Allow coarser meshing for thicker shells
-            is_thick = (tk > max(1.0, 0.25 * rin))
-            hk_target = min(tk / (3.0 if is_thick else max(n_thick_loc, 1)), h_circ_near_fun(rmid))
-            hk = max(h_floor_small, min(hk_target, h_max_abs))
-            band = max(band_coeff * tk, band_extra_mult * hk)
-
-        # Define threshold fields for inner and outer shell interfaces
-        din = fld.add("MathEval"); last_field_ids.append(din)
-        fld.setString(din, "F", f"abs({r_expr} - {rin})")
-        dout = fld.add("MathEval"); last_field_ids.append(dout)
-        fld.setString(dout, "F", f"abs({r_expr} - {rout})")
-
-        tin = fld.add("Threshold"); last_field_ids.append(tin)
-        try:
-            fld.setNumber(tin, "IField", din)
-        except Exception:
-            fld.setNumber(tin, "InField", din)
-        fld.setNumber(tin, "LcMin", hk)
-        fld.setNumber(tin, "LcMax", h_max_abs)
-        fld.setNumber(tin, "DistMin", 0.0)
-        fld.setNumber(tin, "DistMax", band)
-        fld.setNumber(tin, "StopAtDistMax", 1)
-
-        tout = fld.add("Threshold"); last_field_ids.append(tout)
-        try:
-            fld.setNumber(tout, "IField", dout)
-        except Exception:
-            fld.setNumber(tout, "InField", dout)
-        fld.setNumber(tout, "LcMin", hk)
-        fld.setNumber(tout, "LcMax", h_max_abs)
-        fld.setNumber(tout, "DistMin", 0.0)
-        fld.setNumber(tout, "DistMax", band)
-        fld.setNumber(tout, "StopAtDistMax", 1)
-
-        # Combine inner and outer interface fields
-        tpair = fld.add("Min"); last_field_ids.append(tpair)
-        fld.setNumbers(tpair, "FieldsList", [tin, tout])
-        to_min.append(tpair)
-
-    # Combine all refinement regions into one background field
-    f_bg = fld.add("Min"); last_field_ids.append(f_bg)
-    fld.setNumbers(f_bg, "FieldsList", to_min)
-    fld.setAsBackgroundMesh(f_bg)
-
-    # Enforce overall mesh size bounds
-    gmsh.option.setNumber("Mesh.CharacteristicLengthMin", h_floor_small)
-    gmsh.option.setNumber("Mesh.CharacteristicLengthMax", h_max_abs)
-    return f_bg  # Return the ID of the background field
+def build_fields(params):
+    global last_field_ids, field_params
+    last_field_ids = size_fields.build_fields(radii, uniform_size, **params, old_ids=last_field_ids)
+    field_params = dict(params)
+    return last_field_ids[-1]  # Return the ID of the background field
+
+# Looser constraints, used when the preflight panics and by the relaxed tiers
+def build_relaxed_fields():
+    build_fields(size_fields.RELAXED_FIELDS)
 
 # Create mesh field configuration with slightly coarser settings by default
-build_fields(
-    n_thick_loc=int(os.getenv("GMESH_N_THICK", "3")),
-    n_circ_near_loc=int(os.getenv("GMESH_N_CIRC_NEAR", "12")),
-    n_circ_far_loc=int(os.getenv("GMESH_N_CIRC_FAR", "6")),
-    band_coeff=0.55,
-    band_extra_mult=1.4,
-)
+with timer.stage("fields", relaxed=tier_relaxed):
+    if tier_relaxed:
+        build_relaxed_fields()
+    else:
+        build_fields(size_fields.FIELDS)
 
 # --------------------- Preflight scaling ------------------
 # Determines mesh scaling factor to control total node count and maintain performance.
@@ -297,45 +298,177 @@ def preflight_scale_by_2d_budget():
 
 # Apply preflight logic or skip if instructed
 thin_ratio = (min_tk / max(r_max, eps)) if math.isfinite(min_tk) else 1.0
-if SKIP_PREFLIGHT:
+if GEODESIC:
+    # Surface node count is exact; the size factor only acts on the volume fill
+    from geodesic import n_nodes
+    scale_used, n2d_final = SCALE_INIT, sum(n_nodes(level) for level in geo_levels)
+elif SKIP_PREFLIGHT:
     scale_used, n2d_final = (max(SCALE_INIT, 3.0 if thin_ratio < 0.01 else 1.8), 0)
 else:
-    scale_used, n2d_final = preflight_scale_by_2d_budget()
-    if scale_used >= PANIC_SCALE_TRIG:
-        # Retry with looser mesh constraints if mesh is too dense
-        build_fields(
-            n_thick_loc=max(2, int(os.getenv("GMESH_N_THICK", "3")) - 1),
-            n_circ_near_loc=max(10, int(os.getenv("GMESH_N_CIRC_NEAR", "12")) // 2),
-            n_circ_far_loc=int(os.getenv("GMESH_N_CIRC_FAR", "6")),
-            band_coeff=0.45,
-            band_extra_mult=1.25,
-        )
+    with timer.stage("preflight") as info:
         scale_used, n2d_final = preflight_scale_by_2d_budget()
+        info["panic"] = scale_used >= PANIC_SCALE_TRIG
+        if scale_used >= PANIC_SCALE_TRIG and not tier_relaxed:
+            # Retry with looser mesh constraints if mesh is too dense
+            build_relaxed_fields()
+            scale_used, n2d_final = preflight_scale_by_2d_budget()
+        info["scale"] = scale_used
+        info["n2d"] = n2d_final
+
+# Coarse tiers trade resolution for robustness
+scale_used = min(scale_used * tier_coarsen, SCALE_MAX)
+
+# Discrete geodesic surfaces cannot be remeshed, so only the volume mesh is cleared
+def clear_mesh():
+    if GEODESIC:
+        gmsh.model.mesh.clear([(3, t) for t in shell_vols])
+    else:
+        gmsh.model.mesh.clear()
+
+# ------------------ Surface-only mode ------------------
+# parallel_shells.py meshes the interface surfaces once here and fills each
+# shell volume in its own process from this file. The size factor, field
+# parameters and 3D options go to a JSON file next to it, so that every shell
+# process rebuilds the same background field.
+SURFACE_FILE = os.getenv("GMESH_SURFACE_FILE", "")
+VOLUME_OPTIONS = ["Mesh.MeshSizeFactor", "Mesh.Algorithm3D", "Mesh.RandomFactor", "Mesh.Smoothing",
+                  "Mesh.Optimize", "Mesh.OptimizeNetgen", "Mesh.MeshSizeFromPoints",
+                  "Mesh.MeshSizeFromCurvature", "Mesh.MeshSizeExtendFromBoundary"]
+if SURFACE_FILE:
+    clear_mesh()
+    gmsh.option.setNumber("Mesh.MeshSizeFactor", scale_used)
+    for dim in (1, 2):
+        with timer.stage(f"mesh_{dim}d", scale=scale_used):
+            gmsh.model.mesh.generate(dim)
+    gmsh.option.setNumber("Mesh.SaveAll", 1)  # surface elements are not in a physical group
+    with timer.stage("surface_write"):  # parallel_shells.py emits "write" for the merged mesh
+        gmsh.write(SURFACE_FILE)
+        with open(os.path.splitext(SURFACE_FILE)[0] + ".json", "w") as f:
+            json.dump({"uniform_size": uniform_size, "fields": field_params,
+                       "options": {k: gmsh.option.getNumber(k) for k in VOLUME_OPTIONS}}, f)
+    timer.total(name="surface_total", scale=scale_used, n2d=n2d_final, tier=TIER or "auto")
+    gmsh.finalize()
+    sys.exit(0)
 
 # ----------------------- Mesh generation -------------------------
 # Generate final mesh at the determined element size scale
 
-gmsh.model.mesh.clear()
-gmsh.option.setNumber("Mesh.MeshSizeFactor", scale_used)
-try:
-    gmsh.model.mesh.generate(1)
-    gmsh.model.mesh.generate(2)
-    gmsh.model.mesh.generate(3)
-except Exception:
-    # If fast mesher fails, fallback to classical Delaunay for stability
-    gmsh.model.mesh.clear()
-    gmsh.option.setNumber("Mesh.Algorithm3D", 1)
-    gmsh.model.mesh.generate(1)
-    gmsh.model.mesh.generate(2)
-    gmsh.model.mesh.generate(3)
+def generate_all(scale, algo3d):
+    # One event per dimension so OCC-heavy 1D/2D time is separated from the 3D fill
+    for dim in (1, 2, 3):
+        with timer.stage(f"mesh_{dim}d", algo3d=algo3d, scale=scale):
+            gmsh.model.mesh.generate(dim)
+
+def mesh_at(scale):
+    clear_mesh()
+    gmsh.option.setNumber("Mesh.MeshSizeFactor", scale)
+    try:
+        generate_all(scale, algo3d=int(gmsh.option.getNumber("Mesh.Algorithm3D")))
+    except Exception:
+        if TIER:
+            raise  # the driver moves on to the next tier
+        # If fast mesher fails, fallback to classical Delaunay for stability
+        clear_mesh()
+        gmsh.option.setNumber("Mesh.Algorithm3D", 1)
+        generate_all(scale, algo3d=1)
+
+mesh_at(scale_used)
+
+# ------------------ Solve-cost cell budget ------------------
+# GMESH_MAX_CELLS is the largest tet count whose predicted OpenSn solve fits the
+# time/memory budget (see solve_cost.py). The tet count scales like scale^-3, so
+# the size factor is corrected towards CELL_FILL * MAX_CELLS: coarser when over
+# budget, finer when far below it, keeping the finest mesh that fits.
+MAX_CELLS = int(os.getenv("GMESH_MAX_CELLS", "0"))   # 0 disables the budget
+CELL_FILL = float(os.getenv("GMESH_CELL_FILL", "0.9"))
+BUDGET_ITERS = int(os.getenv("GMESH_BUDGET_ITERS", "4"))
+SCALE_MIN = float(os.getenv("GMESH_SCALE_MIN", "0.2"))
+
+def fit_cell_budget(scale):
+    target = CELL_FILL * MAX_CELLS
+    tried = []  # (scale, tets) of every generated mesh
+    for _ in range(BUDGET_ITERS):
+        n3d = mesh_counts()["tets"]
+        tried.append((scale, n3d))
+        if n3d <= MAX_CELLS and n3d >= 0.8 * target:
+            return scale  # close enough below the budget
+        new_scale = min(max(scale * (n3d / max(target, 1.0)) ** (1.0 / 3.0), SCALE_MIN), SCALE_MAX)
+        if abs(new_scale - scale) <= 1e-3 * scale:
+            break
+        scale = new_scale
+        mesh_at(scale)
+    n3d = mesh_counts()["tets"]
+    tried.append((scale, n3d))
+    if n3d <= MAX_CELLS:
+        return scale
+    # Last attempt overshot: go back to the finest mesh that fitted, or keep coarsening
+    fitting = [s for s, n in tried if n <= MAX_CELLS]
+    scale = min(fitting) if fitting else min(scale * (n3d / max(target, 1.0)) ** (1.0 / 3.0) * 1.1, SCALE_MAX)
+    mesh_at(scale)
+    return scale
+
+if MAX_CELLS > 0:
+    with timer.stage("cell_budget", max_cells=MAX_CELLS) as info:
+        scale_used = fit_cell_budget(scale_used)
+        info["scale"] = scale_used
+
+# ------------------ Sweep-cycle candidates ------------------
+# With GMESH_CYCLE_CANDIDATES > 1 the mesh is regenerated with a few option
+# variants (tet optimizer flips, a stronger random perturbation, classic
+# Delaunay, Netgen optimizer) and the candidate with the fewest cyclic sweep
+# dependencies over the OpenSn quadrature is kept (see sweep_cycles.py).
+CYCLE_CANDIDATES = int(os.getenv("GMESH_CYCLE_CANDIDATES", "1"))
+CYCLE_VARIANTS = [
+    {},
+    {"Mesh.Optimize": 1},
+    {"Mesh.RandomFactor": 10.0 * gmsh.option.getNumber("Mesh.RandomFactor")},
+    {"Mesh.Algorithm3D": 1},
+    {"Mesh.OptimizeNetgen": 1},
+]
+
+def pick_min_cycle_mesh(scale, tmp_dir):
+    from sweep_cycles import mesh_cycles  # imported lazily: needs NumPy and SciPy
+    best, counts = None, []
+    for i in range(CYCLE_CANDIDATES):
+        variant = CYCLE_VARIANTS[i % len(CYCLE_VARIANTS)]
+        if i > 0:
+            saved = {k: gmsh.option.getNumber(k) for k in variant}
+            for k, v in variant.items():
+                gmsh.option.setNumber(k, v)
+            mesh_at(scale)
+            for k, v in saved.items():
+                gmsh.option.setNumber(k, v)
+        path = os.path.join(tmp_dir, f"candidate_{i}.msh")
+        gmsh.write(path)
+        n_cycles = mesh_cycles(path)["total"]
+        counts.append(n_cycles)
+        if best is None or n_cycles < best[0]:
+            best = (n_cycles, i, path)
+        if n_cycles == 0:
+            break
+    return best, counts
 
 # -------------------------- Save mesh ----------------------------
 # Save generated mesh and optionally open in GUI
 
 os.makedirs(out_dir, exist_ok=True)
 outfile = os.path.join(out_dir, f"{model_name}_{N+1}_shells.msh")
-gmsh.write(outfile)
+best_candidate = None
+if CYCLE_CANDIDATES > 1:
+    cand_dir = tempfile.mkdtemp(prefix="cycle_candidates_", dir=out_dir)
+    with timer.stage("cycles", candidates=CYCLE_CANDIDATES) as info:
+        best_candidate, cycle_counts = pick_min_cycle_mesh(scale_used, cand_dir)
+        info["counts"] = cycle_counts
+        info["chosen"] = best_candidate[1]
+    print(f"Sweep cycles per candidate: {cycle_counts}, keeping candidate {best_candidate[1]}")
+with timer.stage("write"):
+    if best_candidate is not None:
+        shutil.move(best_candidate[2], outfile)
+        shutil.rmtree(cand_dir, ignore_errors=True)
+    else:
+        gmsh.write(outfile)
 print(f"Mesh written to: {outfile}")
+timer.total(scale=scale_used, n2d=n2d_final, tier=TIER or "auto")
 
 if SHOW_POPUP:
     gmsh.fltk.run()
@@ -0,0 +1,201 @@
+"""
+Mesh a multi-shell sphere with one process per shell volume.
+
+Same command line and output as nShell.py:
+
+    python parallel_shells.py "<r1,r2,...>" path/to/mesh/radii.txt
+
+  1. nShell.py runs in surface-only mode (GMESH_SURFACE_FILE): geometry,
+     size fields, preflight and tier settings as usual, but only the 1D/2D
+     mesh of all sphere interfaces is written.
+  2. Every shell is filled in its own process: the surface file is merged,
+     the two interface surfaces of the shell bound a new volume, and gmsh
+     meshes only that volume. Sizes come from the background field of
+     size_fields.py with the size factor, field parameters and 3D options that
+     nShell.py wrote next to the surface file, as in a full nShell.py run. The
+     interface triangulations are shared, so neighbouring shells conform.
+  3. The shells are merged with NumPy. Interface nodes come from the same
+     surface file in every process and are deduplicated by exact coordinates.
+     The result is written as binary MSH 4.1 with the physical groups
+     Inner, Shell1, ... of nShell.py.
+
+The largest (outer) shells are submitted first. GMESH_SHELL_WORKERS limits the
+number of concurrent shell processes (default: CPU count // GMESH_THREADS;
+Create_ICSBEP_Meshes.py sets it to the share of one concurrent case). Solve-cost cell
+budgets (GMESH_MAX_CELLS) and cycle candidates are only applied by nShell.py.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+import msh41
+from mesh_timing import StageTimer
+
+MODEL_NAME = "n_shells_sphere"
+
+
+def shell_worker(surface_file: str, radii: list[float], k: int, threads: int):
+    """
+    Tet mesh of shell k (0 = inner ball) from the shared surface mesh.
+    Returns (coords (m, 3), conn (n, 4) indices into coords, algorithm used).
+    """
+    import gmsh  # imported in the worker only; the parent process never starts gmsh
+    import size_fields
+
+    with open(os.path.splitext(surface_file)[0] + ".json") as f:
+        settings = json.load(f)
+
+    gmsh.initialize(["-noenv"])
+    try:
+        gmsh.option.setNumber("General.Terminal", 0)
+        gmsh.option.setNumber("General.NumThreads", max(1, threads))
+        gmsh.option.setNumber("Mesh.MaxNumThreads3D", max(1, threads))
+        gmsh.merge(surface_file)
+
+        # Interface index of every discrete surface from the mean radius of its nodes
+        interface = {}
+        for _, tag in gmsh.model.getEntities(2):
+            _, xyz, _ = gmsh.model.mesh.getNodes(2, tag, includeBoundary=True)
+            r = float(np.linalg.norm(np.asarray(xyz).reshape(-1, 3), axis=1).mean())
+            interface[int(np.abs(np.asarray(radii) - r).argmin())] = tag
+        if k not in interface or (k > 0 and k - 1 not in interface):
+            raise RuntimeError(f"No interface surfaces found for shell {k}")
+
+        # The shell volume is bounded by its two interface triangulations. The volume
+        # entities of the full model saved with the surfaces (Mesh.SaveAll) are removed,
+        # so generate(3) fills this shell only.
+        loops = [gmsh.model.geo.addSurfaceLoop([interface[k]])]
+        if k > 0:
+            loops.append(gmsh.model.geo.addSurfaceLoop([interface[k - 1]]))
+        vol = gmsh.model.geo.addVolume(loops)
+        gmsh.model.geo.synchronize()
+        others = [(3, tag) for _, tag in gmsh.model.getEntities(3) if tag != vol]
+        if others:
+            gmsh.model.removeEntities(others)
+
+        # Same background field, size factor and 3D options as nShell.py
+        size_fields.build_fields(radii, settings["uniform_size"], **settings["fields"])
+        for name, value in settings["options"].items():
+            gmsh.option.setNumber(name, value)
+        algo3d = int(settings["options"]["Mesh.Algorithm3D"])
+
+        def fill():
+            gmsh.model.mesh.generate(3)
+            _, tags = gmsh.model.mesh.getElementsByType(msh41.TET_TYPE, vol)
+            if len(tags) == 0:  # HXT can log a PLC error and return without tets
+                raise RuntimeError(f"No tetrahedra generated in shell {k} (Algorithm3D={algo3d})")
+            return tags
+
+        try:
+            node_tags = fill()
+        except Exception:
+            if algo3d == 1 or os.getenv("GMESH_TIER"):
+                raise  # nShell.py also has no fallback under GMESH_TIER
+            algo3d = 1  # same HXT -> Delaunay fallback as nShell.py
+            gmsh.model.mesh.clear([(3, vol)])
+            gmsh.option.setNumber("Mesh.Algorithm3D", 1)
+            node_tags = fill()
+
+        all_tags, all_xyz, _ = gmsh.model.mesh.getNodes()
+        lookup = np.zeros(int(np.max(all_tags)) + 1, dtype=np.int64)
+        lookup[np.asarray(all_tags, dtype=np.int64)] = np.arange(len(all_tags))
+        all_xyz = np.asarray(all_xyz).reshape(-1, 3)
+
+        used, conn = np.unique(np.asarray(node_tags, dtype=np.int64), return_inverse=True)
+        return all_xyz[lookup[used]], conn.reshape(-1, 4), algo3d
+    finally:
+        gmsh.finalize()
+
+
+def merge_shells(shells: list, r_max: float):
+    """
+    Conforming merge of per-shell meshes [(coords, conn)] (inner to outer).
+    Returns (coords, node_entity, volumes) for msh41.write_msh41.
+    """
+    offsets = np.cumsum([0] + [len(c) for c, _ in shells])
+    all_coords = np.concatenate([c for c, _ in shells])
+    # Exact duplicates only: shared interface nodes are bitwise identical
+    _, first, inverse = np.unique(all_coords, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    # Keep nodes in order of first appearance (inner shells first)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+    new_index = rank[inverse]  # global row of every per-shell node
+    coords = np.empty((len(first), 3))
+    coords[new_index] = all_coords
+
+    node_entity = np.zeros(len(coords), dtype=np.int64)
+    volumes = []
+    for k, (_, conn) in enumerate(shells):
+        gconn = new_index[conn + offsets[k]]
+        # gmsh orients tets positively, but make sure after the merge
+        neg = msh41.tet_signed_volumes(coords, gconn) < 0.0
+        gconn[neg] = gconn[neg][:, [0, 2, 1, 3]]
+        owner = node_entity[gconn.ravel()]
+        node_entity[gconn.ravel()] = np.where(owner == 0, k + 1, owner)
+        volumes.append((k + 1, k + 1, (gconn + 1).astype(np.uint64)))
+
+    # Conformity check: every face is shared by at most two tets, and faces
+    # used by a single tet lie on the outer sphere (no gaps at the interfaces)
+    conn_all = np.concatenate([v[2] for v in volumes]).astype(np.int64) - 1
+    faces = np.sort(np.concatenate([conn_all[:, f] for f in msh41.TET_FACES]), axis=1)
+    uniq, counts = np.unique(faces, axis=0, return_counts=True)
+    r_boundary = np.linalg.norm(coords[uniq[counts == 1].ravel()], axis=1)
+    if np.any(counts > 2) or np.any(np.abs(r_boundary - r_max) > 1e-6 * r_max):
+        raise RuntimeError("Merged shells do not conform at the interfaces")
+    return coords, node_entity, volumes
+
+
+def main() -> int:
+    radlist, data_path = sys.argv[1], sys.argv[2]
+    radii = [float(x) for x in radlist.strip("[]").split(",")]
+    if any(r2 <= r1 for r1, r2 in zip(radii, radii[1:])) or radii[0] <= 0.0:
+        raise ValueError("Radii must be positive and strictly increasing.")
+    out_dir = data_path[:-9]  # same convention as nShell.py: strip "radii.txt"
+    gmsh_code_dir = Path(__file__).resolve().parent
+    timer = StageTimer("/".join(Path(data_path).parts[-4:-2]))
+
+    tier = os.getenv("GMESH_TIER", "").strip().lower()
+    threads = int(os.getenv("GMESH_THREADS", "1"))
+    n_workers = int(os.getenv("GMESH_SHELL_WORKERS", "0")) or max(1, (os.cpu_count() or 1) // max(1, threads))
+
+    with tempfile.TemporaryDirectory(prefix="shells_", dir=out_dir or None) as tmp:
+        surface_file = os.path.join(tmp, "surfaces.msh")
+        env = os.environ.copy()
+        env["GMESH_SURFACE_FILE"] = surface_file
+        with timer.stage("surfaces"):
+            subprocess.run([sys.executable, str(gmsh_code_dir / "nShell.py"), radlist, data_path],
+                           check=True, cwd=str(gmsh_code_dir), env=env)
+
+        with timer.stage("shell_volumes", shells=len(radii), workers=n_workers) as info:
+            order = list(range(len(radii)))[::-1]  # outer shells are the largest
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(radii)), mp_context=get_context("spawn")) as ex:
+                futs = {k: ex.submit(shell_worker, surface_file, radii, k, threads) for k in order}
+                results = {k: f.result() for k, f in futs.items()}
+            shells = [(results[k][0], results[k][1]) for k in range(len(radii))]
+            info["algorithms"] = [results[k][2] for k in range(len(radii))]
+            info["tets"] = int(sum(len(conn) for _, conn in shells))
+
+    with timer.stage("merge"):
+        coords, node_entity, volumes = merge_shells(shells, radii[-1])
+
+    names = {1: "Inner", **{k + 1: f"Shell{k}" for k in range(1, len(radii))}}
+    os.makedirs(out_dir, exist_ok=True)
+    outfile = os.path.join(out_dir, f"{MODEL_NAME}_{len(radii)}_shells.msh")
+    with timer.stage("write", nodes=len(coords)):
+        msh41.write_msh41(outfile, coords, node_entity, volumes, names)
+    print(f"Mesh written to: {outfile}")
+    timer.total(parallel_shells=True, tier=tier or "auto")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Post-process a shell mesh so every shell has exactly its analytic volume.
+
+The generated OpenSn scripts correct faceting error by scaling each shell's
+cross sections with exact_volume / measured_volume. This step removes that
+error from the geometry instead, directly in the binary .msh written by nShell.py:
+
+  1. Nodes on the sphere surfaces (nodes of point/curve/surface entities) are
+     projected radially onto their interface radius R_k.
+  2. The volume enclosed by a triangulated star-shaped surface is homogeneous
+     of degree 3 in its node positions, so moving interface k's nodes to
+     s_k * R_k with s_k = (4/3 pi R_k^3 / V_k)^(1/3) makes the enclosed volume
+     exact. Shell volumes are differences of enclosed volumes, so all shells
+     become exact at once (and the OpenSn scaling factors become 1).
+  3. Interior nodes only change tet shapes, never shell volumes; they follow
+     a per-layer radial correction r -> r * g(r), with g interpolated linearly
+     between the interface factors, so elements next to an interface do not fold.
+
+The file is edited in place through msh41's writable memory map (its size
+never changes); archived .msh.zst meshes are decompressed to tmpfs, edited
+there and recompressed. Nothing is written if the corrected mesh would
+contain inverted tets.
+
+Usage:
+    python project_spheres.py                 # every mesh in spherical_cases
+    python project_spheres.py path/to/radii.txt ...
+"""
+
+import math
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import msh41
+import msh_storage
+
+INTERFACE_TOL = float(os.getenv("GMESH_PROJECT_TOL", "0.05"))  # max |r - R_k| / R_k to accept a surface node
+
+
+def project_mesh(msh_path, radii: list[float]) -> dict:
+    """
+    Project and volume-correct one mesh in place.
+    Returns {"nodes_moved", "max_shift", "scale_factors", "ratios_before", "ratios_after"}.
+    """
+    radii = np.asarray(radii, dtype=float)
+    msh = msh41.read_msh41(msh_path, mode="r+")
+    coords = msh.coords_by_tag()
+    n_shells = len(radii)
+    exact_enclosed = (4.0 / 3.0) * math.pi * radii**3
+    exact_shell = np.diff(np.concatenate(([0.0], exact_enclosed)))
+
+    def shell_volumes(xyz):
+        vols = msh41.volumes_per_physical(msh, xyz)
+        return np.array([vols.get(k, 0.0) for k in range(1, n_shells + 1)])
+
+    vol_before = shell_volumes(coords)
+    if np.any(vol_before <= 0.0):
+        raise ValueError(f"{msh_path}: physical groups do not match the {n_shells} radii")
+
+    # ---- 1. interface nodes -> exact radius ------------------------------
+    # Surface, curve and point entities of the OCC spheres carry the interface nodes
+    iface_tags = np.concatenate([b.tags for b in msh.node_blocks if b.dim < 3] or [np.zeros(0, np.uint64)])
+    r_iface = np.linalg.norm(coords[iface_tags], axis=1)
+    k_iface = np.abs(r_iface[:, None] - radii[None, :]).argmin(axis=1)
+    rel = np.abs(r_iface - radii[k_iface]) / radii[k_iface]
+    if rel.size and rel.max() > INTERFACE_TOL:
+        raise ValueError(f"{msh_path}: surface node {rel.max():.2%} away from the nearest radius")
+
+    projected = coords.copy()
+    unit = coords[iface_tags] / r_iface[:, None]
+    projected[iface_tags] = unit * radii[k_iface][:, None]
+
+    # ---- 2. per-interface scale factor from the enclosed volume ----------
+    enclosed = np.cumsum(shell_volumes(projected))
+    scale = np.cbrt(exact_enclosed / enclosed)
+
+    # ---- 3. radial correction of every node -------------------------------
+    # g(r) = s_1 inside the core (a pure similarity), linear between interfaces,
+    # s_N at and beyond the outer surface.
+    valid = ~np.isnan(coords[:, 0])
+    r_all = np.linalg.norm(coords[valid], axis=1)
+    g = np.interp(r_all, np.concatenate(([0.0], radii)), np.concatenate(([scale[0]], scale)))
+    corrected = coords.copy()
+    corrected[valid] = coords[valid] * g[:, None]
+    corrected[iface_tags] = unit * (radii[k_iface] * scale[k_iface])[:, None]
+
+    # Refuse to write a mesh that folded (tets that were already flat are left to validate_meshes.py)
+    for b in msh.tet_blocks():
+        folded = (msh41.tet_signed_volumes(corrected, b.nodes) <= 0.0) & (msh41.tet_signed_volumes(coords, b.nodes) > 0.0)
+        if np.any(folded):
+            raise ValueError(f"{msh_path}: correction would invert {int(np.count_nonzero(folded))} tets")
+
+    vol_after = shell_volumes(corrected)
+    for b in msh.node_blocks:
+        b.coords[:] = corrected[b.tags]
+    msh.flush()
+
+    shift = np.linalg.norm(corrected[valid] - coords[valid], axis=1)
+    return {
+        "nodes_moved": int(np.count_nonzero(shift > 0.0)),
+        "max_shift": float(shift.max()) if shift.size else 0.0,
+        "scale_factors": scale.tolist(),
+        "ratios_before": (exact_shell / vol_before).tolist(),
+        "ratios_after": (exact_shell / vol_after).tolist(),
+    }
+
+
+def project_case(radii_path) -> dict:
+    """Project the n_shells_sphere_{N}_shells.msh next to a radii.txt."""
+    radii_path = Path(radii_path)
+    with open(radii_path, "r") as f:
+        radii = [float(line) for line in f if line.strip()]
+    msh_path = radii_path.parent / f"n_shells_sphere_{len(radii)}_shells.msh"
+    with msh_storage.editable(msh_path) as plain:
+        return project_mesh(plain, radii)
+
+
+def main() -> int:
+    repo_root = Path(__file__).resolve().parents[2]
+    if len(sys.argv) > 1:
+        radii_paths = [Path(p) for p in sys.argv[1:]]
+    else:
+        radii_paths = sorted((repo_root / "spherical_cases").glob("**/mesh/radii.txt"))
+
+    failures = 0
+    for rp in radii_paths:
+        case = "/".join(rp.resolve().parts[-4:-2])
+        try:
+            res = project_case(rp)
+        except Exception as e:
+            failures += 1
+            print(f"FAIL: {case} ({type(e).__name__}: {e})")
+            continue
+        worst_before = max(abs(r - 1.0) for r in res["ratios_before"])
+        worst_after = max(abs(r - 1.0) for r in res["ratios_after"])
+        print(f"OK: {case} moved {res['nodes_moved']} nodes (max {res['max_shift']:.3e} cm), "
+              f"max |ratio - 1| {worst_before:.3e} -> {worst_after:.3e}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Renumber cells and nodes of a shell mesh for sweep and assembly locality.
+
+gmsh writes tetrahedra in generation order, so neighbouring cells are far
+apart in the file and in OpenSn's cell numbering. This step reorders the
+binary .msh in place (msh41.py memory map, file size unchanged):
+
+  - cells of every volume entity (one per shell) are sorted by
+        hilbert   3D Hilbert index of the cell centroids (default)
+        morton    Morton (Z-order) index of the centroids
+        rcm       reverse Cuthill-McKee on the face-adjacency (dual) graph, needs scipy
+    Cells stay in their volume entity, so physical groups / block IDs are unchanged.
+  - nodes of every node block are then sorted by the first renumbered cell
+    that uses them, and all element connectivity is remapped accordingly.
+    Node and element tags keep their ranges; only which point or cell carries
+    which tag changes.
+
+Archived .msh.zst meshes are decompressed, renumbered and recompressed.
+
+Usage:
+    python renumber_mesh.py [--method hilbert|morton|rcm] [radii.txt ...]   # default: every case
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import msh41
+import msh_storage
+
+METHODS = ("hilbert", "morton", "rcm")
+DEFAULT_METHOD = os.getenv("GMESH_RENUMBER_METHOD", "hilbert")
+KEY_BITS = 21  # bits per axis, 3 * 21 = 63 fit a uint64 key
+
+
+# -------------------- Space-filling curve keys --------------------
+def _quantize(points: np.ndarray, bits: int = KEY_BITS) -> np.ndarray:
+    """Integer grid coordinates in [0, 2^bits - 1] of the points' bounding box."""
+    lo = points.min(axis=0)
+    span = np.maximum(points.max(axis=0) - lo, 1e-300)
+    q = (points - lo) / span * ((1 << bits) - 1)
+    return np.clip(np.rint(q), 0, (1 << bits) - 1).astype(np.uint64)
+
+
+def _spread_bits(v: np.ndarray) -> np.ndarray:
+    """Insert two zero bits between each of the low 21 bits."""
+    v = v & np.uint64(0x1FFFFF)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1F00000000FFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1F0000FF0000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100F00F00F00F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+
+def morton_keys(points: np.ndarray) -> np.ndarray:
+    q = _quantize(points)
+    return (_spread_bits(q[:, 0]) << np.uint64(2)) | (_spread_bits(q[:, 1]) << np.uint64(1)) | _spread_bits(q[:, 2])
+
+
+def hilbert_keys(points: np.ndarray, bits: int = KEY_BITS) -> np.ndarray:
+    """3D Hilbert index (Skilling's transpose algorithm, vectorized over points)."""
+    x = _quantize(points, bits)
+    n_dims = x.shape[1]
+    # Inverse undo of the excess work
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = np.uint64(q - 1)
+        for i in range(n_dims):
+            hit = (x[:, i] & np.uint64(q)) != 0
+            x[hit, 0] ^= p
+            t = (x[~hit, 0] ^ x[~hit, i]) & p
+            x[~hit, 0] ^= t
+            x[~hit, i] ^= t
+        q >>= 1
+    # Gray encode
+    for i in range(1, n_dims):
+        x[:, i] ^= x[:, i - 1]
+    t = np.zeros(len(x), dtype=np.uint64)
+    q = 1 << (bits - 1)
+    while q > 1:
+        hit = (x[:, n_dims - 1] & np.uint64(q)) != 0
+        t[hit] ^= np.uint64(q - 1)
+        q >>= 1
+    x ^= t[:, None]
+    # Interleave the transposed form into one key, most significant bit first
+    key = np.zeros(len(x), dtype=np.uint64)
+    for b in range(bits - 1, -1, -1):
+        for i in range(n_dims):
+            key = (key << np.uint64(1)) | ((x[:, i] >> np.uint64(b)) & np.uint64(1))
+    return key
+
+
+# -------------------- Dual graph --------------------
+def face_pairs(conn: np.ndarray) -> np.ndarray:
+    """(m, 2) indices of tet pairs sharing a face; conn (n, 4) node tags."""
+    return msh41.interior_faces(conn)[0]
+
+
+def _scipy_csgraph():
+    try:
+        import scipy.sparse
+        import scipy.sparse.csgraph
+    except ImportError as e:
+        raise ImportError("Renumbering with method 'rcm' needs scipy (pip install scipy)") from e
+    return scipy.sparse, scipy.sparse.csgraph
+
+
+def rcm_order(conn: np.ndarray) -> np.ndarray:
+    sparse, csgraph = _scipy_csgraph()
+    pairs = face_pairs(conn)
+    n = len(conn)
+    ones = np.ones(2 * len(pairs), dtype=np.int8)
+    rows = np.concatenate((pairs[:, 0], pairs[:, 1]))
+    cols = np.concatenate((pairs[:, 1], pairs[:, 0]))
+    graph = sparse.csr_matrix((ones, (rows, cols)), shape=(n, n))
+    return np.asarray(csgraph.reverse_cuthill_mckee(graph, symmetric_mode=True))
+
+
+def cell_order(coords: np.ndarray, conn: np.ndarray, method: str) -> np.ndarray:
+    """Permutation of the tets of one block (new position -> old position)."""
+    if method == "rcm":
+        return rcm_order(conn)
+    centroids = coords[conn].mean(axis=1)
+    keys = hilbert_keys(centroids) if method == "hilbert" else morton_keys(centroids)
+    return np.argsort(keys, kind="stable")
+
+
+# -------------------- Renumbering --------------------
+def locality_stats(msh: msh41.MshFile) -> dict:
+    """
+    Cheap locality measures of the current numbering (file order):
+    mean |i - j| over face-adjacent cell pairs, and mean node-index span per cell.
+    """
+    tet_blocks = msh.tet_blocks()
+    conn = np.concatenate([b.nodes for b in tet_blocks]) if tet_blocks else np.zeros((0, 4), np.uint64)
+    if not len(conn):
+        return {"cells": 0, "dual_gap_mean": 0.0, "node_span_mean": 0.0}
+    node_pos = np.zeros(msh.max_node_tag + 1, dtype=np.int64)
+    start = 0
+    for b in msh.node_blocks:
+        node_pos[b.tags] = np.arange(start, start + len(b.tags))
+        start += len(b.tags)
+    pairs = face_pairs(conn)
+    pos = node_pos[conn]
+    return {
+        "cells": int(len(conn)),
+        "dual_gap_mean": float(np.abs(pairs[:, 0] - pairs[:, 1]).mean()) if len(pairs) else 0.0,
+        "node_span_mean": float((pos.max(axis=1) - pos.min(axis=1)).mean()),
+    }
+
+
+def renumber_mesh(msh_path, method: str = DEFAULT_METHOD) -> dict:
+    """Renumber one mesh in place. Returns locality_stats before and after."""
+    if method not in METHODS:
+        raise ValueError(f"Unknown renumbering method {method!r} (expected one of {METHODS})")
+    msh = msh41.read_msh41(msh_path, mode="r+")
+    before = locality_stats(msh)
+    coords = msh.coords_by_tag()
+
+    # ---- cells: reorder rows inside every tet block, element tags stay in place
+    for b in msh.tet_blocks():
+        perm = cell_order(coords, b.nodes, method)
+        b.data[:, 1:] = b.nodes[perm]
+
+    # ---- nodes: order of first use by the renumbered cells
+    first_use = np.full(msh.max_node_tag + 1, np.iinfo(np.int64).max, dtype=np.int64)
+    flat = np.concatenate([b.nodes.ravel() for b in msh.tet_blocks()])
+    uniq, idx = np.unique(flat, return_index=True)
+    first_use[uniq.astype(np.int64)] = idx
+
+    remap = np.arange(msh.max_node_tag + 1, dtype=np.uint64)
+    for b in msh.node_blocks:
+        if b.parametric:
+            continue  # parametric coordinates are interleaved with xyz; keep such blocks as written
+        perm = np.argsort(first_use[b.tags.astype(np.int64)], kind="stable")
+        remap[b.tags[perm]] = b.tags
+        b.coords[:] = b.coords[perm]
+    for b in msh.element_blocks:
+        b.data[:, 1:] = remap[b.nodes]
+    msh.flush()
+
+    return {"method": method, "before": before, "after": locality_stats(msh)}
+
+
+def renumber_case(radii_path, method: str = DEFAULT_METHOD) -> dict:
+    """Renumber the n_shells_sphere_{N}_shells.msh next to a radii.txt."""
+    radii_path = Path(radii_path)
+    with open(radii_path, "r") as f:
+        n_shells = sum(1 for line in f if line.strip())
+    msh_path = radii_path.parent / f"n_shells_sphere_{n_shells}_shells.msh"
+    with msh_storage.editable(msh_path) as plain:
+        return renumber_mesh(plain, method)
+
+
+def main() -> int:
+    repo_root = Path(__file__).resolve().parents[2]
+    args = sys.argv[1:]
+    method = DEFAULT_METHOD
+    if args[:1] == ["--method"] and len(args) > 1:
+        method, args = args[1], args[2:]
+    if args:
+        radii_paths = [Path(p) for p in args]
+    else:
+        radii_paths = sorted((repo_root / "spherical_cases").glob("**/mesh/radii.txt"))
+
+    failures = 0
+    for rp in radii_paths:
+        case = "/".join(rp.resolve().parts[-4:-2])
+        try:
+            res = renumber_case(rp, method)
+        except Exception as e:
+            failures += 1
+            print(f"FAIL: {case} ({type(e).__name__}: {e})")
+            continue
+        b, a = res["before"], res["after"]
+        print(f"OK: {case} {b['cells']} cells ({method}): neighbour gap {b['dual_gap_mean']:.0f} -> "
+              f"{a['dual_gap_mean']:.0f}, node span {b['node_span_mean']:.0f} -> {a['node_span_mean']:.0f}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""
+Background mesh-size field of the concentric-sphere meshes.
+
+nShell.py sizes every mesh with this field (radial growth, a core band and a
+refinement band on both sides of every interface) and parallel_shells.py
+rebuilds the same field in each shell process, so a shell filled on its own
+gets the interior sizes of the full-model mesh.
+
+FIELDS and RELAXED_FIELDS are the keyword arguments of the default and the
+relaxed configuration (preflight panic and the relaxed tiers, see mesh_tiers.py).
+"""
+
+import math
+import os
+
+import gmsh
+
+EPS = 1e-12  # Small tolerance for floating-point stability
+
+FIELDS = dict(
+    n_thick_loc=int(os.getenv("GMESH_N_THICK", "3")),
+    n_circ_near_loc=int(os.getenv("GMESH_N_CIRC_NEAR", "12")),
+    n_circ_far_loc=int(os.getenv("GMESH_N_CIRC_FAR", "6")),
+    band_coeff=0.55,
+    band_extra_mult=1.4,
+)
+# Looser constraints: fewer cells across thin shells and narrower bands
+RELAXED_FIELDS = dict(
+    n_thick_loc=max(2, FIELDS["n_thick_loc"] - 1),
+    n_circ_near_loc=max(10, FIELDS["n_circ_near_loc"] // 2),
+    n_circ_far_loc=FIELDS["n_circ_far_loc"],
+    band_coeff=0.45,
+    band_extra_mult=1.25,
+)
+
+
+def build_fields(radii, uniform_size, n_thick_loc, n_circ_near_loc, n_circ_far_loc, band_coeff,
+                 band_extra_mult, old_ids=()):
+    """
+    Build the field for the spheres of the given radii in the current gmsh model and set it
+    as the background mesh, after removing the fields old_ids of a previous call.
+    Returns the ids of all created fields.
+    """
+    fld = gmsh.model.mesh.field  # Shortcut for the field API
+
+    # Remove old mesh fields before creating new ones
+    for fid in old_ids:
+        try:
+            fld.remove(fid)
+        except Exception:
+            pass
+    ids = []
+
+    r_min, r_max = radii[0], radii[-1]
+    min_tk = min((radii[i] - radii[i-1]) for i in range(1, len(radii))) if len(radii) > 1 else float("inf")
+
+    r_expr = "sqrt(x*x + y*y + z*z)"  # Expression for current radius in spherical coordinates
+
+    # Compute absolute mesh size limits based on shell thickness
+    tk_min = min_tk if math.isfinite(min_tk) else uniform_size
+    h_min_abs = max(uniform_size, min(0.35 * tk_min, 0.03 * r_max))  # Fine size near thin shells
+    h_max_abs = (2.0 * math.pi * r_max) / max(n_circ_far_loc, 6)     # Coarser size far away
+
+    # Smoothly increase element size radially (quadratic scaling)
+    alpha = 2.0
+    slope = 0.0 if (r_max - r_min) < EPS else (h_max_abs - h_min_abs) / ((r_max - r_min) ** alpha)
+
+    # Field for gradual radial growth
+    g_field = fld.add("MathEval"); ids.append(g_field)
+    fld.setString(g_field, "F", f"{h_min_abs} + {slope}*(({r_expr} - {r_min})*({r_expr} - {r_min}))")
+
+    # Define limits on minimum and maximum element sizes
+    cmin_field = fld.add("MathEval"); ids.append(cmin_field)
+    fld.setString(cmin_field, "F", f"{h_min_abs}")
+    cmax_field = fld.add("MathEval"); ids.append(cmax_field)
+    fld.setString(cmax_field, "F", f"{h_max_abs}")
+    g_clamped_max = fld.add("Max"); ids.append(g_clamped_max)
+    fld.setNumbers(g_clamped_max, "FieldsList", [g_field, cmin_field])
+    g_final = fld.add("Min"); ids.append(g_final)
+    fld.setNumbers(g_final, "FieldsList", [g_clamped_max, cmax_field])
+    to_min = [g_final]  # Store all refinement fields for later combination
+
+    # Helper function: returns target mesh size around a given radius rr
+    def h_circ_near_fun(rr, ncirc=None):
+        nn = n_circ_near_loc if ncirc is None else ncirc
+        return (2.0 * math.pi * max(rr, EPS)) / max(nn, 6)
+
+    # Minimum allowable element size to avoid degenerate elements
+    h_floor_small = max(0.6 * uniform_size, min(0.20 * tk_min, 0.01 * r_max), 5e-4)
+
+    # ---------------- Core band refinement ----------------
+    # Finer mesh near the innermost sphere
+    r0 = r_min
+    h_core_target = min(max(tk_min, r0) / max(n_thick_loc, 1), h_circ_near_fun(max(r0, tk_min)))
+    h_core = max(h_floor_small, min(h_core_target, h_max_abs))
+
+    d_core = fld.add("MathEval"); ids.append(d_core)
+    fld.setString(d_core, "F", f"abs({r_expr} - {r0})")
+
+    # Threshold field constrains mesh size transition outward from the core
+    t_core = fld.add("Threshold"); ids.append(t_core)
+    try:
+        fld.setNumber(t_core, "IField", d_core)
+    except Exception:
+        fld.setNumber(t_core, "InField", d_core)
+    fld.setNumber(t_core, "LcMin", h_core)
+    fld.setNumber(t_core, "LcMax", h_max_abs)
+    fld.setNumber(t_core, "DistMin", 0.0)
+    fld.setNumber(t_core, "DistMax", r0 + EPS)
+    fld.setNumber(t_core, "StopAtDistMax", 1)
+    to_min.append(t_core)
+
+    # ---------------- Interface band refinement ----------------
+    # For every pair of spheres, generate mesh refinement near their boundaries
+    ULTRA_THIN_RATIO = float(os.getenv("GMESH_ULTRA_THIN_RATIO", "0.01"))
+    ABS_THIN = float(os.getenv("GMESH_ABS_THIN", "0.6"))
+
+    for k in range(1, len(radii)):
+        rin, rout = radii[k - 1], radii[k]
+        tk = max(rout - rin, EPS)
+        rmid = 0.5 * (rin + rout)
+        is_ultra_thin = (tk < ABS_THIN) or (tk / max(rout, EPS) < ULTRA_THIN_RATIO)
+
+        if is_ultra_thin:
+            # Use finer mesh for ultra-thin shells
+            hk_target = min(tk, h_circ_near_fun(rmid, ncirc=8))
+            hk = max(h_floor_small, min(hk_target, h_max_abs))
+            band = max(0.50 * tk, 1.50 * hk)
+        else:
+            # Allow coarser meshing for thicker shells
+            is_thick = (tk > max(1.0, 0.25 * rin))
+            hk_target = min(tk / (3.0 if is_thick else max(n_thick_loc, 1)), h_circ_near_fun(rmid))
+            hk = max(h_floor_small, min(hk_target, h_max_abs))
+            band = max(band_coeff * tk, band_extra_mult * hk)
+
+        # Define threshold fields for inner and outer shell interfaces
+        din = fld.add("MathEval"); ids.append(din)
+        fld.setString(din, "F", f"abs({r_expr} - {rin})")
+        dout = fld.add("MathEval"); ids.append(dout)
+        fld.setString(dout, "F", f"abs({r_expr} - {rout})")
+
+        tin = fld.add("Threshold"); ids.append(tin)
+        try:
+            fld.setNumber(tin, "IField", din)
+        except Exception:
+            fld.setNumber(tin, "InField", din)
+        fld.setNumber(tin, "LcMin", hk)
+        fld.setNumber(tin, "LcMax", h_max_abs)
+        fld.setNumber(tin, "DistMin", 0.0)
+        fld.setNumber(tin, "DistMax", band)
+        fld.setNumber(tin, "StopAtDistMax", 1)
+
+        tout = fld.add("Threshold"); ids.append(tout)
+        try:
+            fld.setNumber(tout, "IField", dout)
+        except Exception:
+            fld.setNumber(tout, "InField", dout)
+        fld.setNumber(tout, "LcMin", hk)
+        fld.setNumber(tout, "LcMax", h_max_abs)
+        fld.setNumber(tout, "DistMin", 0.0)
+        fld.setNumber(tout, "DistMax", band)
+        fld.setNumber(tout, "StopAtDistMax", 1)
+
+        # Combine inner and outer interface fields
+        tpair = fld.add("Min"); ids.append(tpair)
+        fld.setNumbers(tpair, "FieldsList", [tin, tout])
+        to_min.append(tpair)
+
+    # Combine all refinement regions into one background field
+    f_bg = fld.add("Min"); ids.append(f_bg)
+    fld.setNumbers(f_bg, "FieldsList", to_min)
+    fld.setAsBackgroundMesh(f_bg)
+
+    # Enforce overall mesh size bounds
+    gmsh.option.setNumber("Mesh.CharacteristicLengthMin", h_floor_small)
+    gmsh.option.setNumber("Mesh.CharacteristicLengthMax", h_max_abs)
+    return ids  # ids[-1] is the background field
@@ -0,0 +1,270 @@
+"""
+Cost model for the OpenSn k-eigenvalue solve, used to size meshes against a budget.
+
+The transport work is dominated by sweeps, so the wall time on R ranks is modelled as
+
+    t = t0 + c_t * cells * angles * groups * iterations / R
+
+and the total memory (all ranks) as
+
+    m = m0 + c_m * cells * groups * moments
+
+where angles = n_polar * n_azimuthal of GLCProductQuadrature3DXYZ (8 x 16 in the
+generated scripts), moments = (L + 1)^2 for scattering order L, and iterations
+is the total number of sweeps of the run. The coefficients are fitted by least
+squares from recorded OpenSn runs (opensn_runs.csv, one row per run):
+
+    case,cells,groups,n_polar,n_azimuthal,scattering_order,ranks,iterations,wall_s,mem_gb
+
+and stored in solve_cost_model.json next to this file. Iteration counts recorded
+for a case are reused when that case is meshed again; other cases use the median.
+Without a calibration the DEFAULT_MODEL guesses below are used.
+
+Runs are recorded from the console log of a generated OpenSn script (OpenSnGen.py):
+its "OPENSN_RUN:" line gives ranks, solve wall time, peak memory summed over the
+ranks and the quadrature; the sweeps are the inner-iteration lines of the log
+(one per GMRES iteration, verbose_inner_iterations); cells are the tets of the
+case's mesh and groups come from its MGXS libraries.
+
+The meshing driver inverts the model: for a wall-clock budget (OPENSN_BUDGET_SEC
+on OPENSN_RANKS ranks) and/or a memory budget (OPENSN_BUDGET_MEM_GB) it passes
+the largest admissible cell count to nShell.py as GMESH_MAX_CELLS.
+
+Usage:
+    python solve_cost.py record <case dir> <opensn log> [opensn_runs.csv]
+    python solve_cost.py calibrate [opensn_runs.csv]
+    python solve_cost.py predict <cells> [case]
+"""
+
+import csv
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+# Solver settings of the generated OpenSn scripts, from the generator itself
+sys.path.append(str(Path(__file__).resolve().parents[1] / "OpenSn"))
+from OpenSnGen import N_AZIMUTHAL, N_POLAR, SCATTERING_ORDER
+
+MODEL_NAME = "solve_cost_model.json"
+RUNS_NAME = "opensn_runs.csv"
+
+RUN_FIELDS = ["case", "cells", "groups", "n_polar", "n_azimuthal", "scattering_order", "ranks", "iterations",
+              "wall_s", "mem_gb"]
+RUN_LINE = "OPENSN_RUN:"
+SWEEP_LINE = re.compile(r"WGS groups \[\d+-\d+\] Iteration\s+\d+")  # one inner (GMRES) iteration = one sweep
+
+# Group structure the MGXS libraries are condensed to (openmc_mgxs.py)
+GROUP_EDGES_FILE = Path(__file__).resolve().parents[1] / "mat_extract" / "LANL70g_eV.txt"
+
+
+def group_count(edges_file=GROUP_EDGES_FILE) -> int:
+    with open(edges_file, "r") as f:
+        return sum(1 for line in f if line.strip()) - 1
+
+
+# Group count of the generated OpenSn scripts (quadrature and scattering order: OpenSnGen.py)
+N_GROUPS = group_count()
+
+# Uncalibrated defaults: ~50 ns per cell-angle-group sweep update per rank,
+# ~0.1 KB per cell-group-moment (4 nodes, a few flux-moment copies), 60 sweeps.
+DEFAULT_MODEL = {
+    "t0": 10.0,
+    "c_t": 5.0e-8,
+    "m0": 2.0,
+    "c_m": 1.0e-7,
+    "iterations_default": 60.0,
+    "iterations_by_case": {},
+    "n_runs": 0,
+}
+
+
+def n_moments(scattering_order: int) -> int:
+    return (scattering_order + 1) ** 2
+
+
+def sweep_work(cells, groups, n_polar, n_azimuthal, iterations) -> float:
+    return float(cells) * n_polar * n_azimuthal * groups * iterations
+
+
+def load_model(path=None) -> dict:
+    path = Path(path) if path else Path(__file__).resolve().parent / MODEL_NAME
+    model = dict(DEFAULT_MODEL)
+    if path.is_file():
+        with open(path, "r") as f:
+            model.update(json.load(f))
+    return model
+
+
+def _fit_line(xs, ys):
+    """Least-squares y = a + b x with a, b >= 0 (falls back to a proportional fit)."""
+    n = len(xs)
+    mx, my = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    if n < 2 or sxx == 0.0:
+        return 0.0, (my / mx if mx > 0 else 0.0)
+    b = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+    a = my - b * mx
+    if a < 0.0 or b <= 0.0:
+        a = 0.0
+        b = sum(x * y for x, y in zip(xs, ys)) / max(sum(x * x for x in xs), 1e-300)
+    return a, b
+
+
+def calibrate(runs_csv, model_path=None) -> dict:
+    """Fit the model to recorded runs and write solve_cost_model.json."""
+    with open(runs_csv, "r", newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        raise ValueError(f"No runs in {runs_csv}")
+
+    x_t, y_t, x_m, y_m = [], [], [], []
+    iters_by_case = {}
+    for r in rows:
+        cells, groups = float(r["cells"]), float(r["groups"])
+        n_pol, n_azi = float(r["n_polar"]), float(r["n_azimuthal"])
+        iters, ranks = float(r["iterations"]), float(r["ranks"])
+        x_t.append(sweep_work(cells, groups, n_pol, n_azi, iters) / ranks)
+        y_t.append(float(r["wall_s"]))
+        if r.get("mem_gb"):
+            x_m.append(cells * groups * n_moments(int(r["scattering_order"])))
+            y_m.append(float(r["mem_gb"]))
+        iters_by_case.setdefault(r["case"], []).append(iters)
+
+    model = dict(DEFAULT_MODEL)
+    model["t0"], model["c_t"] = _fit_line(x_t, y_t)
+    if x_m:
+        model["m0"], model["c_m"] = _fit_line(x_m, y_m)
+    all_iters = sorted(i for its in iters_by_case.values() for i in its)
+    model["iterations_default"] = all_iters[len(all_iters) // 2]
+    model["iterations_by_case"] = {c: sum(v) / len(v) for c, v in iters_by_case.items()}
+    model["n_runs"] = len(rows)
+
+    model_path = Path(model_path) if model_path else Path(__file__).resolve().parent / MODEL_NAME
+    with open(model_path, "w") as f:
+        json.dump(model, f, indent=2, sort_keys=True)
+    return model
+
+
+def iterations_for(model: dict, case=None) -> float:
+    return float(model["iterations_by_case"].get(case, model["iterations_default"]))
+
+
+def predict(model: dict, cells: int, ranks: int = 1, case=None,
+            groups=N_GROUPS, n_polar=N_POLAR, n_azimuthal=N_AZIMUTHAL,
+            scattering_order=SCATTERING_ORDER) -> tuple[float, float]:
+    """Predicted (wall seconds, total memory GB) for a mesh with `cells` tets."""
+    iters = iterations_for(model, case)
+    t = model["t0"] + model["c_t"] * sweep_work(cells, groups, n_polar, n_azimuthal, iters) / ranks
+    m = model["m0"] + model["c_m"] * cells * groups * n_moments(scattering_order)
+    return t, m
+
+
+def max_cells(model: dict, budget_sec=None, budget_mem_gb=None, ranks: int = 1, case=None,
+              groups=N_GROUPS, n_polar=N_POLAR, n_azimuthal=N_AZIMUTHAL,
+              scattering_order=SCATTERING_ORDER) -> int:
+    """Largest cell count whose predicted time and memory fit the budgets (0 if none fits)."""
+    limits = []
+    if budget_sec:
+        per_cell = model["c_t"] * sweep_work(1, groups, n_polar, n_azimuthal, iterations_for(model, case)) / ranks
+        limits.append((budget_sec - model["t0"]) / per_cell)
+    if budget_mem_gb:
+        limits.append((budget_mem_gb - model["m0"]) / (model["c_m"] * groups * n_moments(scattering_order)))
+    if not limits:
+        raise ValueError("Need a time and/or memory budget")
+    return max(0, int(min(limits)))
+
+
+def max_cells_from_env(case=None):
+    """GMESH_MAX_CELLS value for the OPENSN_BUDGET_* environment, or None when no budget is set."""
+    budget_sec = float(os.getenv("OPENSN_BUDGET_SEC", "0")) or None
+    budget_mem = float(os.getenv("OPENSN_BUDGET_MEM_GB", "0")) or None
+    if budget_sec is None and budget_mem is None:
+        return None
+    ranks = int(os.getenv("OPENSN_RANKS", "1"))
+    return max_cells(load_model(), budget_sec, budget_mem, ranks=ranks, case=case)
+
+
+def parse_log(log_path) -> dict:
+    """{"ranks", "wall_s", "mem_gb", "n_polar", "n_azimuthal", "scattering_order", "iterations"} of an OpenSn log."""
+    run, sweeps = None, 0
+    with open(log_path, "r", errors="replace") as f:
+        for line in f:
+            if line.startswith(RUN_LINE):
+                run = dict(item.split("=", 1) for item in line[len(RUN_LINE):].split())
+            elif SWEEP_LINE.search(line):
+                sweeps += 1
+    if run is None:
+        raise ValueError(f"No {RUN_LINE} line in {log_path} (script older than the recorder, or the solve failed)")
+    if sweeps == 0:
+        raise ValueError(f"No inner-iteration lines in {log_path} (verbose_inner_iterations off?)")
+    run["iterations"] = sweeps
+    return run
+
+
+def case_cells(case_dir) -> int:
+    """Tets of the case's shell mesh (plain or .msh.zst)."""
+    import msh41
+    import msh_storage
+
+    mesh_dir = Path(case_dir) / "mesh"
+    n_shells = sum(1 for line in open(mesh_dir / "radii.txt") if line.strip())
+    with msh_storage.materialized(mesh_dir / f"n_shells_sphere_{n_shells}_shells.msh") as plain:
+        return int(sum(len(b.data) for b in msh41.read_msh41(plain).tet_blocks()))
+
+
+def case_groups(case_dir) -> int:
+    """Energy groups of the case's MGXS libraries (N_GROUPS if there are none)."""
+    import h5py
+
+    for h5_path in sorted(Path(case_dir).glob("materials/material_*/*_LANL*g.h5")):
+        with h5py.File(h5_path, "r") as f:
+            return int(f.attrs["energy_groups"])
+    return N_GROUPS
+
+
+def record(case_dir, log_path, runs_csv) -> dict:
+    """Append the run of a case's OpenSn log to runs_csv; returns the row."""
+    case_dir = Path(case_dir).resolve()
+    run = parse_log(log_path)
+    cells = case_cells(case_dir)
+    if cells == 0:
+        raise ValueError(f"No tets in the mesh of {case_dir}")
+    row = {"case": "/".join(case_dir.parts[-2:]), "cells": cells, "groups": case_groups(case_dir)}
+    row.update({key: run[key] for key in RUN_FIELDS if key in run})
+    new_file = not Path(runs_csv).is_file()
+    with open(runs_csv, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RUN_FIELDS)
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+    return row
+
+
+def main() -> int:
+    here = Path(__file__).resolve().parent
+    if len(sys.argv) >= 4 and sys.argv[1] == "record":
+        runs = Path(sys.argv[4]) if len(sys.argv) > 4 else here / RUNS_NAME
+        row = record(sys.argv[2], sys.argv[3], runs)
+        print(f"Recorded {row['case']}: {row['cells']} cells, {row['iterations']} sweeps on {row['ranks']} rank(s), "
+              f"{row['wall_s']} s, {row['mem_gb']} GB -> {runs}")
+        return 0
+    if len(sys.argv) >= 2 and sys.argv[1] == "calibrate":
+        runs = Path(sys.argv[2]) if len(sys.argv) > 2 else here / RUNS_NAME
+        model = calibrate(runs)
+        print(f"Calibrated from {model['n_runs']} runs: t0={model['t0']:.3g} s, c_t={model['c_t']:.3e} s, "
+              f"m0={model['m0']:.3g} GB, c_m={model['c_m']:.3e} GB, median iterations={model['iterations_default']:.0f}")
+        return 0
+    if len(sys.argv) >= 3 and sys.argv[1] == "predict":
+        model = load_model()
+        ranks = int(os.getenv("OPENSN_RANKS", "1"))
+        t, m = predict(model, int(sys.argv[2]), ranks=ranks, case=sys.argv[3] if len(sys.argv) > 3 else None)
+        print(f"Predicted on {ranks} rank(s): {t:.1f} s, {m:.2f} GB")
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""
+Geometry-aware rank partitions of the sphere meshes for OpenSn sweeps.
+
+The spheres are centred at the origin (nShell.py), so cells can be assigned
+to ranks from their centroids alone:
+
+    sectors  the sphere is split into n_pol polar x n_az azimuthal cones
+             (equal cell counts in cos(theta) and phi; 2 x 4 = octants) and
+             each cone into n_rad radial bands (equal cell counts in r)
+    kba      nx x ny x nz blocks cut at cell-count quantiles of x, y and z;
+             2 x 2 x 2 are exactly the octants. OpenSn builds this partition
+             itself (KBAGraphPartitioner), so it is what the generated
+             scripts use.
+
+OpenSn cannot read a per-cell rank list, so the sector layout is exported as
+its band edges and the generated scripts use the KBA layout. Both layouts are
+rated with a sweep model over the GLC quadrature directions of sweep_cycles.py:
+per direction, the partitions form a dependency graph through their shared
+faces (the weakest arcs of cycles are lagged, see sweep_model), and a
+pipelined sweep over A directions with mean critical-path length S partitions
+runs at
+
+    efficiency = (mean cells / max cells) * A / (A + S - 1)
+
+The layouts are written to mesh/partition.json next to radii.txt:
+
+    {"center": [0, 0, 0], "cells": N,
+     "ranks": {"8": {"sectors": {...}, "kba": {"nx", "ny", "nz", "xcuts", "ycuts", "zcuts"},
+                     "model": {"sectors": {...}, "kba": {...}}}, ...}}
+
+Usage:
+    python sphere_partition.py [--ranks 8,16,32,64,128] [radii.txt ...]   # default: every case
+"""
+
+import json
+import math
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import msh41
+import msh_storage
+from sweep_cycles import glc_directions, oriented_faces
+
+PARTITION_NAME = "partition.json"
+DEFAULT_RANKS = [int(p) for p in os.getenv("GMESH_PARTITION_RANKS", "8,16,32,64,128").split(",") if p.strip()]
+CENTER = np.zeros(3)  # nShell.py builds the spheres around the origin
+
+
+def _divisors(n: int) -> list[int]:
+    return [d for d in range(1, n + 1) if n % d == 0]
+
+
+def _quantile_cuts(values: np.ndarray, n: int) -> list[float]:
+    """n - 1 interior cuts splitting values into n equally populated bins."""
+    if n <= 1:
+        return []
+    return [float(c) for c in np.quantile(values, np.arange(1, n) / n)]
+
+
+def _imbalance(part: np.ndarray, n_ranks: int) -> float:
+    counts = np.bincount(part, minlength=n_ranks)
+    return float(counts.max() / max(counts.mean(), 1e-300))
+
+
+def cell_centroids(msh: msh41.MshFile):
+    """(coords by tag, tet connectivity in file order, centroids relative to CENTER)."""
+    tet_blocks = msh.tet_blocks()
+    if not tet_blocks:
+        raise ValueError(f"{msh.path} has no tetrahedra")
+    coords = msh.coords_by_tag()
+    conn = np.concatenate([b.nodes for b in tet_blocks]).astype(np.int64)
+    return coords, conn, coords[conn].mean(axis=1) - CENTER
+
+
+# -------------------- Sector / band layout --------------------
+def sector_layout(n_ranks: int) -> tuple[int, int, int]:
+    """
+    (n_pol, n_az, n_rad) with n_pol * n_az * n_rad = n_ranks: radial bands
+    only once there are more than 8 ranks per band, cones about twice as
+    many in phi as in cos(theta) (equal-area, near-square sectors).
+    """
+    n_rad = max(d for d in _divisors(n_ranks) if d <= max(1, round(math.sqrt(n_ranks / 8))))
+    n_sec = n_ranks // n_rad
+    n_pol = min(_divisors(n_sec), key=lambda p: (abs(math.log(n_sec / p / (2.0 * p))), p))
+    return n_pol, n_sec // n_pol, n_rad
+
+
+def sector_partition(centroids: np.ndarray, n_ranks: int):
+    """(layout dict with the band edges, rank of every cell)."""
+    n_pol, n_az, n_rad = sector_layout(n_ranks)
+    r = np.linalg.norm(centroids, axis=1)
+    cos_t = centroids[:, 2] / np.maximum(r, 1e-300)
+    phi = np.arctan2(centroids[:, 1], centroids[:, 0])
+    layout = {
+        "n_pol": n_pol, "n_az": n_az, "n_rad": n_rad,
+        "cos_theta_cuts": _quantile_cuts(cos_t, n_pol),
+        "phi_cuts": _quantile_cuts(phi, n_az),
+        "r_cuts": _quantile_cuts(r, n_rad),
+    }
+    part = (
+        (np.searchsorted(layout["cos_theta_cuts"], cos_t) * n_az
+         + np.searchsorted(layout["phi_cuts"], phi)) * n_rad
+        + np.searchsorted(layout["r_cuts"], r)
+    )
+    return layout, part.astype(np.int64)
+
+
+# -------------------- KBA layout --------------------
+def kba_ranks(centroids: np.ndarray, kba: dict) -> np.ndarray:
+    """Rank of every cell under a KBA layout (x fastest, as in OpenSn)."""
+    i = np.searchsorted(kba["xcuts"], centroids[:, 0])
+    j = np.searchsorted(kba["ycuts"], centroids[:, 1])
+    k = np.searchsorted(kba["zcuts"], centroids[:, 2])
+    return ((k * kba["ny"] + j) * kba["nx"] + i).astype(np.int64)
+
+
+def kba_partition(centroids: np.ndarray, n_ranks: int, n_directions: int):
+    """
+    (KBAGraphPartitioner arguments, rank of every cell) of the nx x ny x nz
+    factorization with the best model estimate: load balance times
+    A / (A + nx + ny + nz - 3). Blocks near the corners of the bounding box
+    hold few cells of a sphere, which the balance term penalizes.
+    """
+    best = None
+    for nx in _divisors(n_ranks):
+        for ny in _divisors(n_ranks // nx):
+            nz = n_ranks // (nx * ny)
+            kba = {
+                "nx": nx, "ny": ny, "nz": nz,
+                "xcuts": _quantile_cuts(centroids[:, 0], nx),
+                "ycuts": _quantile_cuts(centroids[:, 1], ny),
+                "zcuts": _quantile_cuts(centroids[:, 2], nz),
+            }
+            part = kba_ranks(centroids, kba)
+            score = n_directions / (n_directions + nx + ny + nz - 3) / _imbalance(part, n_ranks)
+            if best is None or score > best[0] * (1.0 + 1e-9):
+                best = (score, kba, part)
+    return best[1], best[2]
+
+
+# -------------------- Sweep model --------------------
+def _sweep_order(n: int, src: np.ndarray, dst: np.ndarray, w: np.ndarray) -> list[int]:
+    """
+    Greedy feedback-arc-set ordering (Eades, Lin & Smyth) of a weighted
+    digraph: sinks go last, sources first, otherwise the node with the largest
+    outgoing minus incoming weight. Edges against the order are the ones a
+    sweep has to lag.
+    """
+    succ = [dict() for _ in range(n)]
+    pred = [dict() for _ in range(n)]
+    for u, v, x in zip(src.tolist(), dst.tolist(), w.tolist()):
+        succ[u][v] = x
+        pred[v][u] = x
+    left = set(range(n))
+    head, tail = [], []
+
+    def drop(c):
+        left.discard(c)
+        for v in succ[c]:
+            pred[v].pop(c, None)
+        for u in pred[c]:
+            succ[u].pop(c, None)
+
+    while left:
+        sinks = [c for c in left if not succ[c]]
+        sources = [c for c in left if not pred[c]]
+        if sinks or sources:
+            for c in sinks:
+                if c in left:
+                    tail.append(c)
+                    drop(c)
+            for c in sources:
+                if c in left:
+                    head.append(c)
+                    drop(c)
+            continue
+        c = max(left, key=lambda c: (sum(succ[c].values()) - sum(pred[c].values()), -c))
+        head.append(c)
+        drop(c)
+    return head + tail[::-1]
+
+
+def sweep_model(pairs: np.ndarray, normals: np.ndarray, part: np.ndarray, n_ranks: int, directions=None) -> dict:
+    """
+    Pipelined-sweep efficiency estimate of a partition from the interior face
+    pairs / normals of sweep_cycles.oriented_faces.
+
+    Per direction, partition u feeds v with the weight sum |Omega . n| over
+    their shared faces (n scaled with the face area by oriented_faces).
+    Partition boundaries follow tet faces and are jagged, so the graph is
+    almost always cyclic; like OpenSn, the sweep lags a
+    feedback arc set (chosen by _sweep_order) and the critical path is the
+    longest chain of partitions through the remaining acyclic graph.
+    """
+    directions = glc_directions() if directions is None else np.asarray(directions)
+    pa, pb = part[pairs[:, 0]], part[pairs[:, 1]]
+    cross = pa != pb
+    pa, pb, normals = pa[cross], pb[cross], normals[cross]
+
+    stages, lagged = [], []
+    cache = {}
+    for omega in directions:
+        # -Omega reverses every edge: same critical path and lagged arcs
+        key = tuple(np.round(omega if omega[2] > 0 or (omega[2] == 0 and omega[0] >= 0) else -omega, 12))
+        if key not in cache:
+            d = normals @ np.asarray(key)
+            src = np.where(d > 0.0, pa, pb)
+            dst = np.where(d > 0.0, pb, pa)
+            edges, inverse = np.unique(src * n_ranks + dst, return_inverse=True)
+            w = np.bincount(inverse.ravel(), weights=np.abs(d))
+            eu, ev = edges // n_ranks, edges % n_ranks
+            position = np.empty(n_ranks, dtype=np.int64)
+            position[_sweep_order(n_ranks, eu, ev, w)] = np.arange(n_ranks)
+            forward = position[eu] < position[ev]
+            depth = np.ones(n_ranks, dtype=np.int64)
+            for e in np.argsort(position[eu[forward]], kind="stable"):
+                u, v = eu[forward][e], ev[forward][e]
+                depth[v] = max(depth[v], depth[u] + 1)
+            cache[key] = (int(depth.max()), float(w[~forward].sum() / max(w.sum(), 1e-300)))
+        n_stages, lag = cache[key]
+        stages.append(n_stages)
+        lagged.append(lag)
+
+    imbalance = _imbalance(part, n_ranks)
+    mean_stages = float(np.mean(stages))
+    n_dir = len(directions)
+    return {
+        "imbalance": round(imbalance, 4),
+        "mean_stages": round(mean_stages, 2),
+        "max_stages": int(max(stages)),
+        "lagged_fraction": round(float(np.mean(lagged)), 5),
+        "efficiency": round(n_dir / (n_dir + mean_stages - 1.0) / imbalance, 4),
+    }
+
+
+# -------------------- Cases --------------------
+def partition_mesh(msh_path, ranks: list[int]) -> dict:
+    """Layouts and model ratings of one mesh for every rank count."""
+    with msh_storage.materialized(msh_path) as plain:
+        msh = msh41.read_msh41(plain)
+        coords, conn, centroids = cell_centroids(msh)
+    directions = glc_directions()
+    pairs, normals = oriented_faces(coords, conn)
+    out = {"center": CENTER.tolist(), "cells": int(len(conn)), "ranks": {}}
+    for n_ranks in ranks:
+        sectors, sector_part = sector_partition(centroids, n_ranks)
+        kba, kba_part = kba_partition(centroids, n_ranks, len(directions))
+        out["ranks"][str(n_ranks)] = {
+            "sectors": sectors,
+            "kba": kba,
+            "model": {
+                "sectors": sweep_model(pairs, normals, sector_part, n_ranks, directions),
+                "kba": sweep_model(pairs, normals, kba_part, n_ranks, directions),
+            },
+        }
+    return out
+
+
+def partition_case(radii_path, ranks=None) -> dict:
+    """Write mesh/partition.json for the n_shells_sphere_{N}_shells.msh next to a radii.txt."""
+    radii_path = Path(radii_path)
+    with open(radii_path, "r") as f:
+        n_shells = sum(1 for line in f if line.strip())
+    res = partition_mesh(radii_path.parent / f"n_shells_sphere_{n_shells}_shells.msh", ranks or DEFAULT_RANKS)
+    out_path = radii_path.parent / PARTITION_NAME
+    out_path.write_text(json.dumps(res, indent=1) + "\n")
+    return res
+
+
+def main() -> int:
+    repo_root = Path(__file__).resolve().parents[2]
+    args = sys.argv[1:]
+    ranks = DEFAULT_RANKS
+    if args[:1] == ["--ranks"] and len(args) > 1:
+        ranks, args = [int(p) for p in args[1].split(",") if p.strip()], args[2:]
+    if args:
+        radii_paths = [Path(p) for p in args]
+    else:
+        radii_paths = sorted((repo_root / "spherical_cases").glob("**/mesh/radii.txt"))
+
+    failures = 0
+    for rp in radii_paths:
+        case = "/".join(rp.resolve().parts[-4:-2])
+        try:
+            res = partition_case(rp, ranks)
+        except Exception as e:
+            failures += 1
+            print(f"FAIL: {case} ({type(e).__name__}: {e})")
+            continue
+        for n_ranks, entry in res["ranks"].items():
+            s, k = entry["model"]["sectors"], entry["model"]["kba"]
+            kba = entry["kba"]
+            print(f"OK: {case} {res['cells']} cells, {n_ranks:>4} ranks: "
+                  f"sectors {entry['sectors']['n_pol']}x{entry['sectors']['n_az']}x{entry['sectors']['n_rad']} "
+                  f"eff {s['efficiency']:.3f} (lagged {s['lagged_fraction']:.1%}), "
+                  f"kba {kba['nx']}x{kba['ny']}x{kba['nz']} eff {k['efficiency']:.3f} (lagged {k['lagged_fraction']:.1%})")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Sweep-cycle diagnostics of a tet mesh for the OpenSn angular quadrature.
+
+For a direction Omega, every interior face orders its two cells (upwind ->
+downwind by the sign of Omega . n). A sweep needs this directed cell graph to
+be acyclic; every strongly connected component with more than one cell is a
+cycle OpenSn must break with lagged fluxes. This tool counts those components
+for each direction of GLCProductQuadrature3DXYZ(n_polar=8, n_azimuthal=16) as
+used by the generated OpenSn scripts.
+
+Omega and -Omega give the same components (the graph is reversed), so only
+the upper hemisphere is computed and counted twice.
+
+Needs scipy (strongly connected components). Results go to sweep_cycles.csv
+in this folder, one row per case.
+
+Usage:
+    python sweep_cycles.py                 # every mesh in spherical_cases
+    python sweep_cycles.py path/to/radii.txt ...
+"""
+
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import msh41
+import msh_storage
+
+CYCLES_NAME = "sweep_cycles.csv"
+N_POLAR = 8
+N_AZIMUTHAL = 16
+
+
+def _scipy_csgraph():
+    try:
+        import scipy.sparse
+        import scipy.sparse.csgraph
+    except ImportError as e:
+        raise ImportError("Sweep-cycle counting needs scipy (pip install scipy)") from e
+    return scipy.sparse, scipy.sparse.csgraph
+
+
+def glc_directions(n_polar: int = N_POLAR, n_azimuthal: int = N_AZIMUTHAL) -> np.ndarray:
+    """(n_polar * n_azimuthal, 3) unit directions: Gauss-Legendre in mu, Gauss-Chebyshev in phi."""
+    mu, _ = np.polynomial.legendre.leggauss(n_polar)
+    phi = np.pi * (2.0 * np.arange(n_azimuthal) + 1.0) / n_azimuthal
+    mu, phi = np.meshgrid(mu, phi, indexing="ij")
+    s = np.sqrt(1.0 - mu**2)
+    return np.column_stack((s.ravel() * np.cos(phi.ravel()), s.ravel() * np.sin(phi.ravel()), mu.ravel()))
+
+
+def oriented_faces(coords: np.ndarray, conn: np.ndarray):
+    """Interior face pairs (a, b) and their normals pointing from cell a into cell b."""
+    pairs, faces = msh41.interior_faces(conn)
+    p0, p1, p2 = coords[faces[:, 0]], coords[faces[:, 1]], coords[faces[:, 2]]
+    normals = np.cross(p1 - p0, p2 - p0)
+    centroid_a = coords[conn[pairs[:, 0]]].mean(axis=1)
+    flip = np.einsum("ij,ij->i", normals, (p0 + p1 + p2) / 3.0 - centroid_a) < 0.0
+    normals[flip] *= -1.0
+    return pairs, normals
+
+
+def count_cycles(coords: np.ndarray, conn: np.ndarray, directions=None) -> dict:
+    """
+    Cyclic SCCs per direction. Returns {"per_direction": [n_sccs, ...],
+    "cells_in_cycles": [...], "total", "max", "directions_with_cycles"}.
+    """
+    sparse, csgraph = _scipy_csgraph()
+    directions = glc_directions() if directions is None else np.asarray(directions)
+    pairs, normals = oriented_faces(coords, conn)
+    n_cells = len(conn)
+    tol = 1e-12 * np.linalg.norm(normals, axis=1)
+
+    per_dir, cells_per_dir = [], []
+    cache = {}
+    for omega in directions:
+        # Omega and -Omega share their components
+        key = tuple(np.round(omega if omega[2] > 0 or (omega[2] == 0 and omega[0] >= 0) else -omega, 12))
+        if key not in cache:
+            d = normals @ np.asarray(key)
+            fwd, bwd = d > tol, d < -tol
+            src = np.concatenate((pairs[fwd, 0], pairs[bwd, 1]))
+            dst = np.concatenate((pairs[fwd, 1], pairs[bwd, 0]))
+            graph = sparse.csr_matrix((np.ones(len(src), np.int8), (src, dst)), shape=(n_cells, n_cells))
+            _, labels = csgraph.connected_components(graph, directed=True, connection="strong")
+            sizes = np.bincount(labels)
+            cyclic = sizes > 1
+            cache[key] = (int(np.count_nonzero(cyclic)), int(sizes[cyclic].sum()))
+        n_scc, n_cells_cyclic = cache[key]
+        per_dir.append(n_scc)
+        cells_per_dir.append(n_cells_cyclic)
+
+    return {
+        "per_direction": per_dir,
+        "cells_in_cycles": cells_per_dir,
+        "total": int(sum(per_dir)),
+        "max": int(max(per_dir)) if per_dir else 0,
+        "directions_with_cycles": int(sum(1 for n in per_dir if n)),
+    }
+
+
+def mesh_cycles(msh_path) -> dict:
+    """count_cycles() over all tets of one .msh (or .msh.zst)."""
+    with msh_storage.materialized(msh_path) as plain:
+        msh = msh41.read_msh41(plain)
+        tet_blocks = msh.tet_blocks()
+        if not tet_blocks:
+            raise ValueError(f"{msh_path} has no tetrahedra")
+        conn = np.concatenate([b.nodes for b in tet_blocks])
+        res = count_cycles(msh.coords_by_tag(), conn)
+    res["cells"] = int(len(conn))
+    return res
+
+
+def case_cycles(radii_path: Path) -> dict:
+    """Row for the report of the mesh next to a radii.txt."""
+    with open(radii_path, "r") as f:
+        n_shells = sum(1 for line in f if line.strip())
+    row = {"case": "/".join(radii_path.parts[-4:-2]), "cells": "", "cyclic_sccs": "", "max_per_direction": "",
+           "directions_with_cycles": "", "max_cells_in_cycles": "", "problems": ""}
+    try:
+        res = mesh_cycles(radii_path.parent / f"n_shells_sphere_{n_shells}_shells.msh")
+    except Exception as e:
+        row["problems"] = f"{type(e).__name__}: {e}"
+        return row
+    row.update(cells=res["cells"], cyclic_sccs=res["total"], max_per_direction=res["max"],
+               directions_with_cycles=res["directions_with_cycles"],
+               max_cells_in_cycles=max(res["cells_in_cycles"]))
+    return row
+
+
+def main() -> int:
+    repo_root = Path(__file__).resolve().parents[2]
+    gmsh_code_dir = Path(__file__).resolve().parent
+    if len(sys.argv) > 1:
+        radii_paths = [Path(p).resolve() for p in sys.argv[1:]]
+    else:
+        radii_paths = sorted((repo_root / "spherical_cases").glob("**/mesh/radii.txt"))
+    max_workers_env = os.getenv("MAX_WORKERS")
+    max_workers = int(max_workers_env) if max_workers_env else (os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(case_cycles, radii_paths))
+
+    for row in rows:
+        if row["problems"]:
+            print(f"FAIL: {row['case']} ({row['problems']})")
+        elif row["cyclic_sccs"]:
+            print(f"{row['case']}: {row['cyclic_sccs']} cyclic SCCs in {row['directions_with_cycles']} "
+                  f"of {N_POLAR * N_AZIMUTHAL} directions (largest {row['max_cells_in_cycles']} cells)")
+
+    out_path = gmsh_code_dir / CYCLES_NAME
+    with open(out_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["case"])
+        w.writeheader()
+        w.writerows(rows)
+    n_cyclic = sum(1 for r in rows if r["cyclic_sccs"])
+    print(f"{n_cyclic} of {len(rows)} meshes have sweep cycles. Report written to: {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Per-host calibration of gmsh threading for the meshing driver.
+
+`calibrate` meshes a few synthetic sphere stacks (a single sphere, a thin-shell
+stack and a many-shell stack) with nShell.py at 1, 2, 4, 8, ... threads
+(General.NumThreads and the 2D/3D limits), measures the wall time of each run,
+and fits Amdahl's law to the speedups:
+
+    S(t) = 1 / ((1 - p) + p / t)
+
+The parallel fraction p and the raw timings are stored per host name in
+thread_profiles.json next to this file.
+
+Create_ICSBEP_Meshes.py reads the profile of the current host (unless
+GMESH_THREADS is set by hand) and splits the cores between threads per case
+and cases in parallel so that the catalog throughput
+min(workers, cases) * S(threads) is maximal.
+
+Usage:
+    python tune_threads.py calibrate [max_threads]
+    python tune_threads.py show
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROFILES_NAME = "thread_profiles.json"
+REPEATS = int(os.getenv("TUNE_REPEATS", "2"))
+TIMEOUT = float(os.getenv("TUNE_TIMEOUT", "1800"))
+
+# Representative geometries (cm): one sphere, thin shells, many shells
+SYNTHETIC_STACKS = {
+    "sphere": [8.0],
+    "thin_shells": [6.0, 6.1, 6.25, 9.0, 9.05],
+    "many_shells": [1.0 + 1.2 * k for k in range(10)],
+}
+
+
+def profiles_path() -> Path:
+    return Path(__file__).resolve().parent / PROFILES_NAME
+
+
+def thread_counts(max_threads: int) -> list[int]:
+    counts, t = [], 1
+    while t <= max_threads:
+        counts.append(t)
+        t *= 2
+    return counts
+
+
+def time_mesh(radii: list[float], threads: int, work_dir: Path, gmsh_code_dir: Path) -> float:
+    """Wall seconds of one nShell.py run of a synthetic stack."""
+    radii_path = work_dir / "mesh" / "radii.txt"
+    radii_path.parent.mkdir(parents=True, exist_ok=True)
+    radii_path.write_text("\n".join(str(r) for r in radii) + "\n")
+    env = os.environ.copy()
+    env.update({
+        "GMESH_THREADS": str(threads),
+        "GMESH_MAX_THREADS_2D": str(threads),
+        "GMESH_MAX_THREADS_3D": str(threads),
+        "GMESH_EVENTS_FILE": str(work_dir / "events.jsonl"),
+    })
+    t0 = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(gmsh_code_dir / "nShell.py"), ",".join(str(r) for r in radii), str(radii_path)],
+        check=True, cwd=str(gmsh_code_dir), env=env, timeout=TIMEOUT,
+        stdout=subprocess.DEVNULL,
+    )
+    return time.perf_counter() - t0
+
+
+def fit_amdahl(speedups: dict) -> float:
+    """Least-squares parallel fraction p from {threads: speedup} (1/S - 1 = p (1/t - 1))."""
+    xs = [1.0 / t - 1.0 for t in speedups]
+    ys = [1.0 / s - 1.0 for s in speedups.values()]
+    sxx = sum(x * x for x in xs)
+    if sxx == 0.0:
+        return 0.0
+    p = sum(x * y for x, y in zip(xs, ys)) / sxx
+    return min(max(p, 0.0), 1.0)
+
+
+def speedup(p: float, threads: int) -> float:
+    return 1.0 / ((1.0 - p) + p / threads)
+
+
+def calibrate(max_threads: int) -> dict:
+    gmsh_code_dir = Path(__file__).resolve().parent
+    counts = thread_counts(max_threads)
+    times = {name: {} for name in SYNTHETIC_STACKS}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, radii in SYNTHETIC_STACKS.items():
+            for t in counts:
+                runs = [time_mesh(radii, t, Path(tmp) / f"{name}_{t}", gmsh_code_dir) for _ in range(REPEATS)]
+                times[name][t] = min(runs)
+                print(f"{name}: {t} thread(s) {times[name][t]:.2f} s")
+
+    # Pool the stacks: speedup of the summed time, so larger meshes weigh more
+    total = {t: sum(times[name][t] for name in times) for t in counts}
+    speedups = {t: total[1] / total[t] for t in counts}
+    profile = {
+        "parallel_fraction": fit_amdahl(speedups),
+        "cpus": os.cpu_count() or 1,
+        "speedups": {str(t): round(s, 4) for t, s in speedups.items()},
+        "times": {name: {str(t): round(v, 3) for t, v in ts.items()} for name, ts in times.items()},
+        "calibrated": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    path = profiles_path()
+    profiles = json.loads(path.read_text()) if path.is_file() else {}
+    profiles[socket.gethostname()] = profile
+    path.write_text(json.dumps(profiles, indent=2, sort_keys=True) + "\n")
+    return profile
+
+
+def load_profile(host=None):
+    """Profile of this host (or `host`), None when it has not been calibrated."""
+    path = profiles_path()
+    if not path.is_file():
+        return None
+    return json.loads(path.read_text()).get(host or socket.gethostname())
+
+
+def plan(profile: dict, n_cases: int, cores=None) -> tuple[int, int]:
+    """(threads per case, concurrent cases) maximizing min(workers, n_cases) * S(threads)."""
+    cores = cores or os.cpu_count() or 1
+    p = profile["parallel_fraction"]
+    best = (0.0, 1, cores)
+    for t in thread_counts(cores):
+        workers = max(1, cores // t)
+        throughput = min(workers, max(n_cases, 1)) * speedup(p, t)
+        if throughput > best[0] * (1.0 + 1e-9):
+            best = (throughput, t, workers)
+    return best[1], best[2]
+
+
+def main() -> int:
+    if len(sys.argv) >= 2 and sys.argv[1] == "calibrate":
+        max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+        profile = calibrate(max_threads)
+        print(f"{socket.gethostname()}: parallel fraction {profile['parallel_fraction']:.3f}, "
+              f"speedups {profile['speedups']}")
+        return 0
+    if len(sys.argv) >= 2 and sys.argv[1] == "show":
+        profile = load_profile()
+        if profile is None:
+            print(f"No profile for {socket.gethostname()} in {profiles_path()}")
+            return 1
+        cores = os.cpu_count() or 1
+        print(f"{socket.gethostname()}: parallel fraction {profile['parallel_fraction']:.3f} "
+              f"(calibrated {profile['calibrated']})")
+        for n_cases in (1, cores // 2, cores, 10 * cores):
+            if n_cases >= 1:
+                t, w = plan(profile, n_cases, cores)
+                print(f"  {n_cases} case(s) on {cores} cores: {t} thread(s) x {w} worker(s)")
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
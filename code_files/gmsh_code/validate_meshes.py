@@ -0,0 +1,170 @@
+"""
+Catalog-wide pre-submit check of the generated meshes, without gmsh or OpenSn.
+
+For every spherical_cases/**/mesh/radii.txt the matching
+n_shells_sphere_{N}_shells.msh (or its .msh.zst archive, decompressed to tmpfs)
+is memory-mapped with msh41.py and checked for:
+  - binary MSH 4.1 format and at least one tetrahedron
+  - physical volume groups exactly 1..N, N = number of lines in radii.txt
+  - inverted tets (negative signed volume) and degenerate tets
+    (|V| / L_max^3 below MSH_DEGENERATE_RATIO; a regular tet has 0.118)
+  - per-group tet volume against the exact shell volume (the ratio the
+    OpenSn scripts later use to scale cross sections)
+  - with MSH_CHECK_CYCLES=1, the number of cyclic sweep dependencies over
+    the OpenSn quadrature directions (sweep_cycles.py, needs scipy); recorded
+    as a quality metric, not a failure
+
+Results go to mesh_validation.csv in this folder; the exit code is 1 when
+any case fails.
+"""
+
+import csv
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+import msh41
+import msh_storage
+
+VALIDATION_NAME = "mesh_validation.csv"
+DEGENERATE_RATIO = float(os.getenv("MSH_DEGENERATE_RATIO", "1e-6"))
+MAX_VOLUME_ERR = float(os.getenv("MSH_MAX_VOLUME_ERR", "0.05"))  # warn above this |1 - exact/measured|
+CHECK_CYCLES = bool(int(os.getenv("MSH_CHECK_CYCLES", "0")))
+
+
+def read_radii(radii_path: Path) -> list[float]:
+    with open(radii_path, "r") as f:
+        return [float(line) for line in f if line.strip()]
+
+
+def exact_shell_volumes(radii: list[float]) -> list[float]:
+    out, prev = [], 0.0
+    for r in radii:
+        out.append((4.0 / 3.0) * math.pi * (r**3 - prev**3))
+        prev = r
+    return out
+
+
+def mesh_path_for(radii_path: Path, n_shells: int) -> Path:
+    return radii_path.parent / f"n_shells_sphere_{n_shells}_shells.msh"
+
+
+def validate_case(radii_path: Path) -> dict:
+    """Validate one case; returns a row for the report (status OK / WARN / FAIL)."""
+    radii = read_radii(radii_path)
+    n = len(radii)
+    row = {
+        "case": "/".join(radii_path.parts[-4:-2]),
+        "status": "OK",
+        "shells": n,
+        "nodes": 0,
+        "tets": 0,
+        "inverted": 0,
+        "degenerate": 0,
+        "max_volume_err": "",
+        "sweep_cycles": "",
+        "problems": "",
+    }
+
+    msh_path = mesh_path_for(radii_path, n)
+    if msh_storage.resolve_mesh(msh_path) is None:
+        row.update(status="FAIL", problems=f"missing {msh_path.name}")
+        return row
+    with msh_storage.materialized(msh_path) as plain:
+        try:
+            msh = msh41.read_msh41(plain)
+        except Exception as e:
+            row.update(status="FAIL", problems=f"unreadable: {type(e).__name__}: {e}")
+            return row
+        return _check_mesh(msh, radii, row)
+
+
+def _check_mesh(msh, radii, row: dict) -> dict:
+    n = len(radii)
+    problems = []
+
+    tet_blocks = msh.tet_blocks()
+    row["nodes"] = msh.num_nodes
+    row["tets"] = sum(len(b.data) for b in tet_blocks)
+    if row["tets"] == 0:
+        row.update(status="FAIL", problems="no tetrahedra")
+        return row
+
+    coords = msh.coords_by_tag()
+    volumes = {}
+    for b in tet_blocks:
+        phys = msh.physical_of(3, b.tag)
+        if not phys:
+            problems.append(f"volume entity {b.tag} has no physical group")
+        conn = b.nodes
+        vol = msh41.tet_signed_volumes(coords, conn)
+        row["inverted"] += int(np.count_nonzero(vol < 0.0))
+        quality = np.abs(vol) / np.maximum(msh41.tet_max_edge(coords, conn), 1e-300) ** 3
+        row["degenerate"] += int(np.count_nonzero(quality < DEGENERATE_RATIO))
+        for p in phys:
+            volumes[p] = volumes.get(p, 0.0) + float(np.abs(vol).sum())
+
+    expected_ids = set(range(1, n + 1))
+    if set(volumes) != expected_ids:
+        problems.append(f"block IDs {sorted(volumes)} != 1..{n} from radii.txt")
+    if row["inverted"]:
+        problems.append(f"{row['inverted']} inverted tets")
+    if row["degenerate"]:
+        problems.append(f"{row['degenerate']} degenerate tets")
+
+    errs = [
+        abs(1.0 - exact / volumes[blk])
+        for blk, exact in enumerate(exact_shell_volumes(radii), start=1)
+        if volumes.get(blk, 0.0) > 0.0
+    ]
+    if errs:
+        row["max_volume_err"] = f"{max(errs):.3e}"
+    if CHECK_CYCLES:
+        from sweep_cycles import count_cycles
+        row["sweep_cycles"] = count_cycles(coords, np.concatenate([b.nodes for b in tet_blocks]))["total"]
+
+    if problems:
+        row["status"] = "FAIL"
+    elif errs and max(errs) > MAX_VOLUME_ERR:
+        row["status"] = "WARN"
+        problems.append(f"volume error {max(errs):.2%} > {MAX_VOLUME_ERR:.0%}")
+    row["problems"] = "; ".join(problems)
+    return row
+
+
+def main() -> int:
+    # repo_root/
+    repo_root = Path(__file__).resolve().parents[2]
+    gmsh_code_dir = Path(__file__).resolve().parent
+    spherical_cases_dir = repo_root / "spherical_cases"
+
+    radii_paths = sorted(spherical_cases_dir.glob("**/mesh/radii.txt"))
+    max_workers_env = os.getenv("MAX_WORKERS")
+    max_workers = int(max_workers_env) if max_workers_env else (os.cpu_count() or 1)
+    print(f"Validating {len(radii_paths)} cases with {max_workers} workers")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        rows = list(executor.map(validate_case, radii_paths, chunksize=4))
+
+    for row in rows:
+        if row["status"] != "OK":
+            print(f"{row['status']:>4}: {row['case']} ({row['problems']})")
+
+    out_path = gmsh_code_dir / VALIDATION_NAME
+    with open(out_path, "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["case"])
+        w.writeheader()
+        w.writerows(rows)
+
+    n_fail = sum(r["status"] == "FAIL" for r in rows)
+    n_warn = sum(r["status"] == "WARN" for r in rows)
+    print(f"{len(rows) - n_fail - n_warn} OK, {n_warn} WARN, {n_fail} FAIL. Report written to: {out_path}")
+    return 1 if n_fail else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
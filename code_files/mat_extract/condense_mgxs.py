@@ -0,0 +1,150 @@
+"""
+Condense fine-group master MGXS libraries to coarser group structures.
+
+With MGXS_MASTER_GROUPS set, openmc_mgxs.py tallies every material once on a
+fine master structure and keeps {name}_master{G}g.h5 (OpenMC MGXS layout
+plus the group flux) next to the LANL70 library it condenses from it. Any
+other structure whose edges are (within EDGE_RTOL) master edges is then a
+flux-weighted collapse, with K a coarse group and g the fine groups in it:
+
+    phi_K           = sum_g phi_g
+    Sigma_x,K       = sum_g Sigma_x,g phi_g / phi_K       (total, absorption, fission, nu-fission)
+    Sigma_s,K->K',l = sum_g sum_g' Sigma_s,g->g',l phi_g / phi_K
+    chi_K           = sum_g chi_g
+
+and the multiplicity matrix is the ratio of the condensed nu-scatter and
+scatter P0 matrices. Fine groups outside the coarse range are dropped.
+
+Usage:
+    python condense_mgxs.py EDGES [master.h5 ...]
+
+EDGES is a file with one ascending edge [eV] per line (like LANL70g_eV.txt)
+or a comma-separated list. Without master files, every *_master*g.h5 under
+spherical_cases is condensed. Outputs are written next to the masters as
+{name}_{G}g.h5, or {name}_{stem}g.h5 for an edges file named {stem}g_eV.txt
+(LANL70g_eV.txt gives the usual {name}_LANL70g.h5).
+"""
+
+import sys
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+import mgxs_h5
+
+EDGE_RTOL = 1e-4   # coarse edges must match a master edge to this relative tolerance
+MERGE_RTOL = 1e-3  # master edges this close to a required edge are dropped (no sliver groups)
+
+
+def load_edges(spec) -> np.ndarray:
+    """Ascending edges [eV] from an edges file or a comma-separated list."""
+    path = Path(str(spec))
+    if path.is_file():
+        edges = np.loadtxt(path, dtype=float).ravel()
+    else:
+        edges = np.array([float(e) for e in str(spec).split(",") if e.strip()])
+    if len(edges) < 2 or np.any(np.diff(edges) <= 0.0):
+        raise ValueError(f"Group edges of {spec} must be at least two ascending values.")
+    return edges
+
+
+def merge_edges(fine, *required) -> np.ndarray:
+    """fine edges plus every required edge, so each required structure is an exact sub-structure."""
+    req = np.unique(np.concatenate([np.asarray(r, dtype=float) for r in required])) if required else np.array([])
+    keep = [e for e in np.asarray(fine, dtype=float)
+            if not len(req) or np.min(np.abs(req - e)) > MERGE_RTOL * e]
+    return np.unique(np.concatenate((keep, req)))
+
+
+def collapse_matrix(fine_edges, coarse_edges) -> np.ndarray:
+    """(Gc, Gf) 0/1 matrix mapping fine to coarse groups, both ordered fastest first."""
+    fine_edges = np.asarray(fine_edges, dtype=float)
+    idx = np.abs(fine_edges[None, :] - np.asarray(coarse_edges, dtype=float)[:, None]).argmin(axis=1)
+    mismatch = np.abs(fine_edges[idx] - coarse_edges) > EDGE_RTOL * np.asarray(coarse_edges)
+    if np.any(mismatch):
+        raise ValueError(f"Coarse edges {np.asarray(coarse_edges)[mismatch]} [eV] are not master group edges.")
+    n_fine, n_coarse = len(fine_edges) - 1, len(coarse_edges) - 1
+    p = np.zeros((n_coarse, n_fine))
+    for k in range(n_coarse):  # ascending coarse group k covers ascending fine groups idx[k]..idx[k+1]-1
+        p[n_coarse - 1 - k, n_fine - idx[k + 1]:n_fine - idx[k]] = 1.0
+    return p
+
+
+def condense(data: dict, p: np.ndarray) -> dict:
+    """Flux-weighted collapse of one xsdata dict (mgxs_h5 format with "flux") with collapse matrix p."""
+    phi = np.asarray(data["flux"], dtype=float)
+    weights = p * phi[None, :]
+    phi_c = weights.sum(axis=1)
+    inv = np.divide(1.0, phi_c, out=np.zeros_like(phi_c), where=phi_c > 0.0)
+
+    out = {"flux": phi_c}
+    for key in ("total", "absorption", "fission", "nu-fission"):
+        if key in data:
+            out[key] = weights @ data[key] * inv
+    if "chi" in data:
+        out["chi"] = p @ data["chi"]
+
+    scatter = np.einsum("Kg,ghl,Hh->KHl", weights, data["scatter_matrix"], p) * inv[:, None, None]
+    out["scatter_matrix"] = scatter
+    if "multiplicity_matrix" in data:
+        mult = data["multiplicity_matrix"]
+        plain_p0 = np.divide(data["scatter_matrix"][:, :, 0], mult, out=np.zeros_like(mult), where=mult > 0.0)
+        plain_c = weights @ plain_p0 @ p.T * inv[:, None]
+        out["multiplicity_matrix"] = np.divide(scatter[:, :, 0], plain_c, out=np.zeros_like(plain_c),
+                                               where=plain_c > 0.0)
+    return out
+
+
+def condense_file(master_h5, coarse_edges, out_h5) -> Path:
+    """Write the condensation of a master library to out_h5."""
+    fine_edges, xsdata = mgxs_h5.read_library(master_h5)
+    coarse_edges = np.asarray(coarse_edges, dtype=float)
+    p = collapse_matrix(fine_edges, coarse_edges)
+    condensed, order = {}, 0
+    for name, data in xsdata.items():
+        if "flux" not in data:
+            raise ValueError(f"{master_h5}: xsdata {name} has no flux; not a master library.")
+        order = data["order"]
+        condensed[name] = condense(data, p)
+        condensed[name].pop("flux")  # not part of the library OpenSn loads
+    mgxs_h5.write_library(out_h5, coarse_edges, condensed, order)
+    with h5py.File(out_h5, "r+") as f:
+        for name in condensed:
+            f[name].attrs["condensed_from"] = Path(master_h5).name
+    return Path(out_h5)
+
+
+def output_path(master_h5, edges_spec, n_groups: int) -> Path:
+    master_h5 = Path(master_h5)
+    base = master_h5.name.rsplit("_master", 1)[0]
+    stem = Path(str(edges_spec)).name
+    tag = stem[: -len("_eV.txt")] if stem.endswith("g_eV.txt") else f"{n_groups}g"
+    return master_h5.with_name(f"{base}_{tag}.h5")
+
+
+def main() -> int:
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return 1
+    edges_spec = sys.argv[1]
+    coarse_edges = load_edges(edges_spec)
+    masters = [Path(p) for p in sys.argv[2:]]
+    if not masters:
+        root = Path(__file__).resolve().parents[2] / "spherical_cases"
+        masters = sorted(root.glob("**/materials/material_*/*_master*g.h5"))
+    failures = 0
+    for master in masters:
+        out = output_path(master, edges_spec, len(coarse_edges) - 1)
+        try:
+            condense_file(master, coarse_edges, out)
+            print(f"{master} -> {out.name}")
+        except (ValueError, OSError, KeyError) as e:
+            failures += 1
+            print(f"ERROR: {master}: {e}")
+    print(f"Condensed {len(masters) - failures}/{len(masters)} libraries to {len(coarse_edges) - 1} groups")
+    return 2 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
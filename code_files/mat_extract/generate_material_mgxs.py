@@ -1,18 +1,36 @@
 from __future__ import annotations
 
+import fnmatch
+import json
 import os
+import queue
 import subprocess
 import sys
+import tempfile
 import time
 from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Deque, List, Optional, Tuple
-
-
-# -------------------- User-editable range (1-based, inclusive) --------------------
-START_CASE_NUM = 6
-END_CASE_NUM = 7  # None means "last found"
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+import mgxs_cache
+import mgxs_micro
+
+
+# -------------------- Options --------------------
+# Cores used by the queue, and OpenMP threads per OpenMC process; the queue runs
+# MGXS_CORES // MGXS_THREADS materials at once
+CORES = int(os.getenv("MGXS_CORES", "0")) or (os.cpu_count() or 1)
+THREADS = max(1, min(int(os.getenv("MGXS_THREADS", "4")), CORES))
+RETRY_FAILED = bool(int(os.getenv("MGXS_RETRY_FAILED", "1")))  # rerun jobs that failed in an earlier run
+PROGRESS_NAME = "mgxs_progress.json"
+# 1 = one whole-case OpenMC run per case (openmc_mgxs_insitu.py) instead of one run per material
+INSITU = bool(int(os.getenv("MGXS_INSITU", "0")))
+# 1 = long-lived `openmc_mgxs.py --serve` workers, each with one openmc.lib session,
+# instead of one process (and nuclear-data load) per material; ignored with MGXS_INSITU=1
+SESSION = bool(int(os.getenv("MGXS_SESSION", "0"))) and not INSITU
+SERVE_DONE = "JOB_DONE"  # openmc_mgxs.SERVE_DONE
 
 # Only forward these child lines to the console (everything else is hidden)
 FORWARD_PREFIXES = ("TIMING:", "ERROR:", "WARN:")
@@ -28,6 +46,17 @@ class MatCase:
     xml_path: Path
 
 
+@dataclass(frozen=True)
+class MatJob:
+    job_id: str            # "{case_name}/{case_id}/material_{id}_{name}"
+    case: MatCase
+    material_id: int
+    h5_path: Path          # library the job has to produce
+    key: Optional[str]     # mgxs_cache key (None with MGXS_CACHE=0: no deduplication)
+    family: Optional[str]  # mgxs_cache family key with MGXS_MICRO=1 (superposition candidates)
+    cost: float            # particles * batches, for longest-first scheduling
+
+
 # -------------------- Helpers --------------------
 def find_spherical_cases_root(script_dir: Path) -> Path:
     case_loc = (script_dir / ".." / ".." / "spherical_cases").resolve()
@@ -61,14 +90,84 @@ def discover_materials_xml(spherical_root: Path) -> List[MatCase]:
     return cases
 
 
-def clamp_range(start_1based: int, end_1based: Optional[int], total: int) -> Tuple[int, int]:
-    if total == 0:
-        return (1, 0)
-    start = max(1, min(start_1based, total))
-    end = total if end_1based is None else max(1, min(end_1based, total))
-    if end < start:
-        start, end = end, start
-    return start, end
+def build_insitu_jobs(cases: List[MatCase]) -> Tuple[List[MatJob], List[str], Set[str]]:
+    """One job per case with a mesh/radii.txt; cost ~ the number of materials it tallies."""
+    jobs, errors = [], []
+    for c in cases:
+        if not (c.materials_dir.parent / "mesh" / "radii.txt").is_file():
+            errors.append(f"{c.case_name}/{c.case_id}: no mesh/radii.txt for the in-situ geometry")
+            continue
+        n_mats = c.xml_path.read_text(encoding="utf-8").count("<material ")
+        jobs.append(
+            MatJob(
+                job_id=f"{c.case_name}/{c.case_id}/insitu",
+                case=c,
+                material_id=0,
+                h5_path=c.materials_dir / "insitu" / "insitu_summary.json",
+                key=None,
+                family=None,
+                cost=float(n_mats),
+            )
+        )
+    return jobs, errors, set()
+
+
+def build_jobs(cases: List[MatCase]) -> Tuple[List[MatJob], List[str], Set[str]]:
+    """
+    Flatten cases into one job per material; returns (jobs, per-case load errors,
+    nuclides of the session workers (empty without MGXS_SESSION=1)).
+    """
+    if INSITU:
+        return build_insitu_jobs(cases)
+    # Imported here so the helpers above work without OpenMC
+    import openmc_mgxs
+
+    openmc_mgxs.configure_cross_sections()
+    jobs: List[MatJob] = []
+    errors: List[str] = []
+    nuclides: Set[str] = set()
+    ng = len(openmc_mgxs.groups.group_edges) - 1
+    for c in cases:
+        try:
+            materials = openmc_mgxs.load_case_materials(c.xml_path, write_fixed=True)
+        except Exception as e:
+            errors.append(f"{c.case_name}/{c.case_id}: {type(e).__name__}: {e}")
+            continue
+        if SESSION:
+            import openmc_session
+
+            nuclides |= openmc_session.union_nuclides(materials)
+        for mat in materials:
+            _, safe_name = openmc_mgxs.material_names(mat)
+            settings = openmc_mgxs.run_settings_for(mat)
+            key = openmc_mgxs.material_cache_key(mat)[0] if mgxs_cache.ENABLED else None
+            family = (mgxs_cache.family_key(mat, openmc_mgxs.groups.group_edges, openmc_mgxs.LEGENDRE_ORDER)[0]
+                      if mgxs_micro.ENABLED else None)
+            folder = f"material_{mat.id}_{safe_name}"
+            jobs.append(
+                MatJob(
+                    job_id=f"{c.case_name}/{c.case_id}/{folder}",
+                    case=c,
+                    material_id=mat.id,
+                    h5_path=c.materials_dir / folder / f"{safe_name}_LANL{ng}g.h5",
+                    key=key,
+                    family=family,
+                    cost=float(settings["particles"] * settings["batches"]),
+                )
+            )
+    return jobs, errors, nuclides
+
+
+def load_progress(path: Path) -> Dict[str, dict]:
+    if not path.is_file():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8")).get("jobs", {})
+
+
+def save_progress(path: Path, progress: Dict[str, dict]):
+    tmp = path.with_name(path.name + ".part")
+    tmp.write_text(json.dumps({"jobs": progress}, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
 
 
 def format_seconds(seconds: float) -> str:
@@ -85,6 +184,9 @@ def run_code_in_dir_filtered(
     code_path: Path,
     workdir: Path,
     *,
+    args: Tuple[str, ...] = (),
+    threads: Optional[int] = None,
+    prefix: str = "",
     forward_prefixes: Tuple[str, ...] = FORWARD_PREFIXES,
     tail_lines: int = 200,
 ) -> Tuple[int, str]:
@@ -92,13 +194,16 @@ def run_code_in_dir_filtered(
     Run the child script in workdir.
 
     - Does NOT show OpenMC (or other) output.
-    - Only forwards child lines that start with forward_prefixes.
+    - Only forwards child lines that start with forward_prefixes (after `prefix`).
+    - threads sets OMP_NUM_THREADS for the child.
     - Returns (returncode, combined_output_tail) for failure logging.
     """
     env = os.environ.copy()
     env["PYTHONUNBUFFERED"] = "1"
+    if threads is not None:
+        env["OMP_NUM_THREADS"] = str(threads)
 
-    cmd = [sys.executable, "-u", str(code_path)]
+    cmd = [sys.executable, "-u", str(code_path), *args]
     proc = subprocess.Popen(
         cmd,
         cwd=str(workdir),
@@ -116,75 +221,250 @@ def run_code_in_dir_filtered(
         tail.append(line.rstrip("\n"))
         s = line.lstrip()
         if s.startswith(forward_prefixes):
-            sys.stdout.write(line)
+            sys.stdout.write(prefix + line)
             sys.stdout.flush()
 
     proc.wait()
     return proc.returncode, "\n".join(tail)
 
 
+class SessionWorker:
+    """
+    One `openmc_mgxs.py --serve` process, started on first use and restarted if it dies.
+    Jobs go to its stdin as "materials_dir<TAB>material_id"; it answers "JOB_DONE rc=N".
+    """
+
+    def __init__(self, code_path: Path, workdir: Path, args: Tuple[str, ...], threads: int):
+        self.cmd = [sys.executable, "-u", str(code_path), "--serve", *args]
+        self.workdir = workdir
+        self.threads = threads
+        self.proc: Optional[subprocess.Popen] = None
+
+    def start(self):
+        env = os.environ.copy()
+        env["PYTHONUNBUFFERED"] = "1"
+        env["OMP_NUM_THREADS"] = str(self.threads)
+        self.proc = subprocess.Popen(
+            self.cmd,
+            cwd=str(self.workdir),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            env=env,
+        )
+
+    def run(
+        self,
+        job: MatJob,
+        *,
+        prefix: str = "",
+        forward_prefixes: Tuple[str, ...] = FORWARD_PREFIXES,
+        tail_lines: int = 200,
+    ) -> Tuple[int, str]:
+        """Run one job; returns (returncode, output tail) like run_code_in_dir_filtered."""
+        if self.proc is None or self.proc.poll() is not None:
+            self.start()
+        assert self.proc.stdin is not None and self.proc.stdout is not None
+        self.proc.stdin.write(f"{job.case.materials_dir}\t{job.material_id}\n")
+        self.proc.stdin.flush()
+
+        tail: Deque[str] = deque(maxlen=tail_lines)
+        for line in self.proc.stdout:
+            if line.startswith(SERVE_DONE):
+                return int(line.split("rc=", 1)[1]), "\n".join(tail)
+            tail.append(line.rstrip("\n"))
+            if line.lstrip().startswith(forward_prefixes):
+                sys.stdout.write(prefix + line)
+                sys.stdout.flush()
+
+        # The worker died during the job (crash in OpenMC); the next job starts a new one
+        self.proc.wait()
+        rc = self.proc.returncode or 999
+        self.proc = None
+        return rc, "\n".join(tail)
+
+    def close(self):
+        if self.proc is not None and self.proc.poll() is None:
+            assert self.proc.stdin is not None
+            self.proc.stdin.close()
+            self.proc.wait()
+        self.proc = None
+
+
 # -------------------- Main --------------------
 def main() -> int:
+    """
+    python3 generate_material_mgxs.py [pattern ...]
+
+    Every material of every case (or of the cases whose "name/case-N" matches
+    one of the fnmatch patterns) is one job. Jobs with the same composition
+    (mgxs_cache key) run OpenMC once; the others wait and copy from the cache.
+    Finished jobs are recorded in mgxs_progress.json, so the queue can be
+    stopped (Ctrl-C) and restarted at any time.
+    """
     overall_t0 = time.perf_counter()
 
     script_dir = Path(__file__).resolve().parent
-    code_path = script_dir / "openmc_mgxs.py"
+    code_path = script_dir / ("openmc_mgxs_insitu.py" if INSITU else "openmc_mgxs.py")
     if not code_path.is_file():
-        raise FileNotFoundError(f"Expected openmc_mgxs.py next to this script: {code_path}")
+        raise FileNotFoundError(f"Expected {code_path.name} next to this script: {code_path}")
 
     spherical_root = find_spherical_cases_root(script_dir)
     cases = discover_materials_xml(spherical_root)
-    total = len(cases)
-    start, end = clamp_range(START_CASE_NUM, END_CASE_NUM, total)
-
-    print(f"Found {total} materials.xml files under: {spherical_root}", flush=True)
-    if total == 0:
+    patterns = sys.argv[1:]
+    if patterns:
+        cases = [c for c in cases if any(fnmatch.fnmatch(f"{c.case_name}/{c.case_id}", p) for p in patterns)]
+    print(f"Found {len(cases)} materials.xml files under: {spherical_root}", flush=True)
+    if not cases:
         return 0
 
-    print(f"Running cases in range: {start} through {end}", flush=True)
-
     failed_path = script_dir / "failed.txt"
     failed_path.write_text("", encoding="utf-8")
-
-    failures = 0
-    ran = 0
-
-    for c in cases:
-        if not (start <= c.num <= end):
-            continue
-
-        ran += 1
-        display_name = f"{c.case_name}/{c.case_id}"
-        print("\n" + "=" * 88, flush=True)
-        print(f"[{c.num}/{total}] Running {display_name} in {c.materials_dir}", flush=True)
-
-        case_t0 = time.perf_counter()
+    progress_path = script_dir / PROGRESS_NAME
+    progress = load_progress(progress_path)
+
+    jobs, load_errors, session_nuclides = build_jobs(cases)
+    for err in load_errors:
+        print(f"ERROR: could not load materials of {err}", flush=True)
+        with failed_path.open("a", encoding="utf-8") as ff:
+            ff.write(f"CASE {err}\n\n")
+
+    def finished(job: MatJob) -> bool:
+        state = progress.get(job.job_id, {}).get("status")
+        if state == "failed" and not RETRY_FAILED:
+            return True
+        return state == "done" and job.h5_path.is_file()
+
+    pending = [j for j in jobs if not finished(j)]
+    n_unique = len({j.key or j.job_id for j in pending})
+    workers = max(1, CORES // THREADS)
+    print(f"{len(jobs)} {'cases' if INSITU else 'materials'}, {len(jobs) - len(pending)} already done, {len(pending)} to do "
+          f"({n_unique} unique compositions); {workers} OpenMC process(es) x {THREADS} thread(s)"
+          + (f", openmc.lib sessions with {len(session_nuclides)} nuclides" if SESSION else ""), flush=True)
+
+    session_pool: "queue.Queue[SessionWorker]" = queue.Queue()
+    nuclides_path = None
+    if SESSION:
+        fd, nuclides_path = tempfile.mkstemp(prefix="mgxs_session_", suffix=".txt")
+        with os.fdopen(fd, "w", encoding="utf-8") as fn:
+            fn.write("\n".join(sorted(session_nuclides)) + "\n")
+        for _ in range(workers):
+            session_pool.put(SessionWorker(code_path, script_dir, ("--nuclides", nuclides_path,
+                                                                   "--threads", str(THREADS)), THREADS))
+
+    # One leader per composition (per composition family with MGXS_MICRO=1) runs OpenMC;
+    # its followers restore from the cache or superpose its microscopic MGXS afterwards.
+    # Compositions already in the cache need no leader.
+    def group_of(job: MatJob) -> str:
+        return job.family or job.key or job.job_id
+
+    ready: List[MatJob] = []
+    by_key: Dict[str, List[MatJob]] = {}
+    for j in pending:
+        if j.key is not None and mgxs_cache.lookup(j.key) is not None:
+            ready.append(j)
+        else:
+            by_key.setdefault(group_of(j), []).append(j)
+    followers: Dict[str, List[MatJob]] = {}  # leader job_id -> followers
+    for group in by_key.values():
+        ready.append(group[0])
+        followers[group[0].job_id] = group[1:]
+    ready.sort(key=lambda j: j.cost, reverse=True)  # longest first packs the pool best
+
+    def run_job(job: MatJob) -> Tuple[int, str, float]:
+        t0 = time.perf_counter()
+        if SESSION:
+            worker = session_pool.get()
+            try:
+                rc, tail = worker.run(job, prefix=f"[{job.job_id}] ")
+            except Exception as e:
+                worker.close()
+                rc, tail = 999, f"Helper exception while talking to the session worker:\n{type(e).__name__}: {e}"
+            finally:
+                session_pool.put(worker)
+            return rc, tail, time.perf_counter() - t0
         try:
-            returncode, tail = run_code_in_dir_filtered(code_path, c.materials_dir)
+            args = ("--threads", str(THREADS))
+            if not INSITU:
+                args = ("--material", str(job.material_id)) + args
+            rc, tail = run_code_in_dir_filtered(
+                code_path, job.case.materials_dir,
+                args=args,
+                threads=THREADS, prefix=f"[{job.job_id}] ",
+            )
         except Exception as e:
-            returncode = 999
-            tail = f"Helper exception while launching child:\n{type(e).__name__}: {e}"
-        case_dt = time.perf_counter() - case_t0
-
-        print(f"[{c.num}/{total}] Case time: {format_seconds(case_dt)} (rc={returncode})", flush=True)
-
-        if returncode != 0:
-            failures += 1
+            rc, tail = 999, f"Helper exception while launching child:\n{type(e).__name__}: {e}"
+        return rc, tail, time.perf_counter() - t0
+
+    def record(job: MatJob, rc: int, tail: str, dt: float):
+        progress[job.job_id] = {
+            "status": "done" if rc == 0 else "failed",
+            "key": job.key or "",
+            "returncode": rc,
+            "seconds": round(dt, 3),
+            "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        save_progress(progress_path, progress)
+        if rc != 0:
             with failed_path.open("a", encoding="utf-8") as ff:
-                ff.write(f"CASE #{c.num}: {display_name}\n")
-                ff.write(f"  xml_path: {c.xml_path}\n")
-                ff.write(f"  workdir:  {c.materials_dir}\n")
-                ff.write(f"  returncode: {returncode}\n")
-                ff.write(f"  case_time_seconds: {case_dt:.6f}\n")
+                ff.write(f"JOB: {job.job_id}\n")
+                ff.write(f"  xml_path: {job.case.xml_path}\n")
+                ff.write(f"  workdir:  {job.case.materials_dir}\n")
+                ff.write(f"  returncode: {rc}\n")
+                ff.write(f"  job_time_seconds: {dt:.6f}\n")
                 ff.write("  combined_output_tail:\n")
                 ff.write(tail.strip() + "\n\n")
 
+    failures = 0
+    done = 0
+    executor = ThreadPoolExecutor(max_workers=workers)
+    running = {}
+    try:
+        for job in ready:
+            running[executor.submit(run_job, job)] = job
+        while running:
+            completed, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in completed:
+                job = running.pop(fut)
+                rc, tail, dt = fut.result()
+                record(job, rc, tail, dt)
+                done += 1
+                print(f"[{done}/{len(pending)}] {job.job_id}: {format_seconds(dt)} (rc={rc})", flush=True)
+                waiting = followers.pop(job.job_id, [])
+                if rc != 0:
+                    failures += 1
+                    if job.family is None:
+                        if waiting:
+                            print(f"  {len(waiting)} job(s) with the same composition skipped", flush=True)
+                        for f in waiting:
+                            # Same composition as a failed run: retried on the next start
+                            record(f, 998, f"Skipped: same composition as failed {job.job_id}", 0.0)
+                            failures += 1
+                            done += 1
+                        continue
+                # Family followers superpose or run OpenMC themselves, even after a failed leader
+                for f in waiting:
+                    running[executor.submit(run_job, f)] = f
+    except KeyboardInterrupt:
+        # Children share the terminal's process group and got the SIGINT as well
+        executor.shutdown(wait=False, cancel_futures=True)
+        print(f"\nInterrupted after {done}/{len(pending)} job(s); progress saved to {progress_path}", flush=True)
+        return 130
+    finally:
+        while not session_pool.empty():
+            session_pool.get().close()
+        if nuclides_path is not None:
+            os.unlink(nuclides_path)
+    executor.shutdown()
+
     overall_dt = time.perf_counter() - overall_t0
     print("\n" + "=" * 88, flush=True)
-    print(f"Helper finished. Ran {ran} case(s) in {format_seconds(overall_dt)} total.", flush=True)
+    print(f"Helper finished. Ran {done} job(s) in {format_seconds(overall_dt)} total.", flush=True)
 
-    if failures:
-        print(f"Done with {failures} failures. See: {failed_path}", flush=True)
+    if failures or load_errors:
+        print(f"Done with {failures + len(load_errors)} failures. See: {failed_path}", flush=True)
         return 2
 
     print("Done with no failures.", flush=True)
@@ -0,0 +1,247 @@
+"""
+Global content-addressed cache of MGXS libraries.
+
+The same compositions (air, water, steels, beryllium, ...) recur across many
+benchmarks. openmc_mgxs.py looks every material up here before running
+OpenMC, keyed by the sha256 of
+
+    sorted nuclides with atom densities [atom/b-cm] rounded to MGXS_CACHE_DIGITS
+    significant digits, S(a,b) tables, temperature, group edges, Legendre
+    order, MGXS types, particle settings and the nuclear-data library id
+
+On a hit the cached .h5 is copied into the case's material_{id}_{name}/
+folder and its xsdata group is renamed to the material's name; on a miss
+the fresh result is stored after the run.
+
+Layout: MGXS_CACHE_DIR (default: mgxs_cache/ next to this file)/<key[:2]>/<key>/
+with mgxs.h5, meta.json (key payload, xsdata name, source folder) and, for
+runs on a fine master structure, master.h5 (see condense_mgxs.py).
+
+Environment:
+    MGXS_CACHE         0 = neither read nor write the cache (default: 1)
+    MGXS_CACHE_DIR     cache root
+    MGXS_CACHE_DIGITS  significant digits of the atom densities (default: 5)
+    MGXS_LIBRARY_ID    nuclear-data library id (default: the cross_sections.xml path)
+
+Usage:
+    python mgxs_cache.py stats
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ENABLED = bool(int(os.getenv("MGXS_CACHE", "1")))
+CACHE_DIR = Path(os.getenv("MGXS_CACHE_DIR", str(Path(__file__).resolve().parent / "mgxs_cache")))
+DIGITS = int(os.getenv("MGXS_CACHE_DIGITS", "5"))
+H5_NAME = "mgxs.h5"
+MASTER_NAME = "master.h5"
+META_NAME = "meta.json"
+
+
+def _round_sig(value: float, digits: int = DIGITS) -> float:
+    return float(f"{value:.{digits}g}")
+
+
+def library_id() -> str:
+    """MGXS_LIBRARY_ID, else the cross_sections.xml OpenMC will use."""
+    lib = os.getenv("MGXS_LIBRARY_ID")
+    if lib:
+        return lib
+    import openmc  # only needed when the id comes from the OpenMC configuration
+
+    path = openmc.config.get("cross_sections") or os.getenv("OPENMC_CROSS_SECTIONS", "")
+    return str(Path(path).resolve()) if path else ""
+
+
+def atom_densities(mat) -> dict:
+    """{nuclide: atom density [atom/b-cm]} of an openmc.Material, zero entries dropped."""
+    out = {}
+    for name, value in mat.get_nuclide_atom_densities().items():
+        # Older OpenMC returns {name: (name, density)}
+        density = float(value[1] if isinstance(value, tuple) else value)
+        if density > 0.0:
+            out[name] = density
+    return out
+
+
+def composition(mat) -> dict:
+    """Normalized composition of an openmc.Material: independent of units, order, names and ids."""
+    return {
+        "nuclides": sorted([name, _round_sig(density)] for name, density in atom_densities(mat).items()),
+        "sab": sorted(str(s[0] if isinstance(s, tuple) else s) for s in getattr(mat, "_sab", [])),
+        "temperature": None if mat.temperature is None else _round_sig(float(mat.temperature)),
+    }
+
+
+def cache_key(mat, group_edges, legendre_order: int, mgxs_types, settings: dict, library=None) -> tuple:
+    """(hex key, payload) of a material run with the given MGXS options and particle settings."""
+    payload = {
+        "composition": composition(mat),
+        "group_edges": [_round_sig(float(e), 10) for e in group_edges],
+        "legendre_order": int(legendre_order),
+        "mgxs_types": list(mgxs_types),
+        "settings": settings,
+        "library": library_id() if library is None else library,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest(), payload
+
+
+def family_key(mat, group_edges, legendre_order: int, library=None) -> tuple:
+    """
+    (hex key, payload) of a composition family: the same nuclides, S(a,b) and
+    temperature at any densities (see mgxs_micro.py).
+    """
+    comp = composition(mat)
+    payload = {
+        "nuclides": [name for name, _ in comp["nuclides"]],
+        "sab": comp["sab"],
+        "temperature": comp["temperature"],
+        "group_edges": [_round_sig(float(e), 10) for e in group_edges],
+        "legendre_order": int(legendre_order),
+        "library": library_id() if library is None else library,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode()).hexdigest(), payload
+
+
+def entry_dir(key: str) -> Path:
+    return CACHE_DIR / key[:2] / key
+
+
+def lookup(key: str):
+    """Cache entry folder of key, None on a miss."""
+    path = entry_dir(key)
+    return path if (path / H5_NAME).is_file() and (path / META_NAME).is_file() else None
+
+
+def _rename_xsdata(h5_path: Path, old: str, new: str):
+    if old == new:
+        return
+    import h5py
+
+    with h5py.File(h5_path, "r+") as f:
+        f.move(old, new)
+
+
+def _copy_renamed(src: Path, dest_h5: Path, old: str, new: str):
+    dest_h5 = Path(dest_h5)
+    dest_h5.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest_h5.with_name(dest_h5.name + ".part")
+    shutil.copyfile(src, tmp)
+    _rename_xsdata(tmp, old, new)
+    os.replace(tmp, dest_h5)
+
+
+def restore(key: str, dest_h5: Path, xsdata_name: str, master_dest=None) -> bool:
+    """
+    Copy a cached library to dest_h5 under xsdata_name; False on a miss.
+    master_dest: also restore the master library (a miss if the entry has none).
+    """
+    path = lookup(key)
+    if path is None or (master_dest is not None and not (path / MASTER_NAME).is_file()):
+        return False
+    meta = json.loads((path / META_NAME).read_text())
+    _copy_renamed(path / H5_NAME, dest_h5, meta["xsdata_name"], xsdata_name)
+    if master_dest is not None:
+        _copy_renamed(path / MASTER_NAME, master_dest, meta["xsdata_name"], xsdata_name)
+    return True
+
+
+def store(key: str, payload: dict, h5_path: Path, xsdata_name: str, source=None, master_h5=None):
+    """Add a freshly computed library; concurrent writers of the same key keep the first entry."""
+    final = entry_dir(key)
+    if lookup(key) is not None:
+        return
+    final.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{key[:8]}_", dir=final.parent))
+    try:
+        shutil.copyfile(h5_path, tmp / H5_NAME)
+        if master_h5 is not None:
+            shutil.copyfile(master_h5, tmp / MASTER_NAME)
+        meta = {
+            "key": key,
+            "xsdata_name": xsdata_name,
+            "source": str(source) if source else "",
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "payload": payload,
+        }
+        (tmp / META_NAME).write_text(json.dumps(meta, indent=1) + "\n")
+        try:
+            os.rename(tmp, final)
+        except OSError:
+            pass  # stored by another process meanwhile
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+ACTINIDES = ("Th", "Pa", "U", "Np", "Pu", "Am", "Cm", "Bk", "Cf")
+
+
+def _fractions(nuclides, actinides_only: bool = False) -> dict:
+    """Normalized atom fractions of [[nuclide, density], ...] (of the actinides only if asked)."""
+    values = {name: float(density) for name, density in nuclides
+              if not actinides_only or re.match(r"[A-Za-z]+", name).group() in ACTINIDES}
+    total = sum(values.values())
+    return {name: v / total for name, v in values.items()} if total > 0.0 else {}
+
+
+def _distance(p: dict, q: dict) -> float:
+    return sum(abs(p.get(n, 0.0) - q.get(n, 0.0)) for n in set(p) | set(q))
+
+
+def nearest_fission_spectrum(mat):
+    """
+    (ascending group edges, chi with group 0 fastest, cache key) of the cached fissionable
+    library whose actinide mix (then whole composition) is closest to mat's; None if none.
+    """
+    import mgxs_h5
+
+    comp = composition(mat)["nuclides"]
+    target_hm, target_all = _fractions(comp, actinides_only=True), _fractions(comp)
+    if not target_hm:
+        return None
+    ranked = []
+    for meta_path in CACHE_DIR.glob(f"??/*/{META_NAME}"):
+        try:
+            meta = json.loads(meta_path.read_text())
+            nuclides = meta["payload"]["composition"]["nuclides"]
+        except (OSError, ValueError, KeyError):
+            continue
+        hm = _fractions(nuclides, actinides_only=True)
+        if hm:
+            ranked.append((_distance(target_hm, hm), _distance(target_all, _fractions(nuclides)), meta_path))
+    for _, _, meta_path in sorted(ranked):
+        try:
+            edges, xsdata = mgxs_h5.read_library(meta_path.with_name(H5_NAME))
+        except (OSError, KeyError):
+            continue
+        chi = next(iter(xsdata.values())).get("chi")
+        if chi is not None and chi.sum() > 0.0:
+            return edges, chi, meta_path.parent.name
+    return None
+
+
+def main() -> int:
+    if sys.argv[1:2] == ["stats"]:
+        entries = sorted(CACHE_DIR.glob(f"??/*/{META_NAME}"))
+        size = sum(p.with_name(H5_NAME).stat().st_size for p in entries if p.with_name(H5_NAME).is_file())
+        print(f"{len(entries)} cached libraries, {size / 2**20:.1f} MiB in {CACHE_DIR}")
+        micro = sorted((CACHE_DIR / "micro").glob("??/*/*.h5"))
+        if micro:
+            families = {p.parent.name for p in micro}
+            print(f"{len(micro)} microscopic libraries in {len(families)} composition families")
+        return 0
+    print(__doc__)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Read and write OpenMC multigroup (MGXS) HDF5 libraries with h5py only.
+
+This is the layout openmc.MGXSLibrary.export_to_hdf5 writes for isotropic,
+Legendre-scatter xsdata and the one OpenSn's MultiGroupXS.LoadFromOpenMC
+reads, so libraries can be produced without OpenMC (superposition,
+condensation, statepoint post-processing):
+
+    attrs: filetype=b"mgxs", version=[1, 0], energy_groups, delayed_groups=0,
+           "group structure" (ascending edges [eV])
+    /<xsdata>          attrs: fissionable, order, representation, scatter_format, scatter_shape
+    /<xsdata>/kTs/294K
+    /<xsdata>/294K/{total, absorption[, fission, nu-fission, chi]}
+    /<xsdata>/294K/scatter_data/{g_min, g_max, scatter_matrix, multiplicity_matrix}
+    /<xsdata>/flux     (master libraries only: the group flux the data were weighted with)
+
+Group index 0 is the fastest group in every array. Scatter matrices are dense
+(G, G', order + 1) here and stored sparsely (g_min..g_max of the P0 row,
+1-based) in the file.
+"""
+
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+K_BOLTZMANN = 8.617333262e-5  # eV/K
+TEMPERATURE = 294.0  # [K], the temperature OpenSn loads
+
+
+def _temp_label(temperature: float) -> str:
+    return f"{int(round(temperature))}K"
+
+
+def write_library(path, group_edges, xsdata: dict, order: int, temperature: float = TEMPERATURE):
+    """
+    Write xsdata {name: {"total", "absorption", "scatter_matrix" (G, G, order+1),
+    optional "multiplicity_matrix" (G, G), "fission", "nu-fission", "chi"}} to path.
+    Fission data is written when nu-fission has a positive entry; an optional
+    "flux" (G,) goes to /<xsdata>/flux.
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".part")
+    label = _temp_label(temperature)
+    with h5py.File(tmp, "w") as f:
+        f.attrs["filetype"] = np.bytes_(b"mgxs")
+        f.attrs["version"] = np.array([1, 0])
+        f.attrs["energy_groups"] = len(group_edges) - 1
+        f.attrs["delayed_groups"] = 0
+        f.attrs["group structure"] = np.asarray(group_edges, dtype=float)
+        for name, data in xsdata.items():
+            nu_fission = np.asarray(data.get("nu-fission", 0.0))
+            fissionable = bool(np.any(nu_fission > 0.0))
+            grp = f.create_group(name)
+            grp.attrs["fissionable"] = fissionable
+            grp.attrs["representation"] = np.bytes_(b"isotropic")
+            grp.attrs["scatter_shape"] = np.bytes_(b"[G][G'][Order]")
+            grp.attrs["scatter_format"] = np.bytes_(b"legendre")
+            grp.attrs["order"] = int(order)
+            grp.create_group("kTs").create_dataset(label, data=temperature * K_BOLTZMANN)
+            if "flux" in data:
+                grp.create_dataset("flux", data=np.asarray(data["flux"], dtype=float))
+
+            xs = grp.create_group(label)
+            xs.create_dataset("total", data=np.asarray(data["total"], dtype=float))
+            xs.create_dataset("absorption", data=np.asarray(data["absorption"], dtype=float))
+            if fissionable:
+                for key in ("fission", "nu-fission", "chi"):
+                    if key in data:
+                        xs.create_dataset(key, data=np.asarray(data[key], dtype=float))
+
+            scatter = np.asarray(data["scatter_matrix"], dtype=float)[:, :, : order + 1]
+            n_groups = scatter.shape[0]
+            g_min = np.zeros(n_groups, dtype=np.int64)
+            g_max = np.zeros(n_groups, dtype=np.int64)
+            flat_scatter, flat_mult = [], []
+            mult = data.get("multiplicity_matrix")
+            for g in range(n_groups):
+                nz = np.nonzero(scatter[g, :, 0])[0]
+                if len(nz):
+                    g_min[g], g_max[g] = nz[0], nz[-1]
+                lo, hi = g_min[g], g_max[g] + 1
+                flat_scatter.append(scatter[g, lo:hi, :].ravel())
+                if mult is not None:
+                    flat_mult.append(np.asarray(mult, dtype=float)[g, lo:hi])
+            sd = xs.create_group("scatter_data")
+            sd.create_dataset("scatter_matrix", data=np.concatenate(flat_scatter))
+            if mult is not None:
+                sd.create_dataset("multiplicity_matrix", data=np.concatenate(flat_mult))
+            sd.create_dataset("g_min", data=g_min + 1)
+            sd.create_dataset("g_max", data=g_max + 1)
+    tmp.replace(path)
+
+
+def read_library(path) -> tuple:
+    """(ascending group edges, {name: xsdata dict as taken by write_library, plus "order"})."""
+    out = {}
+    with h5py.File(path, "r") as f:
+        edges = np.asarray(f.attrs["group structure"], dtype=float)
+        for name, grp in f.items():
+            order = int(grp.attrs["order"])
+            label = next(k for k in grp.keys() if k.endswith("K"))
+            xs = grp[label]
+            data = {key: xs[key][()] for key in ("total", "absorption", "fission", "nu-fission", "chi")
+                    if key in xs}
+            sd = xs["scatter_data"]
+            n_groups = len(data["total"])
+            g_min, g_max = sd["g_min"][()] - 1, sd["g_max"][()] - 1
+            flat = sd["scatter_matrix"][()]
+            flat_mult = sd["multiplicity_matrix"][()] if "multiplicity_matrix" in sd else None
+            scatter = np.zeros((n_groups, n_groups, order + 1))
+            mult = np.zeros((n_groups, n_groups)) if flat_mult is not None else None
+            pos = 0
+            for g in range(n_groups):
+                width = g_max[g] - g_min[g] + 1
+                scatter[g, g_min[g]:g_max[g] + 1, :] = flat[pos * (order + 1):(pos + width) * (order + 1)].reshape(
+                    width, order + 1)
+                if mult is not None:
+                    mult[g, g_min[g]:g_max[g] + 1] = flat_mult[pos:pos + width]
+                pos += width
+            data["scatter_matrix"] = scatter
+            if mult is not None:
+                data["multiplicity_matrix"] = mult
+            data["order"] = order
+            if "flux" in grp:
+                data["flux"] = grp["flux"][()]
+            out[name] = data
+    return edges, out
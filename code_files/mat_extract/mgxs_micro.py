@@ -0,0 +1,184 @@
+"""
+Microscopic (by-nuclide) MGXS of composition families, and macroscopic
+libraries for new density variants by number-density superposition.
+
+Shell-to-shell and case-to-case variants (enrichment shells, solution
+concentration series, ...) share their nuclides and differ in densities.
+With MGXS_MICRO=1 every OpenMC run of openmc_mgxs.py also tallies
+microscopic MGXS per nuclide and stores them here, under the material's
+family key (mgxs_cache.family_key: nuclides, S(a,b), temperature, groups,
+Legendre order, library). A later material of the same family gets
+
+    Sigma_x = sum_i N_i sigma_x,i      (total, absorption, fission, nu-fission, scatter)
+    chi     = sum_i w_i chi_i,  w_i = N_i sum_g nu-sigma_f,i,g phi_g
+
+without transport, provided its spectrum is close to the representative's.
+The spectra are compared with an infinite-medium (0D) multigroup balance of
+both synthesized libraries,
+
+    (Sigma_t - S0^T) phi = s      (s = chi if fissionable, else a Watt source)
+
+and the total-variation distance 0.5 * sum_g |p_g - q_g| of the normalized
+spectra. The nearest representative is used if the distance is at most
+MGXS_MICRO_SPECTRUM_TOL, otherwise the material gets a real run (which then
+becomes another representative of the family).
+
+Layout: MGXS_CACHE_DIR/micro/<family[:2]>/<family>/<cache key>.h5 with the
+group structure, order, flux, nuclides, densities [atom/b-cm] and
+micro/<nuclide>/<mgxs type> [b] (group 0 = fastest).
+
+Environment:
+    MGXS_MICRO               1 = tally, store and use microscopic MGXS (default: 0)
+    MGXS_MICRO_SPECTRUM_TOL  maximum spectrum distance of a synthesis (default: 0.02)
+"""
+
+import os
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+import mgxs_cache
+import mgxs_h5
+
+ENABLED = bool(int(os.getenv("MGXS_MICRO", "0")))
+SPECTRUM_TOL = float(os.getenv("MGXS_MICRO_SPECTRUM_TOL", "0.02"))
+MICRO_DIR = mgxs_cache.CACHE_DIR / "micro"
+
+# OpenMC's default source energy distribution (Watt fission spectrum)
+WATT_A = 0.988e6   # [eV]
+WATT_B = 2.249e-6  # [1/eV]
+
+
+def family_dir(family: str) -> Path:
+    return MICRO_DIR / family[:2] / family
+
+
+def candidates(family: str) -> list:
+    return sorted(family_dir(family).glob("*.h5"))
+
+
+def store(family: str, key: str, densities: dict, flux, micro: dict, group_edges, order: int, source=None):
+    """Store the microscopic MGXS {nuclide: {mgxs type: array}} of one run as a family representative."""
+    final = family_dir(family) / f"{key}.h5"
+    if final.is_file():
+        return
+    final.parent.mkdir(parents=True, exist_ok=True)
+    tmp = final.with_name(f".{key}.{os.getpid()}.part")
+    nuclides = sorted(densities)
+    with h5py.File(tmp, "w") as f:
+        f.attrs["group structure"] = np.asarray(group_edges, dtype=float)
+        f.attrs["order"] = int(order)
+        f.attrs["key"] = key
+        f.attrs["source"] = str(source) if source else ""
+        f.create_dataset("flux", data=np.asarray(flux, dtype=float))
+        f.create_dataset("nuclides", data=np.array(nuclides, dtype="S"))
+        f.create_dataset("densities", data=np.array([densities[n] for n in nuclides]))
+        for nuc in nuclides:
+            g = f.create_group(f"micro/{nuc}")
+            for xs_type, values in micro[nuc].items():
+                g.create_dataset(xs_type, data=np.asarray(values, dtype=float), compression="gzip")
+    os.replace(tmp, final)
+
+
+def load(path) -> dict:
+    with h5py.File(path, "r") as f:
+        nuclides = [n.decode() for n in f["nuclides"][()]]
+        return {
+            "key": str(f.attrs["key"]),
+            "group_edges": f.attrs["group structure"][()],
+            "order": int(f.attrs["order"]),
+            "flux": f["flux"][()],
+            "densities": dict(zip(nuclides, f["densities"][()])),
+            "micro": {nuc: {t: d[()] for t, d in f[f"micro/{nuc}"].items()} for nuc in nuclides},
+        }
+
+
+def superpose(rep: dict, densities: dict) -> dict:
+    """Macroscopic xsdata (mgxs_h5.write_library format) of a representative at other densities."""
+    if set(densities) != set(rep["micro"]):
+        raise KeyError("densities and representative have different nuclides")
+    n_groups = len(rep["flux"])
+    out = {key: np.zeros(n_groups) for key in ("total", "absorption", "fission", "nu-fission")}
+    scatter = np.zeros((n_groups, n_groups, rep["order"] + 1))
+    scatter_p0 = np.zeros((n_groups, n_groups))
+    chi = np.zeros(n_groups)
+    for nuc, n_atoms in densities.items():
+        micro = rep["micro"][nuc]
+        for key in out:
+            out[key] += n_atoms * micro[key]
+        scatter += n_atoms * micro["consistent nu-scatter matrix"]
+        scatter_p0 += n_atoms * micro["scatter matrix"][:, :, 0]
+        weight = n_atoms * float(np.dot(micro["nu-fission"], rep["flux"]))
+        chi += weight * micro["chi"]
+    out["scatter_matrix"] = scatter
+    out["multiplicity_matrix"] = np.divide(scatter[:, :, 0], scatter_p0, out=np.zeros_like(scatter_p0),
+                                           where=scatter_p0 > 0.0)
+    out["chi"] = chi / chi.sum() if chi.sum() > 0.0 else chi
+    return out
+
+
+def watt_source(group_edges) -> np.ndarray:
+    """Group probabilities of the Watt spectrum (group 0 = fastest)."""
+    edges = np.asarray(group_edges, dtype=float)
+    probs = np.empty(len(edges) - 1)
+    for g in range(len(edges) - 1):
+        e = np.geomspace(edges[g], edges[g + 1], 64)
+        pdf = np.exp(-e / WATT_A) * np.sinh(np.sqrt(WATT_B * e))
+        probs[g] = np.sum(0.5 * (pdf[1:] + pdf[:-1]) * np.diff(e))
+    return (probs / probs.sum())[::-1]
+
+
+def spectrum_0d(xs: dict, group_edges):
+    """Normalized infinite-medium spectrum of a library, None if the balance has no physical solution."""
+    chi = xs.get("chi")
+    source = chi if chi is not None and chi.sum() > 0.0 else watt_source(group_edges)
+    balance = np.diag(xs["total"]) - xs["scatter_matrix"][:, :, 0].T
+    empty = xs["total"] <= 0.0  # groups without data (never reached in the run): no flux
+    balance[empty, :] = 0.0
+    balance[empty, empty] = 1.0
+    source = np.where(empty, 0.0, source)
+    try:
+        phi = np.linalg.solve(balance, source)
+    except np.linalg.LinAlgError:
+        return None
+    if not np.all(np.isfinite(phi)) or phi.min() < 0.0 or phi.sum() <= 0.0:
+        return None
+    return phi / phi.sum()
+
+
+def spectrum_distance(p, q) -> float:
+    return 0.5 * float(np.abs(p - q).sum())
+
+
+def synthesize(family: str, densities: dict, dest_h5, xsdata_name: str) -> dict:
+    """
+    Write dest_h5 from the family representative with the nearest 0D spectrum.
+    Returns {"representative", "distance"}; "written" is False when no
+    representative is within SPECTRUM_TOL (distance None: no usable representative).
+    """
+    best = {"representative": None, "distance": None, "written": False}
+    best_xs = None
+    for path in candidates(family):
+        try:
+            rep = load(path)
+            xs = superpose(rep, densities)
+            p = spectrum_0d(xs, rep["group_edges"])
+            q = spectrum_0d(superpose(rep, rep["densities"]), rep["group_edges"])
+        except (KeyError, OSError):
+            continue
+        if p is None or q is None:
+            continue
+        d = spectrum_distance(p, q)
+        if best["distance"] is None or d < best["distance"]:
+            best.update(representative=rep["key"], distance=d)
+            best_xs = (xs, rep)
+    if best_xs is None or best["distance"] > SPECTRUM_TOL:
+        return best
+    xs, rep = best_xs
+    mgxs_h5.write_library(dest_h5, rep["group_edges"], {xsdata_name: xs}, rep["order"])
+    with h5py.File(dest_h5, "r+") as f:
+        f[xsdata_name].attrs["synthesized_from"] = rep["key"]
+        f[xsdata_name].attrs["spectrum_distance"] = best["distance"]
+    best["written"] = True
+    return best
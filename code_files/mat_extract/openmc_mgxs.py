@@ -1,4 +1,6 @@
+import json
 import os
+import sys
 import time
 import openmc
 import openmc.mgxs as mgxs
@@ -9,6 +11,16 @@ import matplotlib.pyplot as plt
 
 from pathlib import Path
 
+import condense_mgxs
+import mgxs_cache
+import mgxs_h5
+import mgxs_micro
+import statepoint_h5
+
+# The OpenSn solver's Legendre scattering order (OPENSN_SCATTERING_ORDER), read in one place
+sys.path.append(str(Path(__file__).resolve().parents[1] / "OpenSn"))
+from OpenSnGen import SCATTERING_ORDER
+
 
 # ── Inputs and global options ─────────────────────────────────────────────────
 SHOW_GRAPH = False
@@ -24,10 +36,133 @@ N_PARTICLES_NONFISS = 5000
 N_BATCHES_NONFISS = 40
 N_INACTIVE_NONFISS = 0
 
+# Tally triggers: a material runs its minimum batches, then continues (checked every
+# TRIGGER_INTERVAL batches) until every non-empty group of the trigger tallies is below
+# its relative-error target, or the batch cap is reached.
+# MGXS_TRIGGERS=0 runs the fixed N_BATCHES_* above instead.
+USE_TRIGGERS = bool(int(os.getenv("MGXS_TRIGGERS", "1")))
+TRIGGER_REL_ERR = {
+    "total": float(os.getenv("MGXS_TRIGGER_TOTAL", "0.005")),
+    "nu-fission": float(os.getenv("MGXS_TRIGGER_NU_FISSION", "0.01")),  # fissionable materials only
+    "scatter": float(os.getenv("MGXS_TRIGGER_SCATTER", "0.01")),        # P0 out-scatter per group
+}
+TRIGGER_INTERVAL = int(os.getenv("MGXS_TRIGGER_INTERVAL", "10"))
+N_ACTIVE_MIN_FISS = 40
+N_BATCHES_MIN_FISS = N_INACTIVE_FISS + N_ACTIVE_MIN_FISS
+N_BATCHES_MAX_FISS = int(os.getenv("MGXS_MAX_BATCHES_FISS", "1000"))
+N_BATCHES_MIN_NONFISS = 10
+N_BATCHES_MAX_NONFISS = int(os.getenv("MGXS_MAX_BATCHES_NONFISS", "400"))
+TRIGGER_TALLY_PREFIX = "trigger "
+
+# Fission-source seeding: in the homogeneous reflective box the fission source is
+# spatially flat, so only its energy has to settle. Fissionable runs start from the chi
+# of the nearest cached composition (OpenMC's default Watt spectrum if there is none) and
+# run N_INACTIVE_SEEDED inactive batches. A Geweke drift test of k and the Shannon entropy
+# over the active generations (statepoint_h5.source_convergence) reruns the material with
+# N_INACTIVE_FISS if z > SOURCE_MAX_Z. MGXS_SEED_SOURCE=0 always uses N_INACTIVE_FISS.
+SEED_SOURCE = bool(int(os.getenv("MGXS_SEED_SOURCE", "1")))
+N_INACTIVE_SEEDED = int(os.getenv("MGXS_INACTIVE_SEEDED", "5"))
+SOURCE_MAX_Z = float(os.getenv("MGXS_SOURCE_MAX_Z", "3.0"))
+ENTROPY_MESH_DIM = 4  # entropy mesh cells per box side
+UNCERTAINTY_JSON = "mgxs_uncertainty.json"
+
+# Post-processing: MGXS from the raw statepoint tallies with h5py/NumPy (statepoint_h5.py);
+# MGXS_H5_POST=0 uses openmc.mgxs. MGXS_H5_CROSSCHECK=1 also runs openmc.mgxs and prints a
+# WARN: line for every library entry that differs by more than CROSSCHECK_RTOL.
+H5_POST = bool(int(os.getenv("MGXS_H5_POST", "1")))
+H5_CROSSCHECK = bool(int(os.getenv("MGXS_H5_CROSSCHECK", "0")))
+CROSSCHECK_RTOL = 1e-6
+
 # LANL 70 group structure
-group_edges = np.loadtxt("../../../../code_files/mat_extract/LANL70g_eV.txt")
+group_edges = np.loadtxt(Path(__file__).resolve().parent / "LANL70g_eV.txt")
 groups = mgxs.EnergyGroups(group_edges)
 
+# Fine master structure: an OpenMC group structure name ("CCFE-709", "SHEM-361", ...) or an
+# edges file [eV]. Runs then tally on it (merged with the LANL70 edges), keep
+# {name}_master{G}g.h5 with the group flux, and condense the LANL70 library from it;
+# condense_mgxs.py makes any other structure later without transport.
+# Empty: tally LANL70 directly.
+MASTER_GROUPS = os.getenv("MGXS_MASTER_GROUPS", "")
+
+
+def master_energy_groups() -> mgxs.EnergyGroups:
+    if Path(MASTER_GROUPS).is_file():
+        fine = np.loadtxt(MASTER_GROUPS)
+    elif MASTER_GROUPS in mgxs.GROUP_STRUCTURES:
+        fine = mgxs.GROUP_STRUCTURES[MASTER_GROUPS]
+    else:
+        raise ValueError(f"MGXS_MASTER_GROUPS={MASTER_GROUPS!r} is neither a file nor one of "
+                         f"{sorted(mgxs.GROUP_STRUCTURES)}")
+    return mgxs.EnergyGroups(condense_mgxs.merge_edges(fine, group_edges))
+
+
+tally_groups = master_energy_groups() if MASTER_GROUPS else groups
+
+# Tally only what the OpenSn solve consumes: its Legendre scattering order
+# (SCATTERING_ORDER of OpenSn/OpenSnGen.py) and the library entries
+# MultiGroupXS.LoadFromOpenMC reads. MGXS_LEGENDRE_ORDER overrides the order;
+# MGXS_FULL_TYPES=1 tallies every type of ALL_MGXS_TYPES (CSV diagnostics included).
+LEGENDRE_ORDER = int(os.getenv("MGXS_LEGENDRE_ORDER", str(SCATTERING_ORDER)))
+FULL_TYPES = bool(int(os.getenv("MGXS_FULL_TYPES", "0")))
+ALL_MGXS_TYPES = [
+    "total",
+    "absorption",
+    "fission",
+    "nu-fission",
+    "chi",
+    "reduced absorption",
+    "scatter matrix",
+    "nu-scatter matrix",
+    "consistent nu-scatter matrix",
+    "multiplicity matrix",
+]
+# Library entries: total, absorption, fission, nu-fission, chi, scatter_matrix
+# (consistent nu-scatter) and multiplicity_matrix
+SOLVER_MGXS_TYPES = ["total", "absorption", "fission", "nu-fission", "chi", "consistent nu-scatter matrix"]
+
+
+def openmc_library_types(types) -> list:
+    """
+    types plus the multiplicity matrix openmc.mgxs create_mg_library needs: without it, it
+    drops the multiplicity and folds (n,xn) into the absorption. statepoint_h5 derives it
+    from the consistent nu-scatter tallies instead.
+    """
+    return list(types) + [t for t in ("multiplicity matrix",) if t not in types]
+
+
+def solver_mgxs_types() -> list:
+    if FULL_TYPES:
+        return list(ALL_MGXS_TYPES)
+    if not H5_POST or H5_CROSSCHECK:
+        return openmc_library_types(SOLVER_MGXS_TYPES)
+    return list(SOLVER_MGXS_TYPES)
+
+
+MGXS_TYPES = solver_mgxs_types()
+SKIPPED_MGXS_TYPES = [t for t in ALL_MGXS_TYPES if t not in MGXS_TYPES]
+
+
+def tally_set() -> dict:
+    """What the runs tally and what they skip, recorded with every library."""
+    return {"mgxs_types": MGXS_TYPES, "skipped_mgxs_types": SKIPPED_MGXS_TYPES,
+            "legendre_order": LEGENDRE_ORDER, "solver_scattering_order": SCATTERING_ORDER}
+
+# Per-nuclide types tallied for mgxs_micro.py (MGXS_MICRO=1)
+MICRO_MGXS_TYPES = [
+    "total",
+    "absorption",
+    "fission",
+    "nu-fission",
+    "chi",
+    "scatter matrix",
+    "consistent nu-scatter matrix",
+]
+
+# 1 = run the box materials in one persistent openmc.lib session per process
+# (openmc_session.py) instead of one openmc.run per material
+SESSION = bool(int(os.getenv("MGXS_SESSION", "0")))
+SERVE_DONE = "JOB_DONE"  # end-of-job line of --serve
+
 MATERIALS_XML_IN = "materials.xml"
 MATERIALS_XML_OUT = "materials_fixed.xml"
 
@@ -121,19 +256,201 @@ def export_results_to_csv(xs, group_edges, file_path):
     np.savetxt(file_path + f"energy_edges_{ng}g.csv", group_edges, delimiter=",")
 
 
-def process_results(sp_filename, mgxs_lib, my_path, h5_filename):
+def add_trigger_tallies(tallies: openmc.Tallies, domain, fissionable: bool):
+    """
+    Group-wise total, nu-fission and P0 out-scatter tallies of a cell (or a list
+    of materials) with relative-error triggers. Zero (empty) groups are ignored
+    by the triggers.
+    """
+    if isinstance(domain, openmc.Cell):
+        domain_filter = openmc.CellFilter([domain])
+    else:
+        domain_filter = openmc.MaterialFilter(list(domain))
+    scores = ["total", "scatter"] + (["nu-fission"] if fissionable else [])
+    for score in scores:
+        tally = openmc.Tally(name=TRIGGER_TALLY_PREFIX + score)
+        tally.filters = [domain_filter, openmc.EnergyFilter(groups.group_edges)]
+        tally.scores = [score]
+        try:
+            trigger = openmc.Trigger("rel_err", TRIGGER_REL_ERR[score], ignore_zeros=True)
+        except TypeError:
+            # Older OpenMC: zero bins report a relative error of 0 and never hold the run back
+            trigger = openmc.Trigger("rel_err", TRIGGER_REL_ERR[score])
+        trigger.scores = [score]
+        tally.triggers = [trigger]
+        tallies.append(tally)
+
+
+def latest_statepoint(run_dir=".") -> str:
+    """Statepoint of the last batch (trigger runs stop at an unknown batch), None if absent."""
+    sps = list(Path(run_dir).glob("statepoint.*.h5"))
+    if not sps:
+        return None
+    return str(max(sps, key=lambda p: int(p.name.split(".")[1])))
+
+
+def uncertainty_summary(trigger_tallies, batches: int, particles: int, domain_index: int = 0,
+                        scores=None) -> dict:
+    """
+    Achieved uncertainties of the trigger tallies, given as (name, mean, std_dev) of every
+    tally (of their domain_index-th domain bin, only those of `scores` if given):
+    {"batches", "particles", "rel_err": {score: per-group list (group 1 = fastest, None = empty)},
+     "max_rel_err": {score: value}, "targets": {...}, "converged": bool}
+    """
+    rel_err, max_rel_err = {}, {}
+    n_groups = len(groups.group_edges) - 1
+    for name, tally_mean, tally_std in trigger_tallies:
+        if not (name or "").startswith(TRIGGER_TALLY_PREFIX):
+            continue
+        score = name[len(TRIGGER_TALLY_PREFIX):]
+        if scores is not None and score not in scores:
+            continue
+        # Rows: domain bins; EnergyFilter bins ascend in energy, groups descend
+        mean = np.asarray(tally_mean).reshape(-1, n_groups)[domain_index, ::-1]
+        std = np.asarray(tally_std).reshape(-1, n_groups)[domain_index, ::-1]
+        nonzero = mean > 0.0
+        rel = np.full(mean.shape, np.nan)
+        rel[nonzero] = std[nonzero] / mean[nonzero]
+        rel_err[score] = [None if np.isnan(v) else float(v) for v in rel]
+        max_rel_err[score] = float(np.nanmax(rel)) if nonzero.any() else 0.0
+    targets = {score: TRIGGER_REL_ERR[score] for score in max_rel_err}
+    return {
+        "batches": int(batches),
+        "particles": int(particles),
+        "targets": targets,
+        "max_rel_err": max_rel_err,
+        "converged": all(max_rel_err[score] <= targets[score] for score in max_rel_err),
+        "rel_err": rel_err,
+    }
+
+
+def trigger_uncertainties(sp, domain_index: int = 0, scores=None) -> dict:
+    """uncertainty_summary of the trigger tallies of an openmc.StatePoint."""
+    return uncertainty_summary(((t.name, t.mean, t.std_dev) for t in sp.tallies.values()),
+                               sp.current_batch,  # n_batches is the cap of a run stopped early
+                               sp.n_particles, domain_index, scores)
+
+
+def record_uncertainties(h5_path, xsdata_names, unc: dict):
+    """Store the achieved uncertainties as attributes of every xsdata group of the library."""
+    with h5py.File(h5_path, "r+") as f:
+        for name in xsdata_names:
+            attrs = f[name].attrs
+            attrs["batches"] = unc["batches"]
+            attrs["particles"] = unc["particles"]
+            attrs["converged"] = unc["converged"]
+            for key, value in unc.get("tally_set", {}).items():
+                attrs[key.replace("_", " ")] = np.array(value, dtype="S") if isinstance(value, list) else value
+            for score, values in unc["rel_err"].items():
+                attrs[f"rel_err {score}"] = np.array([np.nan if v is None else v for v in values])
+                attrs[f"max rel_err {score}"] = unc["max_rel_err"][score]
+                attrs[f"target rel_err {score}"] = unc["targets"][score]
+
+
+def process_results(sp_filename, mgxs_lib, my_path, h5_filename, master_name=None, scores=None,
+                    source=None) -> dict:
+    """
+    Write the library and CSVs; returns the achieved uncertainties (see uncertainty_summary).
+    master_name: mgxs_lib is on the master structure; write it (with the flux) as
+    master_name.h5 and condense h5_filename.h5 from it.
+    scores: trigger scores that count for this material (default: all trigger tallies).
+    source: seeded-source record of run_material, stored in the uncertainty JSON.
+    The MGXS come from the raw statepoint tallies (statepoint_h5.py); mgxs_lib only
+    names the domains, types and groups. MGXS_H5_POST=0 uses openmc.mgxs instead.
+    """
     if sp_filename is None:
         raise RuntimeError("sp_filename is None")
+    if not H5_POST:
+        return process_results_openmc(sp_filename, mgxs_lib, my_path, h5_filename, master_name, scores, source)
 
     cell_names = [cell.name for cell in mgxs_lib.domains]
+    sp_info, tallies = statepoint_h5.read_tallies(sp_filename)
+    unc = uncertainty_summary(((t["name"], t["mean"], t["std_dev"]) for t in tallies),
+                              sp_info["batches"], sp_info["particles"], scores=scores)
+    unc["tally_set"] = tally_set()
+    if source is not None:
+        unc["source"] = source
+
+    xs_by_cell, xsdata = {}, {}
+    for cell in mgxs_lib.domains:
+        xs_by_cell[cell.name] = statepoint_h5.macro_xs(tallies, cell.id, mgxs_lib.mgxs_types,
+                                                       skip_prefix=TRIGGER_TALLY_PREFIX)
+        xsdata[cell.name] = statepoint_h5.library_data(xs_by_cell[cell.name])
+    tally_edges = mgxs_lib.energy_groups.group_edges
+    if master_name is None:
+        mgxs_h5.write_library(my_path / f"{h5_filename}.h5", tally_edges, xsdata, mgxs_lib.legendre_order)
+    else:
+        master_path = my_path / f"{master_name}.h5"
+        for cell in mgxs_lib.domains:
+            xsdata[cell.name]["flux"] = statepoint_h5.domain_flux(tallies, cell.id)
+        mgxs_h5.write_library(master_path, tally_edges, xsdata, mgxs_lib.legendre_order)
+        condense_mgxs.condense_file(master_path, groups.group_edges, my_path / f"{h5_filename}.h5")
+    record_uncertainties(my_path / f"{h5_filename}.h5", cell_names, unc)
+    with open(my_path / UNCERTAINTY_JSON, "w") as fj:
+        json.dump(unc, fj, indent=1)
+
+    for cell_name, xs in xs_by_cell.items():
+        export_results_to_csv(xs, tally_edges, str(my_path / f"{cell_name}_"))
+
+    if H5_CROSSCHECK:
+        crosscheck_openmc(sp_filename, mgxs_lib, xsdata)
+    return unc
+
+
+def crosscheck_openmc(sp_filename, mgxs_lib, xsdata: dict) -> dict:
+    """
+    Compare the statepoint_h5 library data with openmc.mgxs's; WARN lines for differences.
+    Returns {xsdata name: {key: max relative difference}} of the differing entries.
+    """
+    sp = openmc.StatePoint(sp_filename)
+    sp.link_with_summary(openmc.Summary(os.path.join(os.path.dirname(sp_filename), "summary.h5")))
+    mgxs_lib.load_from_statepoint(sp)
+    ref_path = Path(os.path.dirname(sp_filename)) / "crosscheck_openmc_mgxs.h5"
+    cell_names = [cell.name for cell in mgxs_lib.domains]
+    mgxs_lib.create_mg_library(xs_type="macro", xsdata_names=cell_names).export_to_hdf5(filename=str(ref_path))
+    sp.close()
+    reference = mgxs_h5.read_library(ref_path)[1]
+    ref_path.unlink()
+    out = {}
+    for name in cell_names:
+        ref = {key: value for key, value in reference[name].items() if key != "order"}
+        out[name] = statepoint_h5.compare(xsdata[name], ref, rtol=CROSSCHECK_RTOL)
+        for key, rel in out[name].items():
+            print(f"WARN: {name} {key} differs from openmc.mgxs (max rel diff {rel:.2e})", flush=True)
+    return out
+
+
+def process_results_openmc(sp_filename, mgxs_lib, my_path, h5_filename, master_name=None, scores=None,
+                           source=None) -> dict:
+    """
+    process_results through openmc.mgxs (MGXS_H5_POST=0): load the statepoint into
+    mgxs_lib, export its MG library and get_xs every type for the CSVs.
+    """
+    cell_names = [cell.name for cell in mgxs_lib.domains]
 
     sp = openmc.StatePoint(sp_filename)
     summary = openmc.Summary(os.path.join(os.path.dirname(sp_filename), "summary.h5"))
     sp.link_with_summary(summary)
     mgxs_lib.load_from_statepoint(sp)
+    unc = trigger_uncertainties(sp, scores=scores)
+    unc["tally_set"] = tally_set()
+    if source is not None:
+        unc["source"] = source
 
     mgxs_file = mgxs_lib.create_mg_library(xs_type="macro", xsdata_names=cell_names)
-    mgxs_file.export_to_hdf5(filename=str(my_path / f"{h5_filename}.h5"))
+    if master_name is None:
+        mgxs_file.export_to_hdf5(filename=str(my_path / f"{h5_filename}.h5"))
+    else:
+        master_path = my_path / f"{master_name}.h5"
+        mgxs_file.export_to_hdf5(filename=str(master_path))
+        with h5py.File(master_path, "r+") as f:
+            for cell in mgxs_lib.domains:
+                flux = mgxs_lib.get_mgxs(cell, "total").tallies["flux"].mean.ravel()[::-1]  # groups descend
+                f[cell.name].create_dataset("flux", data=flux)
+        condense_mgxs.condense_file(master_path, groups.group_edges, my_path / f"{h5_filename}.h5")
+    record_uncertainties(my_path / f"{h5_filename}.h5", cell_names, unc)
+    with open(my_path / UNCERTAINTY_JSON, "w") as fj:
+        json.dump(unc, fj, indent=1)
 
     for cell in mgxs_lib.domains:
         cell_id = cell.id
@@ -145,6 +462,30 @@ def process_results(sp_filename, mgxs_lib, my_path, h5_filename):
         export_results_to_csv(xs, mgxs_lib.energy_groups.group_edges, str(my_path / f"{cell_name}_"))
 
     sp.close()
+    return unc
+
+
+def store_micro_library(sp_filename, micro_lib, cell, mat, key, source):
+    """Store the per-nuclide MGXS of a run as a representative of the material's composition family."""
+    sp = openmc.StatePoint(sp_filename)
+    summary = openmc.Summary(os.path.join(os.path.dirname(sp_filename), "summary.h5"))
+    sp.link_with_summary(summary)
+    micro_lib.load_from_statepoint(sp)
+
+    densities = mgxs_cache.atom_densities(mat)
+    micro = {
+        nuc: {
+            xs_type: np.nan_to_num(np.asarray(
+                micro_lib.get_mgxs(cell, xs_type).get_xs(nuclides=[nuc], xs_type="micro"), dtype=float))
+            for xs_type in MICRO_MGXS_TYPES
+        }
+        for nuc in densities
+    }
+    flux = micro_lib.get_mgxs(cell, "total").tallies["flux"].mean.ravel()[::-1]  # groups descend in energy
+    sp.close()
+
+    family, _ = mgxs_cache.family_key(mat, groups.group_edges, LEGENDRE_ORDER)
+    mgxs_micro.store(family, key, densities, flux, micro, groups.group_edges, LEGENDRE_ORDER, source=source)
 
 
 def plot_total_cross_section(mgxs_filename, material_key, display_name, save_plot=True):
@@ -175,55 +516,74 @@ def plot_total_cross_section(mgxs_filename, material_key, display_name, save_plo
 
 
 # ── Load and fix materials ────────────────────────────────────────────────────
-script_t0 = time.perf_counter()
-
-materials = openmc.Materials.from_xml(MATERIALS_XML_IN)
-
-your_files = os.getcwd()
-if "ragusa" in your_files:
-    os.environ["OPENMC_CROSS_SECTIONS"] = (
-        "/home/ragusa/xs/endfb-viii.0-hdf5/cross_sections.xml"
-    )
-
-for new_id, mat in enumerate(materials, start=1):
-    for name, frac, frac_type in list(mat.nuclides):
-        if name == "C0":
-            mat.remove_nuclide("C0")
-            c12_frac = frac * 0.9893   # 98.93% C-12
-            c13_frac = frac * 0.0107   # 1.07% C-13
-            mat.add_nuclide("C12", c12_frac, frac_type)
-            mat.add_nuclide("C13", c13_frac, frac_type)
-    mat.id = new_id
-
-materials.export_to_xml(MATERIALS_XML_OUT)
-all_materials = openmc.Materials.from_xml(MATERIALS_XML_OUT)
-
-# Keep your original behavior (you overwrite with in-memory materials)
-all_materials = materials
+def configure_cross_sections():
+    your_files = os.getcwd()
+    if "ragusa" in your_files:
+        os.environ["OPENMC_CROSS_SECTIONS"] = (
+            "/home/ragusa/xs/endfb-viii.0-hdf5/cross_sections.xml"
+        )
 
 
-# ── Main loop: one separate run per material ──────────────────────────────────
-root_dir = os.getcwd()
-all_materials_list = list(all_materials)
-n_total = len(all_materials_list)
-
-print(f"TIMING: case_start materials={n_total}", flush=True)
-
-for i_mat, mat in enumerate(all_materials_list, start=1):
-    mat_t0 = time.perf_counter()
-
+def load_case_materials(materials_xml, write_fixed: bool = False) -> list:
+    """
+    Materials of a case's materials.xml with natural carbon split into C12/C13
+    and ids renumbered 1..n (the material_{id}_{name} folder numbering).
+    """
+    materials = openmc.Materials.from_xml(str(materials_xml))
+    for new_id, mat in enumerate(materials, start=1):
+        for name, frac, frac_type in list(mat.nuclides):
+            if name == "C0":
+                mat.remove_nuclide("C0")
+                c12_frac = frac * 0.9893   # 98.93% C-12
+                c13_frac = frac * 0.0107   # 1.07% C-13
+                mat.add_nuclide("C12", c12_frac, frac_type)
+                mat.add_nuclide("C13", c13_frac, frac_type)
+        mat.id = new_id
+    if write_fixed:
+        materials.export_to_xml(str(Path(materials_xml).with_name(MATERIALS_XML_OUT)))
+    return list(materials)
+
+
+def material_names(mat: openmc.Material) -> tuple:
+    """(display name, sanitized name used for the folder and xsdata)."""
     base_name = mat.name.strip() if (mat.name is not None and mat.name.strip()) else f"mat_{mat.id}"
-    safe_name = sanitize_name(base_name)
-    run_dir = os.path.join(root_dir, f"material_{mat.id}_{safe_name}")
+    return base_name, sanitize_name(base_name)
 
-    os.makedirs(run_dir, exist_ok=True)
-    os.chdir(run_dir)
-
-    openmc.reset_auto_ids()
-
-    openmc.Materials([mat]).export_to_xml("materials.xml")
-    one_mat = openmc.Materials.from_xml("materials.xml")[0]
 
+def run_settings_for(mat: openmc.Material, seeded: bool = SEED_SOURCE) -> dict:
+    """
+    Particle settings; with triggers, "batches" is the minimum and "max_batches" the cap.
+    seeded: fissionable runs start from a seeded source with N_INACTIVE_SEEDED inactive batches.
+    """
+    fissionable = material_is_fissionable(mat)
+    if fissionable:
+        inactive = N_INACTIVE_SEEDED if seeded else N_INACTIVE_FISS
+        settings = {"run_mode": "eigenvalue", "particles": N_PARTICLES_FISS,
+                    "batches": N_BATCHES_FISS - N_INACTIVE_FISS + inactive, "inactive": inactive}
+        if seeded:
+            settings["seeded"] = True
+    else:
+        settings = {"run_mode": "fixed source", "particles": N_PARTICLES_NONFISS,
+                    "batches": N_BATCHES_NONFISS, "inactive": N_INACTIVE_NONFISS}
+    if USE_TRIGGERS:
+        settings["batches"] = settings["inactive"] + N_ACTIVE_MIN_FISS if fissionable else N_BATCHES_MIN_NONFISS
+        settings["max_batches"] = N_BATCHES_MAX_FISS if fissionable else N_BATCHES_MAX_NONFISS
+        settings["trigger_interval"] = TRIGGER_INTERVAL
+        settings["triggers"] = {score: TRIGGER_REL_ERR[score]
+                                for score in ("total", "scatter", "nu-fission")
+                                if fissionable or score != "nu-fission"}
+    if MASTER_GROUPS:
+        settings["master_groups"] = f"{Path(MASTER_GROUPS).name}:{tally_groups.num_groups}"
+    return settings
+
+
+def material_cache_key(mat: openmc.Material) -> tuple:
+    """mgxs_cache key and payload of a material with this script's options."""
+    return mgxs_cache.cache_key(mat, groups.group_edges, LEGENDRE_ORDER, MGXS_TYPES, run_settings_for(mat))
+
+
+def box_geometry(mat: openmc.Material, name: str) -> tuple:
+    """Reflective BOX_LENGTH cube filled with mat; returns (geometry, cell named `name`)."""
     L = BOX_LENGTH
     x0 = openmc.XPlane(x0=0.0, boundary_type="reflective")
     x1 = openmc.XPlane(x0=L, boundary_type="reflective")
@@ -233,97 +593,350 @@ for i_mat, mat in enumerate(all_materials_list, start=1):
     z1 = openmc.ZPlane(z0=L, boundary_type="reflective")
 
     region = +x0 & -x1 & +y0 & -y1 & +z0 & -z1
-    cell = openmc.Cell(name=safe_name, fill=one_mat, region=region)
-    geometry = openmc.Geometry([cell])
+    cell = openmc.Cell(name=name, fill=mat, region=region)
+    return openmc.Geometry([cell]), cell
+
+
+def box_library(geometry: openmc.Geometry, energy_groups, mgxs_types, by_nuclide: bool = False) -> mgxs.Library:
+    """Built cell-domain MGXS library of the box geometry."""
+    lib = mgxs.Library(geometry)
+    lib.energy_groups = energy_groups
+    lib.scatter_format = "legendre"
+    lib.legendre_order = LEGENDRE_ORDER
+    lib.mgxs_types = mgxs_types
+    lib.by_nuclide = by_nuclide
+    lib.domain_type = "cell"
+    lib.domains = list(geometry.get_all_material_cells().values())
+    lib.build_library()
+    return lib
+
+
+def seed_spectrum(mat: openmc.Material) -> tuple:
+    """
+    (source energy distribution, label) of a seeded run: the histogram chi of the nearest
+    cached composition, else (None, "watt"), OpenMC's default Watt spectrum.
+    """
+    nearest = mgxs_cache.nearest_fission_spectrum(mat) if mgxs_cache.ENABLED else None
+    if nearest is None:
+        return None, "watt"
+    edges, chi, key = nearest
+    density = chi[::-1] / np.diff(edges)  # ascending groups, per eV
+    return openmc.stats.Tabular(edges, np.append(density, 0.0), interpolation="histogram"), f"chi:{key[:12]}"
+
+
+def entropy_mesh(bbox) -> openmc.RegularMesh:
+    mesh = openmc.RegularMesh()
+    mesh.lower_left = bbox.lower_left
+    mesh.upper_right = bbox.upper_right
+    mesh.dimension = (ENTROPY_MESH_DIM,) * 3
+    return mesh
+
+
+def write_box_inputs(mat: openmc.Material, name: str, run_settings: dict, energy=None) -> tuple:
+    """
+    Write geometry, settings and tallies XML of the box run of mat to the current folder.
+    energy: source energy distribution (None = OpenMC's default Watt spectrum).
+    Returns (mgxs library, micro library or None, cell).
+    """
+    fissionable = run_settings["run_mode"] == "eigenvalue"
+    geometry, cell = box_geometry(mat, name)
     geometry.export_to_xml()
 
     bbox = geometry.bounding_box
     uniform_dist = openmc.stats.Box(bbox.lower_left, bbox.upper_right)
 
-    if material_is_fissionable(one_mat):
-        source = openmc.IndependentSource(space=uniform_dist, constraints={"fissionable": True})
-        fiss_flag = 1
+    if fissionable:
+        source = openmc.IndependentSource(space=uniform_dist, energy=energy, constraints={"fissionable": True})
     else:
         source = openmc.IndependentSource(space=uniform_dist)
-        fiss_flag = 0
 
     settings = openmc.Settings()
     settings.source = source
 
-    if material_is_fissionable(mat):
-        settings.batches = N_BATCHES_FISS
-        settings.inactive = N_INACTIVE_FISS
-        settings.particles = N_PARTICLES_FISS
-        settings.run_mode = "eigenvalue"
+    settings.batches = run_settings["batches"]
+    settings.inactive = run_settings["inactive"]
+    settings.particles = run_settings["particles"]
+    settings.run_mode = run_settings["run_mode"]
+    if fissionable:
+        settings.entropy_mesh = entropy_mesh(bbox)
     else:
-        settings.batches = N_BATCHES_NONFISS
-        settings.inactive = N_INACTIVE_NONFISS
-        settings.particles = N_PARTICLES_NONFISS
-        settings.run_mode = "fixed source"
         settings.max_particle_events = 200000
 
+    if USE_TRIGGERS:
+        settings.trigger_active = True
+        settings.trigger_max_batches = run_settings["max_batches"]
+        settings.trigger_batch_interval = run_settings["trigger_interval"]
+
     settings.temperature["method"] = "interpolation"
     settings.export_to_xml()
-    expected_sp = f"statepoint.{settings.batches}.h5"
-
-    mgxs_lib = mgxs.Library(geometry)
-    mgxs_lib.energy_groups = groups
-    mgxs_lib.scatter_format = "legendre"
-    mgxs_lib.legendre_order = 7
-    mgxs_lib.mgxs_types = [
-        "total",
-        "absorption",
-        "fission",
-        "nu-fission",
-        "chi",
-        "reduced absorption",
-        "scatter matrix",
-        "nu-scatter matrix",
-        "consistent nu-scatter matrix",
-        "multiplicity matrix",
-    ]
-    mgxs_lib.by_nuclide = False
-    mgxs_lib.domain_type = "cell"
-    mgxs_lib.domains = list(geometry.get_all_material_cells().values())
-
-    mgxs_lib.build_library()
+
+    mgxs_lib = box_library(geometry, tally_groups, MGXS_TYPES)
     tallies = openmc.Tallies()
     mgxs_lib.add_to_tallies_file(tallies, merge=True)
+    micro_lib = None
+    if mgxs_micro.ENABLED:
+        micro_lib = box_library(geometry, groups, MICRO_MGXS_TYPES, by_nuclide=True)
+        micro_lib.add_to_tallies_file(tallies, merge=True)
+    if USE_TRIGGERS:
+        add_trigger_tallies(tallies, cell, fissionable)
     tallies.export_to_xml()
+    return mgxs_lib, micro_lib, cell
 
-    run_t0 = time.perf_counter()
-    openmc.run(cwd=".", output=False)  # suppress OpenMC console output
-    run_dt = time.perf_counter() - run_t0
 
-    if not os.path.exists(expected_sp):
-        raise RuntimeError(f"Expected statepoint '{expected_sp}' not found.")
+def transport_box(mat: openmc.Material, name: str, run_settings: dict, run_dir, threads=None, session=None,
+                  energy=None) -> tuple:
+    """
+    One OpenMC run of mat in the box, in the current folder (= run_dir), through the
+    session if given, else openmc.run with source energy `energy`.
+    Returns (mgxs library, micro library or None, cell, statepoint path).
+    """
+    for old_sp in Path(".").glob("statepoint.*.h5"):
+        old_sp.unlink()  # a leftover from an earlier run would be taken as this run's result
+    micro_lib = None
+    if session is not None:
+        mgxs_lib, cell = session.run(mat, name, run_settings, run_dir)
+    else:
+        mgxs_lib, micro_lib, cell = write_box_inputs(mat, name, run_settings, energy)
+        openmc.run(cwd=".", output=False, threads=threads)  # suppress OpenMC console output
 
-    post_t0 = time.perf_counter()
-    my_path = Path(".")
-    ng = len(groups.group_edges) - 1
-    h5_filename = f"{safe_name}_LANL{ng}g"
+    sp_filename = latest_statepoint(".")
+    if sp_filename is None:
+        raise RuntimeError("No statepoint written by OpenMC.")
+    return mgxs_lib, micro_lib, cell, sp_filename
 
-    process_results(expected_sp, mgxs_lib, my_path, h5_filename=h5_filename)
 
-    mgxs_h5_path = str(my_path / f"{h5_filename}.h5")
+# ── One material: cache lookup or one OpenMC run in an infinite box ──────────
+def run_material(mat: openmc.Material, materials_dir, threads=None, session=None) -> dict:
+    """
+    Write material_{id}_{name}/{name}_LANL70g.h5 for one material of a case.
+    threads: OpenMP threads of the OpenMC run (None = OpenMC default).
+    session: an openmc_session.BoxSession to run in instead of openmc.run, where it supports the material.
+    Returns timing and cache information for the TIMING lines.
+    """
+    mat_t0 = time.perf_counter()
+    base_name, safe_name = material_names(mat)
+    run_dir = Path(materials_dir).resolve() / f"material_{mat.id}_{safe_name}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(run_dir)
     try:
-        plot_total_cross_section(mgxs_h5_path, material_key=safe_name, display_name=base_name, save_plot=True)
-    except Exception:
-        # Keep quiet by default; helper will still see timing.
-        pass
-
-    post_dt = time.perf_counter() - post_t0
-
-    os.chdir(root_dir)
-
-    mat_dt = time.perf_counter() - mat_t0
+        openmc.reset_auto_ids()
+
+        openmc.Materials([mat]).export_to_xml("materials.xml")
+        one_mat = openmc.Materials.from_xml("materials.xml")[0]
+
+        fiss_flag = 1 if material_is_fissionable(one_mat) else 0
+        run_settings = run_settings_for(one_mat)
+        ng = len(groups.group_edges) - 1
+        h5_filename = f"{safe_name}_LANL{ng}g"
+        mgxs_h5_path = str(Path(".") / f"{h5_filename}.h5")
+        master_name = f"{safe_name}_master{tally_groups.num_groups}g" if MASTER_GROUPS else None
+        master_h5_path = Path(f"{master_name}.h5") if master_name else None
+        info = {"id": mat.id, "name": safe_name, "fiss": fiss_flag, "cached": False, "openmc": 0.0, "post": 0.0}
+        cache_key, cache_payload = mgxs_cache.cache_key(
+            one_mat, groups.group_edges, LEGENDRE_ORDER, MGXS_TYPES, run_settings)
+        info["key"] = cache_key
+
+        # Same composition and options computed before (any case): copy instead of transport
+        if mgxs_cache.ENABLED and mgxs_cache.restore(cache_key, Path(mgxs_h5_path), safe_name, master_h5_path):
+            info["cached"] = True
+        # Same nuclides at other densities with a similar spectrum: superpose microscopic MGXS
+        elif mgxs_micro.ENABLED:
+            family, _ = mgxs_cache.family_key(one_mat, groups.group_edges, LEGENDRE_ORDER)
+            synth = mgxs_micro.synthesize(family, mgxs_cache.atom_densities(one_mat), Path(mgxs_h5_path), safe_name)
+            info["synthesis"] = synth
+            info["cached"] = synth["written"]
+        if info["cached"]:
+            try:
+                plot_total_cross_section(mgxs_h5_path, material_key=safe_name, display_name=base_name,
+                                         save_plot=True)
+            except Exception:
+                pass
+            info["total"] = time.perf_counter() - mat_t0
+            return info
+
+        if session is not None and not session.supports(one_mat):
+            session = None
+        energy, seed = None, None
+        if run_settings.get("seeded"):
+            energy, seed = (None, "watt") if session is not None else seed_spectrum(one_mat)
+        run_t0 = time.perf_counter()
+        mgxs_lib, micro_lib, cell, sp_filename = transport_box(one_mat, safe_name, run_settings, run_dir,
+                                                               threads, session, energy)
+        if seed is not None:
+            check = statepoint_h5.source_convergence(sp_filename, SOURCE_MAX_Z)
+            info["source"] = {"seed": seed, "inactive": run_settings["inactive"], **check, "rerun": False}
+            if not check["converged"]:
+                # The source was still settling in the active batches: redo with the full inactive count
+                info["source"]["rerun"] = True
+                run_settings = run_settings_for(one_mat, seeded=False)
+                mgxs_lib, micro_lib, cell, sp_filename = transport_box(one_mat, safe_name, run_settings, run_dir,
+                                                                       threads, session)
+        info["openmc"] = time.perf_counter() - run_t0
+        info["session"] = session is not None
+
+        post_t0 = time.perf_counter()
+        my_path = Path(".")
+
+        unc = process_results(sp_filename, mgxs_lib, my_path, h5_filename=h5_filename, master_name=master_name,
+                              scores=run_settings.get("triggers"), source=info.get("source"))
+        info["batches"] = unc["batches"]
+        info["max_rel_err"] = unc["max_rel_err"]
+        info["converged"] = unc["converged"]
+        if mgxs_cache.ENABLED:
+            mgxs_cache.store(cache_key, cache_payload, Path(mgxs_h5_path), safe_name, source=run_dir,
+                             master_h5=master_h5_path)
+        if mgxs_micro.ENABLED:
+            store_micro_library(sp_filename, micro_lib, cell, one_mat, cache_key, source=run_dir)
+
+        try:
+            plot_total_cross_section(mgxs_h5_path, material_key=safe_name, display_name=base_name, save_plot=True)
+        except Exception:
+            # Keep quiet by default; helper will still see timing.
+            pass
+
+        info["post"] = time.perf_counter() - post_t0
+        info["total"] = time.perf_counter() - mat_t0
+        return info
+    finally:
+        os.chdir(cwd)
+
+
+def print_material_timing(info: dict, i_mat: int, n_total: int):
+    synth = info.get("synthesis")
+    if synth and synth["written"]:
+        print(
+            "TIMING: material_synthesized "
+            f"{i_mat}/{n_total} id={info['id']} fiss={info['fiss']} "
+            f"total={_fmt_seconds(info['total'])} from={synth['representative'][:12]} "
+            f"distance={synth['distance']:.2e} name={info['name']}",
+            flush=True,
+        )
+        return
+    if info["cached"]:
+        print(
+            "TIMING: material_cached "
+            f"{i_mat}/{n_total} id={info['id']} fiss={info['fiss']} "
+            f"total={_fmt_seconds(info['total'])} key={info['key'][:12]} name={info['name']}",
+            flush=True,
+        )
+        return
+    rel = " ".join(f"{score}={value:.2e}" for score, value in info.get("max_rel_err", {}).items())
     print(
         "TIMING: material_done "
-        f"{i_mat}/{n_total} id={mat.id} fiss={fiss_flag} "
-        f"total={_fmt_seconds(mat_dt)} openmc={_fmt_seconds(run_dt)} post={_fmt_seconds(post_dt)} "
-        f"name={safe_name}",
+        f"{i_mat}/{n_total} id={info['id']} fiss={info['fiss']} "
+        f"total={_fmt_seconds(info['total'])} openmc={_fmt_seconds(info['openmc'])} "
+        f"post={_fmt_seconds(info['post'])} batches={info.get('batches', '-')} "
+        + ("session=1 " if info.get("session") else "")
+        + (f"seed={info['source']['seed']} " if info.get("source") else "") +
+        f"name={info['name']}" + (f" max_rel_err: {rel}" if rel else ""),
         flush=True,
     )
+    source = info.get("source")
+    if source and source["rerun"]:
+        drift = " ".join(f"{k}={source[k]:.1f}" for k in ("k_z", "entropy_z") if k in source)
+        print(f"WARN: {info['name']} source not converged after {source['inactive']} inactive batches "
+              f"({drift}), reran with {N_INACTIVE_FISS}", flush=True)
+    if synth and synth["distance"] is not None:
+        print(f"WARN: {info['name']} spectrum distance {synth['distance']:.2e} above "
+              f"{mgxs_micro.SPECTRUM_TOL:.2e}, ran OpenMC instead of superposition", flush=True)
+    if USE_TRIGGERS and not info.get("converged", True):
+        print(f"WARN: {info['name']} reached the batch cap before all relative-error targets", flush=True)
+
+
+def serve(threads=None, nuclides_file=None) -> int:
+    """
+    Work-queue worker: run "materials_dir<TAB>material_id" lines from stdin in one
+    openmc.lib session and print "JOB_DONE rc=N" after each.
+    """
+    import traceback
+    import openmc_session
+
+    nuclides = Path(nuclides_file).read_text().split() if nuclides_file else []
+    session = None
+    try:
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            rc = 0
+            try:
+                materials_dir, material_id = line.rstrip("\n").split("\t")
+                by_id = {m.id: m for m in load_case_materials(Path(materials_dir) / MATERIALS_XML_IN)}
+                if int(material_id) not in by_id:
+                    raise KeyError(f"no material {material_id} in {materials_dir}/{MATERIALS_XML_IN}")
+                if session is None:
+                    session = openmc_session.BoxSession(nuclides, threads)
+                print_material_timing(run_material(by_id[int(material_id)], materials_dir, threads, session), 1, 1)
+            except Exception:
+                traceback.print_exc(file=sys.stdout)
+                rc = 1
+            print(f"{SERVE_DONE} rc={rc}", flush=True)
+    finally:
+        if session is not None:
+            session.close()
+    return 0
+
+
+# ── Entry point ──────────────────────────────────────────────────────────────
+def main() -> int:
+    """
+    Run from a case's materials/ folder:
+        python openmc_mgxs.py                                 # every material, one after another
+        python openmc_mgxs.py --material ID [--threads N]     # a single material (used by the work queue)
+        python openmc_mgxs.py --serve [--nuclides FILE] [--threads N]
+                                                              # queue worker with an openmc.lib session
+    MGXS_SESSION=1 runs the materials of the whole-case mode in one openmc.lib session.
+    """
+    args = sys.argv[1:]
+    material_id, threads, serve_mode, nuclides_file = None, None, False, None
+    while args:
+        if args[0] == "--material" and len(args) > 1:
+            material_id, args = int(args[1]), args[2:]
+        elif args[0] == "--threads" and len(args) > 1:
+            threads, args = int(args[1]), args[2:]
+        elif args[0] == "--serve":
+            serve_mode, args = True, args[1:]
+        elif args[0] == "--nuclides" and len(args) > 1:
+            nuclides_file, args = args[1], args[2:]
+        else:
+            print(main.__doc__)
+            return 1
+
+    script_t0 = time.perf_counter()
+    configure_cross_sections()
+    if serve_mode:
+        return serve(threads, nuclides_file)
+    root_dir = os.getcwd()
+
+    if material_id is not None:
+        by_id = {m.id: m for m in load_case_materials(MATERIALS_XML_IN)}
+        if material_id not in by_id:
+            print(f"ERROR: no material {material_id} in {MATERIALS_XML_IN}", flush=True)
+            return 1
+        print_material_timing(run_material(by_id[material_id], root_dir, threads), 1, 1)
+        return 0
+
+    all_materials_list = load_case_materials(MATERIALS_XML_IN, write_fixed=True)
+    n_total = len(all_materials_list)
+    print(f"TIMING: case_start materials={n_total}", flush=True)
+
+    session = None
+    if SESSION:
+        import openmc_session
+        session = openmc_session.BoxSession(openmc_session.union_nuclides(all_materials_list), threads)
+
+    # One separate run per material
+    try:
+        for i_mat, mat in enumerate(all_materials_list, start=1):
+            print_material_timing(run_material(mat, root_dir, threads, session), i_mat, n_total)
+    finally:
+        if session is not None:
+            session.close()
+
+    script_dt = time.perf_counter() - script_t0
+    print(f"TIMING: case_total total={_fmt_seconds(script_dt)}", flush=True)
+    return 0
+
 
-script_dt = time.perf_counter() - script_t0
-print(f"TIMING: case_total total={_fmt_seconds(script_dt)}", flush=True)
+if __name__ == "__main__":
+    raise SystemExit(main())
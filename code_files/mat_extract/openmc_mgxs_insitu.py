@@ -0,0 +1,245 @@
+"""
+In-situ MGXS: one eigenvalue run of the whole spherical case instead of one
+infinite-box run per material.
+
+The sphere is rebuilt from mesh/radii.txt (the shells OpenSn meshes) and the
+cell -> material order of the case's ICSBEP geometry.xml; every material
+used in it gets material-domain MGXS tallies in the same run, so reflector
+and moderator spectra come from the actual fission source and leakage
+instead of an artificial uniform source. Libraries are written in the usual
+layout, material_{id}_{name}/{name}_LANL70g.h5 with xsdata {name}, plus the
+mgxs_uncertainty.json of openmc_mgxs.py.
+
+The results depend on the case, so they are not put in the MGXS cache, and
+the run tallies LANL70 directly (MGXS_MASTER_GROUPS is ignored).
+Materials that no shell uses get no library.
+
+Run from a case's materials/ folder (OpenMC files go to materials/insitu/):
+    python openmc_mgxs_insitu.py [--threads N]
+
+Environment:
+    MGXS_INSITU_SHELLS     1 = also write one library per shell,
+                           material_{id}_{name}/{name}_shell{k}_LANL70g.h5 (default: 0)
+    MGXS_INSITU_PARTICLES  particles per batch (default: N_PARTICLES_FISS)
+and the batch/trigger settings of openmc_mgxs.py for fissionable materials.
+"""
+
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import openmc
+import openmc.mgxs as mgxs
+
+import mgxs_h5
+import openmc_mgxs as om
+
+SHELLS = bool(int(os.getenv("MGXS_INSITU_SHELLS", "0")))
+PARTICLES = int(os.getenv("MGXS_INSITU_PARTICLES", str(om.N_PARTICLES_FISS)))
+RUN_DIR_NAME = "insitu"
+SUMMARY_NAME = "insitu_summary.json"
+
+
+def find_geometry_xml(materials_dir: Path):
+    """mesh/geometry.xml of the case, else the ICSBEP original (openmc/case-N or openmc/ for case-1)."""
+    case_dir = materials_dir.parent
+    local = case_dir / "mesh" / "geometry.xml"
+    if local.is_file():
+        return local
+    name, case = case_dir.parent.name, case_dir.name
+    openmc_dir = Path(__file__).resolve().parents[2] / "icsbep_original" / name / "openmc"
+    for path in (openmc_dir / case / "geometry.xml", openmc_dir / "geometry.xml"):
+        if path.is_file() and (path.parent.name == case or case == "case-1"):
+            return path
+    return None
+
+
+def shell_material_ids(geometry_xml) -> list:
+    """Material id of every cell, inside out (cells sorted by id, as OpenSnGen.py); None = void."""
+    cells = sorted(ET.parse(geometry_xml).getroot().findall("cell"), key=lambda c: int(c.attrib["id"]))
+    out = []
+    for c in cells:
+        mat = c.attrib.get("material", "void").strip()
+        out.append(None if mat == "void" else int(mat))
+    return out
+
+
+def read_radii(radii_path) -> list:
+    return [float(line) for line in Path(radii_path).read_text().split() if line.strip()]
+
+
+def case_materials(materials_xml) -> dict:
+    """{id in materials.xml: material as in openmc_mgxs.py (C0 split, renumbered 1..n)}."""
+    original_ids = [int(m.attrib["id"]) for m in ET.parse(materials_xml).getroot().findall("material")]
+    fixed = om.load_case_materials(materials_xml)
+    return dict(zip(original_ids, fixed))
+
+
+def build_geometry(radii: list, shell_mats: list) -> tuple:
+    """Concentric shells with a vacuum outer sphere; returns (geometry, shell cells)."""
+    cells, inner = [], None
+    for k, (radius, mat) in enumerate(zip(radii, shell_mats), start=1):
+        outer = openmc.Sphere(r=radius, boundary_type="vacuum" if k == len(radii) else "transmission")
+        region = -outer if inner is None else (+inner & -outer)
+        cells.append(openmc.Cell(name=f"shell{k}", fill=mat, region=region))
+        inner = outer
+    return openmc.Geometry(cells), cells
+
+
+def new_library(geometry, domain_type: str, domains: list) -> mgxs.Library:
+    lib = mgxs.Library(geometry)
+    lib.energy_groups = om.groups
+    lib.scatter_format = "legendre"
+    lib.legendre_order = om.LEGENDRE_ORDER
+    lib.mgxs_types = om.openmc_library_types(om.MGXS_TYPES)  # exported with create_mg_library
+    lib.by_nuclide = False
+    lib.domain_type = domain_type
+    lib.domains = domains
+    lib.build_library()
+    return lib
+
+
+def export_split(lib, names: list, run_dir: Path) -> dict:
+    """Export lib (xsdata named by `names`) and return {name: mgxs_h5 xsdata dict}."""
+    combined = run_dir / f"{lib.domain_type}_LANL{om.groups.num_groups}g.h5"
+    lib.create_mg_library(xs_type="macro", xsdata_names=names).export_to_hdf5(filename=str(combined))
+    return mgxs_h5.read_library(combined)[1]
+
+
+def run_case(materials_dir: Path, threads=None) -> int:
+    case_t0 = time.perf_counter()
+    om.configure_cross_sections()
+    geometry_xml = find_geometry_xml(materials_dir)
+    radii_path = materials_dir.parent / "mesh" / "radii.txt"
+    if geometry_xml is None or not radii_path.is_file():
+        print(f"ERROR: no geometry.xml or mesh/radii.txt for {materials_dir.parent}", flush=True)
+        return 1
+    by_original_id = case_materials(materials_dir / om.MATERIALS_XML_IN)
+    shell_ids = shell_material_ids(geometry_xml)
+    radii = read_radii(radii_path)
+    if len(shell_ids) != len(radii):
+        print(f"ERROR: {len(shell_ids)} cells in {geometry_xml} but {len(radii)} radii in {radii_path}", flush=True)
+        return 1
+    missing = sorted({i for i in shell_ids if i is not None and i not in by_original_id})
+    if missing:
+        print(f"ERROR: geometry.xml uses materials {missing} that are not in materials.xml", flush=True)
+        return 1
+
+    run_dir = materials_dir / RUN_DIR_NAME
+    run_dir.mkdir(exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(run_dir)
+    try:
+        openmc.reset_auto_ids()
+        shell_mats = [None if i is None else by_original_id[i] for i in shell_ids]
+        used = list({m.id: m for m in shell_mats if m is not None}.values())
+        unused = [m for m in by_original_id.values() if m.id not in {u.id for u in used}]
+        print(f"TIMING: case_start materials={len(used)} shells={len(radii)} mode=insitu", flush=True)
+
+        openmc.Materials(used).export_to_xml()
+        geometry, cells = build_geometry(radii, shell_mats)
+        geometry.export_to_xml()
+
+        r_out = radii[-1]
+        settings = openmc.Settings()
+        settings.source = openmc.IndependentSource(
+            space=openmc.stats.Box((-r_out, -r_out, -r_out), (r_out, r_out, r_out)),
+            constraints={"fissionable": True})
+        settings.run_mode = "eigenvalue"
+        settings.particles = PARTICLES
+        settings.inactive = om.N_INACTIVE_FISS
+        settings.batches = om.N_BATCHES_MIN_FISS if om.USE_TRIGGERS else om.N_BATCHES_FISS
+        if om.USE_TRIGGERS:
+            settings.trigger_active = True
+            settings.trigger_max_batches = om.N_BATCHES_MAX_FISS
+            settings.trigger_batch_interval = om.TRIGGER_INTERVAL
+        settings.temperature["method"] = "interpolation"
+        settings.export_to_xml()
+
+        mat_lib = new_library(geometry, "material", used)
+        shell_cells = [c for c in cells if c.fill is not None]
+        cell_lib = new_library(geometry, "cell", shell_cells) if SHELLS else None
+        tallies = openmc.Tallies()
+        mat_lib.add_to_tallies_file(tallies, merge=True)
+        if cell_lib is not None:
+            cell_lib.add_to_tallies_file(tallies, merge=True)
+        if om.USE_TRIGGERS:
+            om.add_trigger_tallies(tallies, used, any(om.material_is_fissionable(m) for m in used))
+        tallies.export_to_xml()
+        for old_sp in Path(".").glob("statepoint.*.h5"):
+            old_sp.unlink()
+
+        run_t0 = time.perf_counter()
+        openmc.run(cwd=".", output=False, threads=threads)
+        run_dt = time.perf_counter() - run_t0
+        sp_filename = om.latest_statepoint(".")
+        if sp_filename is None:
+            raise RuntimeError("No statepoint written by OpenMC.")
+
+        post_t0 = time.perf_counter()
+        sp = openmc.StatePoint(sp_filename)
+        sp.link_with_summary(openmc.Summary("summary.h5"))
+        mat_lib.load_from_statepoint(sp)
+        if cell_lib is not None:
+            cell_lib.load_from_statepoint(sp)
+
+        data = export_split(mat_lib, [f"m{m.id}" for m in used], Path("."))
+        shell_data = export_split(cell_lib, [c.name for c in shell_cells], Path(".")) if cell_lib else {}
+        summary = {"keff": [float(sp.keff.nominal_value), float(sp.keff.std_dev)],
+                   "batches": int(sp.current_batch), "geometry": str(geometry_xml), "materials": {},
+                   "unused_materials": [om.material_names(m)[1] for m in unused]}
+        for i, mat in enumerate(used):
+            base_name, safe_name = om.material_names(mat)
+            folder = materials_dir / f"material_{mat.id}_{safe_name}"
+            folder.mkdir(exist_ok=True)
+            h5_path = folder / f"{safe_name}_LANL{om.groups.num_groups}g.h5"
+            mgxs_h5.write_library(h5_path, om.groups.group_edges, {safe_name: data[f"m{mat.id}"]}, om.LEGENDRE_ORDER)
+            unc = om.trigger_uncertainties(sp, domain_index=i)
+            om.record_uncertainties(h5_path, [safe_name], unc)
+            with open(folder / om.UNCERTAINTY_JSON, "w") as fj:
+                json.dump(unc, fj, indent=1)
+
+            xs = {xs_type: mat_lib.get_mgxs(mat, xs_type).get_xs() for xs_type in mat_lib.mgxs_types}
+            om.export_results_to_csv(xs, om.groups.group_edges, str(folder / f"{safe_name}_"))
+            for k, cell in enumerate(cells, start=1):
+                if cell.fill is mat and cell.name in shell_data:
+                    mgxs_h5.write_library(folder / f"{safe_name}_shell{k}_LANL{om.groups.num_groups}g.h5",
+                                          om.groups.group_edges, {safe_name: shell_data[cell.name]},
+                                          om.LEGENDRE_ORDER)
+            try:
+                om.plot_total_cross_section(str(h5_path), material_key=safe_name, display_name=base_name)
+            except Exception:
+                pass
+            summary["materials"][safe_name] = {"id": mat.id, "max_rel_err": unc["max_rel_err"],
+                                               "converged": unc["converged"]}
+            print(f"TIMING: material_insitu {i + 1}/{len(used)} id={mat.id} name={safe_name}", flush=True)
+        sp.close()
+        with open(SUMMARY_NAME, "w") as fj:
+            json.dump(summary, fj, indent=1)
+        for m in unused:
+            print(f"WARN: material {m.id} ({om.material_names(m)[1]}) is in no shell; no library written",
+                  flush=True)
+        print(f"TIMING: case_total total={om._fmt_seconds(time.perf_counter() - case_t0)} "
+              f"openmc={om._fmt_seconds(run_dt)} post={om._fmt_seconds(time.perf_counter() - post_t0)} "
+              f"batches={summary['batches']} keff={summary['keff'][0]:.5f}", flush=True)
+        return 0
+    finally:
+        os.chdir(cwd)
+
+
+def main() -> int:
+    args = sys.argv[1:]
+    threads = None
+    if args[:1] == ["--threads"] and len(args) == 2:
+        threads = int(args[1])
+    elif args:
+        print(__doc__)
+        return 1
+    return run_case(Path(os.getcwd()).resolve(), threads)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Persistent openmc.lib session for the infinite-box runs of openmc_mgxs.py.
+
+openmc.run starts a new OpenMC process per material, and every start reads
+the nuclear data of all its nuclides again; for the short reflector runs
+that startup is most of the time. A BoxSession initializes openmc.lib once
+per process, in a scratch folder, with the reflective box cell filled by a
+material holding the union of the nuclides it will see, and the MGXS and
+trigger tallies of that cell (the same for every material). Per material it
+
+  - sets the composition of the cell's material in memory (set_densities;
+    nuclides outside the union are loaded on demand),
+  - sets run mode, particles, inactive and maximum batches,
+  - resets tallies and random numbers, steps through the batches and checks
+    the relative-error targets of openmc_mgxs.py on the in-memory trigger
+    tallies every TRIGGER_INTERVAL batches after the minimum,
+  - writes the statepoint of the stopped run from memory, with a copy of the
+    session's summary.h5, to the material's folder, where
+    openmc_mgxs.process_results makes the library as after openmc.run.
+
+The source is uniform in the box without the fissionable constraint, which
+is the same thing in a homogeneous material and lets one source serve both
+run modes. Its energy is OpenMC's Watt spectrum, so seeded runs
+(MGXS_SEED_SOURCE) start from Watt rather than a cached chi. Materials the
+session cannot represent run with openmc.run: S(a,b) tables (fixed at
+initialization), a temperature of their own, and by-nuclide tallies
+(MGXS_MICRO=1).
+
+openmc.lib is one instance per process: at most one open BoxSession.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import openmc
+import openmc.lib
+
+import mgxs_cache
+import mgxs_micro
+import openmc_mgxs as om
+
+UNION_NAME = "session_union"
+
+
+class BoxSession:
+    def __init__(self, nuclides, threads=None):
+        """Initialize openmc.lib with the box cell and a material of all `nuclides`."""
+        self.work_dir = Path(tempfile.mkdtemp(prefix="mgxs_session_"))
+        cwd = os.getcwd()
+        os.chdir(self.work_dir)
+        try:
+            openmc.reset_auto_ids()
+            union = openmc.Material(name=UNION_NAME)
+            for nuc in sorted(set(nuclides)) or ["H1"]:
+                union.add_nuclide(nuc, 1.0)
+            union.set_density("atom/b-cm", 1.0e-3)
+            openmc.Materials([union]).export_to_xml()
+
+            self.geometry, self.cell = om.box_geometry(union, "box")
+            self.geometry.export_to_xml()
+
+            bbox = self.geometry.bounding_box
+            settings = openmc.Settings()
+            settings.source = openmc.IndependentSource(space=openmc.stats.Box(bbox.lower_left, bbox.upper_right))
+            settings.run_mode = "eigenvalue"
+            settings.particles = om.N_PARTICLES_FISS
+            settings.inactive = om.N_INACTIVE_FISS
+            settings.batches = max(om.N_BATCHES_FISS, om.N_BATCHES_MAX_FISS, om.N_BATCHES_MAX_NONFISS)
+            settings.max_particle_events = 200000
+            settings.entropy_mesh = om.entropy_mesh(bbox)  # for the seeded-source check
+            settings.temperature["method"] = "interpolation"
+            settings.export_to_xml()
+
+            tallies = openmc.Tallies()
+            om.box_library(self.geometry, om.tally_groups, om.MGXS_TYPES).add_to_tallies_file(tallies, merge=True)
+            if om.USE_TRIGGERS:
+                om.add_trigger_tallies(tallies, self.cell, True)  # the material's scores are picked per run
+            tallies.export_to_xml()
+            self.trigger_ids = {t.name[len(om.TRIGGER_TALLY_PREFIX):]: t.id for t in tallies
+                                if (t.name or "").startswith(om.TRIGGER_TALLY_PREFIX)}
+
+            args = ["-s", str(threads)] if threads else None
+            openmc.lib.init(args=args, output=False)
+            self.material = openmc.lib.materials[union.id]
+        finally:
+            os.chdir(cwd)
+
+    def supports(self, mat: openmc.Material) -> bool:
+        return not mgxs_micro.ENABLED and not getattr(mat, "_sab", None) and mat.temperature is None
+
+    def max_rel_err(self, scores) -> dict:
+        """Largest relative error over the non-empty groups of each trigger tally, from memory."""
+        out = {}
+        for score in scores:
+            tally = openmc.lib.tallies[self.trigger_ids[score]]
+            mean, std = tally.mean.ravel(), tally.std_dev.ravel()
+            nonzero = mean > 0.0
+            out[score] = float(np.max(std[nonzero] / mean[nonzero])) if nonzero.any() else 0.0
+        return out
+
+    def run(self, mat: openmc.Material, name: str, run_settings: dict, run_dir) -> tuple:
+        """
+        Transport mat with run_settings (openmc_mgxs.run_settings_for) and write
+        run_dir/statepoint.{batch}.h5 and run_dir/summary.h5.
+        Returns (built mgxs library of the box cell, the cell), named `name`.
+        """
+        densities = mgxs_cache.atom_densities(mat)
+        for nuc in densities:
+            if nuc not in openmc.lib.nuclides:
+                openmc.lib.load_nuclide(nuc)
+        self.material.set_densities(list(densities), list(densities.values()))
+
+        settings = openmc.lib.settings
+        settings.run_mode = run_settings["run_mode"]
+        settings.particles = run_settings["particles"]
+        settings.inactive = run_settings["inactive"]
+        n_min = run_settings["batches"]
+        n_max = run_settings.get("max_batches", n_min)
+        settings.set_batches(n_max)
+        targets = run_settings.get("triggers", {})
+        interval = run_settings.get("trigger_interval", 1)
+
+        openmc.lib.hard_reset()  # tallies and random numbers as in a fresh process
+        openmc.lib.simulation_init()
+        try:
+            for _ in openmc.lib.iter_batches():
+                batch = openmc.lib.current_batch()
+                if targets and batch >= n_min and (batch - n_min) % interval == 0:
+                    rel = self.max_rel_err(targets)
+                    if all(rel[score] <= targets[score] for score in targets):
+                        break
+            run_dir = Path(run_dir).resolve()
+            openmc.lib.statepoint_write(str(run_dir / f"statepoint.{openmc.lib.current_batch()}.h5"),
+                                        write_source=False)
+        finally:
+            openmc.lib.simulation_finalize()
+        shutil.copyfile(self.work_dir / "summary.h5", run_dir / "summary.h5")
+
+        self.cell.name = name  # xsdata and CSV names of process_results
+        return om.box_library(self.geometry, om.tally_groups, om.MGXS_TYPES), self.cell
+
+    def close(self):
+        openmc.lib.finalize()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+def union_nuclides(materials) -> set:
+    """Nuclides of the materials a session can run."""
+    return {nuc for mat in materials if not getattr(mat, "_sab", None) and mat.temperature is None
+            for nuc in mgxs_cache.atom_densities(mat)}
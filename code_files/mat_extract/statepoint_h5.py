@@ -0,0 +1,220 @@
+"""
+MGXS of the box runs straight from the statepoint, with h5py and NumPy.
+
+openmc.mgxs loads every tally of the library into pandas-backed objects and
+derives each MGXS type through tally arithmetic, which is much of the
+post-processing time of a material.
+Here the raw tally sums are read once and the same quantities are formed
+with array operations (E = incoming, E' = outgoing group, l = Legendre moment,
+tl = tracklength, an = analog estimator):
+
+    total, absorption, fission, nu-fission   R_x,tl(E) / phi_tl(E)
+    reduced absorption    (R_abs - R_n2n - 2 R_n3n - 3 R_n4n)_tl / phi_tl
+    chi                   R_nu-fission,an(E') / sum_E R_nu-fission,an(E)
+    scatter matrix        R_scatter,an(E, E', l) / phi_an(E)
+    nu-scatter matrix     R_nu-scatter,an(E, E', l) / phi_an(E)
+    multiplicity matrix   R_nu-scatter,an(E, E') / R_scatter,an(E, E')
+    consistent nu-scatter matrix
+                          R_scatter,an(E, E', l) / sum_E' R_scatter,an(E, E', 0)
+                          * multiplicity(E, E') * R_scatter,tl(E) / phi_tl(E)
+
+Without a multiplicity matrix tally, the multiplicity comes from the
+consistent nu-scatter tallies (the P0 moment of the Legendre scatter tally
+scores the same analog events). Divisions by zero give zero, as
+openmc.mgxs's nan_to_num. Arrays are ordered like
+MGXS.get_xs(order_groups="increasing"): group 0 is the fastest.
+
+Statepoint layout read (OpenMC 0.13+):
+    /n_particles, /current_batch
+    /tallies/filters/filter {id}/{type, bins | order}
+    /tallies/tally {id}/{name, estimator, n_realizations, filters, nuclides, score_bins, results}
+with results (filter bins, nuclides * scores, [sum, sum_sq]); filter bins are
+row-major over the tally's filters.
+"""
+
+import numpy as np
+import h5py
+
+XS_TYPES = [
+    "total",
+    "absorption",
+    "fission",
+    "nu-fission",
+    "chi",
+    "reduced absorption",
+    "scatter matrix",
+    "nu-scatter matrix",
+    "consistent nu-scatter matrix",
+    "multiplicity matrix",
+]
+
+
+def _decode(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def read_tallies(sp_path) -> tuple:
+    """
+    ({"batches", "particles"}, list of tallies {"id", "name", "estimator", "filters":
+    [(type, bins)], "nuclides", "scores", "mean", "std_dev"}); mean and std_dev are
+    (filter bins, nuclides * scores).
+    """
+    tallies = []
+    with h5py.File(sp_path, "r") as f:
+        info = {"batches": int(f["current_batch"][()]), "particles": int(f["n_particles"][()])}
+        filters = {}
+        for name, grp in f["tallies/filters"].items():
+            ftype = _decode(grp["type"][()])
+            bins = grp["order"][()] if ftype == "legendre" else grp["bins"][()]
+            filters[int(name.split()[1])] = (ftype, np.atleast_1d(bins))
+        for name, grp in f["tallies"].items():
+            if not name.startswith("tally ") or grp.attrs.get("internal", 0) or "results" not in grp:
+                continue
+            n = int(grp["n_realizations"][()])
+            results = grp["results"][()]
+            mean = results[:, :, 0] / n
+            var = (results[:, :, 1] / n - mean**2) / (n - 1) if n > 1 else np.zeros_like(mean)
+            filter_ids = grp["filters"][()] if int(grp["n_filters"][()]) > 0 else []
+            tallies.append({
+                "id": int(name.split()[1]),
+                "name": _decode(grp["name"][()]) if "name" in grp else "",
+                "estimator": _decode(grp["estimator"][()]),
+                "filters": [filters[int(i)] for i in filter_ids],
+                "nuclides": [_decode(v).strip() for v in grp["nuclides"][()]],
+                "scores": [_decode(v) for v in grp["score_bins"][()]],
+                "mean": mean,
+                "std_dev": np.sqrt(np.maximum(var, 0.0)),
+            })
+    return info, tallies
+
+
+def _filter_shape(ftype: str, bins) -> int:
+    if ftype in ("energy", "energyout"):
+        return len(bins) - 1
+    if ftype == "legendre":
+        return int(bins[0]) + 1
+    return len(bins)
+
+
+def tally_values(tallies, score: str, estimator: str, filter_types: tuple, domain_id: int,
+                 key: str = "mean", skip_prefix: str = None) -> np.ndarray:
+    """
+    Values of `score` ("total" nuclide) of the tally with filters (domain, *filter_types),
+    for the domain bin domain_id; shaped by the remaining filters, energy axes fastest first.
+    """
+    for tally in tallies:
+        if skip_prefix and tally["name"].startswith(skip_prefix):
+            continue
+        types = tuple(ftype for ftype, _ in tally["filters"])
+        if (tally["estimator"] != estimator or score not in tally["scores"] or "total" not in tally["nuclides"]
+                or types[1:] != tuple(filter_types) or types[0] not in ("cell", "material")):
+            continue
+        domain_bins = list(tally["filters"][0][1])
+        if domain_id not in domain_bins:
+            continue
+        shape = [_filter_shape(ftype, bins) for ftype, bins in tally["filters"]]
+        column = tally["nuclides"].index("total") * len(tally["scores"]) + tally["scores"].index(score)
+        values = tally[key][:, column].reshape(shape)[domain_bins.index(domain_id)]
+        for axis, ftype in enumerate(filter_types):
+            if ftype in ("energy", "energyout"):
+                values = np.flip(values, axis=axis)  # ascending bins -> group 0 fastest
+        return values
+    raise KeyError(f"no {estimator} tally of {score} with filters {filter_types} for domain {domain_id}")
+
+
+def _ratio(num, den) -> np.ndarray:
+    num, den = np.broadcast_arrays(np.asarray(num, dtype=float), np.asarray(den, dtype=float))
+    return np.divide(num, den, out=np.zeros(num.shape), where=den != 0.0)
+
+
+def macro_xs(tallies, domain_id: int, mgxs_types=XS_TYPES, skip_prefix: str = None) -> dict:
+    """{MGXS type: array} of one domain, the types and shapes of openmc.mgxs get_xs."""
+    def get(score, estimator, *filter_types):
+        return tally_values(tallies, score, estimator, filter_types, domain_id, skip_prefix=skip_prefix)
+
+    out = {}
+    flux_tl = get("flux", "tracklength", "energy")
+    for xs_type in ("total", "absorption", "fission", "nu-fission"):
+        if xs_type in mgxs_types:
+            out[xs_type] = _ratio(get(xs_type, "tracklength", "energy"), flux_tl)
+    if "reduced absorption" in mgxs_types:
+        rate = (get("absorption", "tracklength", "energy") - get("(n,2n)", "tracklength", "energy")
+                - 2.0 * get("(n,3n)", "tracklength", "energy") - 3.0 * get("(n,4n)", "tracklength", "energy"))
+        out["reduced absorption"] = _ratio(rate, flux_tl)
+    if "chi" in mgxs_types:
+        out["chi"] = _ratio(get("nu-fission", "analog", "energyout"), get("nu-fission", "analog", "energy").sum())
+
+    matrix_types = {"scatter matrix", "nu-scatter matrix", "consistent nu-scatter matrix", "multiplicity matrix"}
+    if not matrix_types & set(mgxs_types):
+        return out
+    scatter = get("scatter", "analog", "energy", "energyout", "legendre")
+    if "scatter matrix" in mgxs_types or "nu-scatter matrix" in mgxs_types:
+        flux_an = get("flux", "analog", "energy")[:, None, None]
+        if "scatter matrix" in mgxs_types:
+            out["scatter matrix"] = _ratio(scatter, flux_an)
+        if "nu-scatter matrix" in mgxs_types:
+            out["nu-scatter matrix"] = _ratio(get("nu-scatter", "analog", "energy", "energyout", "legendre"), flux_an)
+    nu_scatter = get("nu-scatter", "analog", "energy", "energyout")
+    if "multiplicity matrix" in mgxs_types:
+        out["multiplicity matrix"] = _ratio(nu_scatter, get("scatter", "analog", "energy", "energyout"))
+    if "consistent nu-scatter matrix" in mgxs_types:
+        prob = _ratio(scatter, scatter[:, :, 0].sum(axis=1)[:, None, None])
+        mult = _ratio(nu_scatter, scatter[:, :, 0])
+        scatter_xs = _ratio(get("scatter", "tracklength", "energy"), flux_tl)
+        out["consistent nu-scatter matrix"] = prob * mult[:, :, None] * scatter_xs[:, None, None]
+        out.setdefault("multiplicity matrix", mult)  # same analog events as its own tally
+    return out
+
+
+def library_data(xs: dict) -> dict:
+    """xsdata dict of mgxs_h5.write_library from macro_xs (as openmc.mgxs.Library.create_mg_library)."""
+    data = {key: xs[key] for key in ("total", "absorption", "fission", "nu-fission", "chi") if key in xs}
+    data["scatter_matrix"] = xs["consistent nu-scatter matrix"]
+    data["multiplicity_matrix"] = xs["multiplicity matrix"]
+    return data
+
+
+def domain_flux(tallies, domain_id: int) -> np.ndarray:
+    """Tracklength group flux of a domain (group 0 fastest), the weighting flux of master libraries."""
+    return tally_values(tallies, "flux", "tracklength", ("energy",), domain_id)
+
+
+def compare(data: dict, reference: dict, rtol: float = 1e-6) -> dict:
+    """{key: max relative difference} of the xsdata entries that differ by more than rtol."""
+    out = {}
+    for key, ref in reference.items():
+        if key not in data:
+            out[key] = float("inf")
+            continue
+        ref = np.asarray(ref, dtype=float)
+        diff = np.abs(np.asarray(data[key], dtype=float) - ref)
+        scale = np.maximum(np.abs(ref), np.max(np.abs(ref), initial=0.0) * 1e-12)
+        rel = float(np.max(_ratio(diff, scale), initial=0.0))
+        if rel > rtol:
+            out[key] = rel
+    return out
+
+
+def source_convergence(sp_path, max_z: float, first: float = 0.1, last: float = 0.5) -> dict:
+    """
+    Geweke drift test of an eigenvalue run: z = |mean(first part) - mean(last part)| /
+    standard error of the difference, for k and the Shannon entropy of the active
+    generations (first and last are fractions of them). A source that was still
+    settling when the active batches began shows up as a drift of the first part.
+    {"k_z", "entropy_z" (if tallied), "active_generations", "converged": all z <= max_z}
+    """
+    with h5py.File(sp_path, "r") as f:
+        start = int(f["n_inactive"][()]) * int(f["generations_per_batch"][()])
+        series = {"k": f["k_generation"][()][start:]}
+        if "entropy" in f:
+            series["entropy"] = f["entropy"][()][start:]
+    out = {"active_generations": len(series["k"])}
+    for name, values in series.items():
+        n_first, n_last = max(3, int(first * len(values))), max(3, int(last * len(values)))
+        if len(values) < n_first + n_last:
+            continue
+        a, b = values[:n_first], values[-n_last:]
+        se = np.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+        out[f"{name}_z"] = float(abs(a.mean() - b.mean()) / se) if se > 0.0 else 0.0
+    out["converged"] = all(out[f"{name}_z"] <= max_z for name in series if f"{name}_z" in out)
+    return out
@@ -0,0 +1,143 @@
+"""
+Tests of statepoint_h5.py on a synthetic two-group statepoint in OpenMC's layout,
+and against openmc.mgxs on a short OpenMC run (skipped without openmc and
+OPENMC_CROSS_SECTIONS).
+
+    python -m pytest -q test_statepoint_h5.py
+"""
+
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+import statepoint_h5
+
+CELL_ID = 7
+EDGES = [1.0e-5, 1.0e2, 2.0e7]  # ascending: bin 0 = thermal, bin 1 = fast (group 0)
+N_REAL = 2
+
+# Tally means in group order (group 0 fastest), as get_xs(order_groups="increasing")
+TRACKLENGTH = {"flux": [2.0, 4.0], "total": [1.0, 8.0], "absorption": [0.2, 2.0], "fission": [0.1, 1.0],
+               "nu-fission": [0.3, 2.5], "scatter": [0.8, 6.0]}
+ANALOG_IN = {"flux": [2.0, 4.0], "nu-fission": [0.5, 2.5]}
+ANALOG_OUT_NU_FISSION = [2.97, 0.03]
+SCATTER_PL = [[[0.3, 0.1], [0.5, 0.05]],   # [E][E'][l]
+              [[0.0, 0.0], [6.0, 0.6]]]
+NU_SCATTER = [[0.3, 0.6],                  # [E][E'], P0
+              [0.0, 6.0]]
+
+
+def _write_tally(tallies, tally_id, name, estimator, filter_ids, scores, means):
+    """means: {score: array in group order over the tally's energy axes}."""
+    g = tallies.create_group(f"tally {tally_id}")
+    g["name"] = name
+    g["estimator"] = estimator
+    g["n_realizations"] = N_REAL
+    g["n_filters"] = len(filter_ids)
+    g["filters"] = filter_ids
+    g["nuclides"] = [b"total"]
+    g["score_bins"] = [s.encode() for s in scores]
+    columns = []
+    for score in scores:
+        values = np.asarray(means[score], dtype=float)
+        n_energy_axes = min(values.ndim, 2)
+        values = np.flip(values, axis=tuple(range(n_energy_axes)))  # group order -> ascending bins
+        columns.append(values.ravel())
+    mean = np.stack(columns, axis=1)
+    g["results"] = np.stack([mean * N_REAL, mean**2 * N_REAL], axis=-1)  # zero variance
+
+
+@pytest.fixture
+def statepoint(tmp_path):
+    path = tmp_path / "statepoint.50.h5"
+    with h5py.File(path, "w") as f:
+        f["current_batch"] = 50
+        f["n_particles"] = 1000
+        filters = f.create_group("tallies/filters")
+        for fid, ftype, key, bins in ((1, "cell", "bins", [CELL_ID]), (2, "energy", "bins", EDGES),
+                                      (3, "energyout", "bins", EDGES), (4, "legendre", "order", 1)):
+            g = filters.create_group(f"filter {fid}")
+            g["type"] = ftype
+            g[key] = bins
+        tallies = f["tallies"]
+        # A trigger tally of the same score and filters comes first and must be skipped
+        _write_tally(tallies, 1, "trigger total", "tracklength", [1, 2], ["total"], {"total": [99.0, 99.0]})
+        _write_tally(tallies, 2, "", "tracklength", [1, 2], list(TRACKLENGTH), TRACKLENGTH)
+        _write_tally(tallies, 3, "", "analog", [1, 2], list(ANALOG_IN), ANALOG_IN)
+        _write_tally(tallies, 4, "", "analog", [1, 3], ["nu-fission"], {"nu-fission": ANALOG_OUT_NU_FISSION})
+        _write_tally(tallies, 5, "", "analog", [1, 2, 3, 4], ["scatter"], {"scatter": SCATTER_PL})
+        _write_tally(tallies, 6, "", "analog", [1, 2, 3], ["nu-scatter"], {"nu-scatter": NU_SCATTER})
+    return path
+
+
+def test_read_tallies(statepoint):
+    info, tallies = statepoint_h5.read_tallies(statepoint)
+    assert info == {"batches": 50, "particles": 1000}
+    assert [t["id"] for t in tallies] == [1, 2, 3, 4, 5, 6]
+    assert np.all(tallies[1]["std_dev"] == 0.0)
+
+
+def test_solver_types(statepoint):
+    _, tallies = statepoint_h5.read_tallies(statepoint)
+    types = ["total", "absorption", "fission", "nu-fission", "chi", "consistent nu-scatter matrix"]
+    xs = statepoint_h5.macro_xs(tallies, CELL_ID, types, skip_prefix="trigger ")
+
+    np.testing.assert_allclose(xs["total"], [1.0 / 2.0, 8.0 / 4.0])
+    np.testing.assert_allclose(xs["nu-fission"], [0.3 / 2.0, 2.5 / 4.0])
+    # analog nu-fission out / all analog nu-fission in (0.5 + 2.5)
+    np.testing.assert_allclose(xs["chi"], [0.99, 0.01])
+    # nu-scatter / scatter P0; 0/0 in the empty up-scatter entry gives 0
+    np.testing.assert_allclose(xs["multiplicity matrix"], [[1.0, 1.2], [0.0, 1.0]])
+    # P_l / sum_E' P0 * multiplicity * tracklength scatter xs (0.8 / 2, 6 / 4)
+    expected = [[[0.3 / 0.8 * 0.4, 0.1 / 0.8 * 0.4], [0.5 / 0.8 * 1.2 * 0.4, 0.05 / 0.8 * 1.2 * 0.4]],
+                [[0.0, 0.0], [1.5, 0.15]]]
+    np.testing.assert_allclose(xs["consistent nu-scatter matrix"], expected)
+    assert xs["consistent nu-scatter matrix"].shape == (2, 2, 2)
+
+    data = statepoint_h5.library_data(xs)
+    assert set(data) == {"total", "absorption", "fission", "nu-fission", "chi", "scatter_matrix",
+                         "multiplicity_matrix"}
+
+
+def test_missing_tally(statepoint):
+    _, tallies = statepoint_h5.read_tallies(statepoint)
+    with pytest.raises(KeyError):
+        statepoint_h5.macro_xs(tallies, CELL_ID + 1, ["total"])
+
+
+def test_compare():
+    data = {"total": np.array([1.0, 2.0])}
+    assert statepoint_h5.compare(data, data) == {}
+    assert set(statepoint_h5.compare(data, {"total": np.array([1.0, 2.1])})) == {"total"}
+    assert statepoint_h5.compare(data, {"chi": np.array([1.0, 0.0])}) == {"chi": float("inf")}
+
+
+def test_against_openmc_mgxs(tmp_path, monkeypatch):
+    """A short fixed-source water box: statepoint_h5 and openmc.mgxs libraries agree."""
+    pytest.importorskip("openmc")
+    if not os.getenv("OPENMC_CROSS_SECTIONS"):
+        pytest.skip("OPENMC_CROSS_SECTIONS is not set")
+    import openmc
+
+    import openmc_mgxs as om
+
+    monkeypatch.chdir(tmp_path)
+    # Fixed batches, and the type set of the MGXS_H5_CROSSCHECK=1 runs: with the multiplicity
+    # matrix, so that create_mg_library keeps it and does not fold (n,xn) into the absorption
+    monkeypatch.setattr(om, "USE_TRIGGERS", False)
+    monkeypatch.setattr(om, "MGXS_TYPES", om.openmc_library_types(om.SOLVER_MGXS_TYPES))
+    water = openmc.Material(name="Water")
+    water.add_nuclide("H1", 2.0)
+    water.add_nuclide("O16", 1.0)
+    water.set_density("g/cm3", 1.0)
+    run_settings = {**om.run_settings_for(water), "particles": 2000, "batches": 5}
+    mgxs_lib, _, cell = om.write_box_inputs(water, "Water", run_settings)
+    openmc.run(cwd=".", output=False)
+    sp_filename = om.latest_statepoint(".")
+
+    _, tallies = statepoint_h5.read_tallies(sp_filename)
+    xs = statepoint_h5.macro_xs(tallies, cell.id, mgxs_lib.mgxs_types, skip_prefix=om.TRIGGER_TALLY_PREFIX)
+    diffs = om.crosscheck_openmc(sp_filename, mgxs_lib, {"Water": statepoint_h5.library_data(xs)})
+    assert diffs == {"Water": {}}